@@ -0,0 +1,120 @@
+"""
+Load benchmark for every trivia API endpoint.
+
+Seeds a synthetic question bank, drives each endpoint through the Flask
+test client and reports p50/p95/p99 latency, throughput and SQL
+statements per request. Run from the backend directory:
+
+    python -m benchmarks.api --rows 100000 --categories 20
+    python -m benchmarks.api --rows 100000 --save-baseline
+"""
+import argparse
+import random
+import sys
+
+from flaskr import create_app
+from models import db
+
+from .common import (DEFAULT_BASELINE, EndpointStats, WORDS,
+                     compare_to_baseline, load_baseline, print_report,
+                     save_baseline, seed_synthetic, timed)
+
+
+def run_benchmark(app, rows, categories, requests, seed=0):
+    """Return {endpoint: summary} for `requests` calls per endpoint."""
+    rng = random.Random(seed)
+    client = app.test_client()
+    pages = max(rows // 10, 1)
+    stats = {}
+
+    def endpoint(name):
+        return stats.setdefault(name, EndpointStats(name))
+
+    with app.app_context():
+        engine = db.engine
+
+        # first calls build the in-process indexes; keep them out of the numbers
+        client.get("/categories")
+        client.post("/questions/search", json={"searchTerm": WORDS[0]})
+        client.post("/quizzes", json={"previous_questions": [],
+                                      "quiz_category": {"id": 0}})
+
+        created = []
+        for _ in range(requests):
+            timed(endpoint("GET /categories"), engine,
+                  lambda: client.get("/categories"))
+            timed(endpoint("GET /questions?page"), engine,
+                  lambda: client.get(
+                      f"/questions?page={rng.randint(1, pages)}"))
+            timed(endpoint("GET /categories/<id>/questions"), engine,
+                  lambda: client.get(
+                      f"/categories/{rng.randint(1, categories)}/questions"))
+            timed(endpoint("POST /questions/search"), engine,
+                  lambda: client.post("/questions/search", json={
+                      "searchTerm": " ".join(rng.sample(WORDS, 2))}))
+            timed(endpoint("POST /quizzes"), engine,
+                  lambda: client.post("/quizzes", json={
+                      "previous_questions": rng.sample(
+                          range(1, rows + 1), min(5, rows)),
+                      "quiz_category": {"id": rng.randint(0, categories)}}))
+            response = timed(endpoint("POST /questions"), engine,
+                             lambda: client.post("/questions", json={
+                                 "question": "benchmark question?",
+                                 "answer": "benchmark",
+                                 "difficulty": 1,
+                                 "category": rng.randint(1, categories)}))
+            created.append(response.get_json()["created"])
+
+        for question_id in created:
+            timed(endpoint("DELETE /questions/<id>"), engine,
+                  lambda: client.delete(f"/questions/{question_id}"))
+
+    return {name: s.summary() for name, s in stats.items()}
+
+
+def make_app(database_url, rows, categories):
+    app = create_app({"SQLALCHEMY_DATABASE_URI": database_url})
+    with app.app_context():
+        db.create_all()
+        seed_synthetic(rows, categories)
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=10000,
+                        help="synthetic questions to seed (e.g. 10000, "
+                             "100000, 1000000)")
+    parser.add_argument("--categories", type=int, default=6)
+    parser.add_argument("--requests", type=int, default=200,
+                        help="calls per endpoint")
+    parser.add_argument("--database-url", default="sqlite://",
+                        help="empty database to seed; defaults to "
+                             "in-memory SQLite")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed p95 slowdown before flagging, "
+                             "as a fraction")
+    args = parser.parse_args(argv)
+
+    app = make_app(args.database_url, args.rows, args.categories)
+    summaries = run_benchmark(app, args.rows, args.categories, args.requests)
+    key = f"api-{args.rows}x{args.categories}"
+    print_report(f"{key} ({args.requests} requests per endpoint)", summaries)
+
+    if args.save_baseline:
+        save_baseline(args.baseline, key, summaries)
+        print(f"Saved baseline {key} to {args.baseline}")
+        return 0
+
+    regressions = compare_to_baseline(
+        load_baseline(args.baseline).get(key, {}), summaries, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
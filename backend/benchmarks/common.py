@@ -0,0 +1,152 @@
+import json
+import os
+import random
+import statistics
+import time
+
+from sqlalchemy import event, insert
+
+from models import Category, Question, db
+
+WORDS = (
+    "ancient river capital painter empire planet element ocean mountain "
+    "composer novel battle island language treaty desert volcano dynasty "
+    "galaxy molecule orchestra cathedral explorer glacier currency player "
+    "tournament bridge festival kingdom invention poet theorem harbor "
+    "satellite medicine symphony canyon revolution athlete museum forest"
+).split()
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def synthetic_text(rng, low, high):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high)))
+
+
+def seed_synthetic(rows, categories, seed=0, chunk_size=10000):
+    """
+    Fill the bound database with `categories` categories and `rows`
+    random questions spread across them, using batched inserts.
+    """
+    rng = random.Random(seed)
+    db.session.execute(insert(Category), [
+        {"id": category_id, "type": f"Category {category_id}"}
+        for category_id in range(1, categories + 1)])
+
+    for start in range(0, rows, chunk_size):
+        db.session.execute(insert(Question), [
+            {"question": synthetic_text(rng, 6, 14) + "?",
+             "answer": synthetic_text(rng, 1, 3),
+             "difficulty": rng.randint(1, 5),
+             "category": rng.randint(1, categories)}
+            for _ in range(min(chunk_size, rows - start))])
+    Category.recount_questions()
+    db.session.commit()
+
+
+class QueryCounter:
+    """Counts SQL statements executed on an engine while attached."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    index = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+class EndpointStats:
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+        self.queries = []
+        self.errors = 0
+
+    def record(self, seconds, queries, ok=True):
+        self.latencies.append(seconds)
+        self.queries.append(queries)
+        if not ok:
+            self.errors += 1
+
+    def summary(self):
+        total = sum(self.latencies) or 1e-9
+        return {
+            "requests": len(self.latencies),
+            "errors": self.errors,
+            "p50_ms": percentile(self.latencies, 0.50) * 1000,
+            "p95_ms": percentile(self.latencies, 0.95) * 1000,
+            "p99_ms": percentile(self.latencies, 0.99) * 1000,
+            "rps": len(self.latencies) / total,
+            "queries": statistics.mean(self.queries),
+        }
+
+
+def timed(stats, engine, call):
+    """Run call() once, recording latency and SQL count into stats."""
+    with QueryCounter(engine) as counter:
+        started = time.perf_counter()
+        response = call()
+        elapsed = time.perf_counter() - started
+    stats.record(elapsed, counter.count, ok=response.status_code < 500)
+    return response
+
+
+def print_report(title, summaries):
+    print(title)
+    print(f"{'endpoint':<32}{'reqs':>6}{'err':>5}{'p50 ms':>9}"
+          f"{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}{'sql/req':>9}")
+    for name, s in summaries.items():
+        # runs against a live server cannot count the server's statements
+        queries = f"{s['queries']:.1f}" if "queries" in s else "-"
+        print(f"{name:<32}{s['requests']:>6}{s['errors']:>5}"
+              f"{s['p50_ms']:>9.2f}{s['p95_ms']:>9.2f}{s['p99_ms']:>9.2f}"
+              f"{s['rps']:>9.0f}{queries:>9}")
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as baseline:
+        return json.load(baseline)
+
+
+def save_baseline(path, key, summaries):
+    baselines = load_baseline(path)
+    baselines[key] = summaries
+    with open(path, "w") as baseline:
+        json.dump(baselines, baseline, indent=2, sort_keys=True)
+
+
+def compare_to_baseline(baseline, summaries, tolerance):
+    """
+    Return a list of regression messages: p95 latency more than
+    `tolerance` (a fraction) above the baseline, or more SQL statements
+    per request than before.
+    """
+    regressions = []
+    for name, current in summaries.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if current["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p95 {current['p95_ms']:.2f} ms vs "
+                f"baseline {before['p95_ms']:.2f} ms")
+        if current["queries"] > before["queries"] + 0.01:
+            regressions.append(
+                f"{name}: {current['queries']:.1f} queries/request vs "
+                f"baseline {before['queries']:.1f}")
+    return regressions
@@ -0,0 +1,202 @@
+"""
+Concurrency benchmark: threaded WSGI (Flask) against ASGI (uvicorn).
+
+Seeds a synthetic question bank in a temporary SQLite file, serves it
+with both stacks on local ports and drives POST /quizzes and GET
+/questions with --concurrency clients in flight, reporting latency
+percentiles and wall-clock requests per second. --db-latency-ms delays
+every statement to stand in for a database across the network, which
+is where the async mode pays off. Run from the backend directory:
+
+    python -m benchmarks.concurrency --rows 20000 --concurrency 50
+    python -m benchmarks.concurrency --db-latency-ms 5 --servers asgi
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+
+import httpx
+from sqlalchemy import event
+from werkzeug.serving import make_server
+
+from flaskr import create_app
+from models import db
+
+from .api import make_app
+from .common import EndpointStats, print_report
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def serve_wsgi(database_url, port, db_latency):
+    """Serve the Flask app with a thread per request until killed."""
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    app = create_app({"SQLALCHEMY_DATABASE_URI": database_url})
+    if db_latency:
+        with app.app_context():
+            event.listen(db.engine, "before_cursor_execute",
+                         lambda *args: time.sleep(db_latency))
+    make_server("127.0.0.1", port, app, threaded=True).serve_forever()
+
+
+def serve_asgi(database_url, port, db_latency):
+    """Serve the ASGI app on one uvicorn event loop until killed."""
+    import uvicorn
+
+    from flaskr.asgi import AsyncDatabase, create_asgi_app
+
+    class DelayedDatabase(AsyncDatabase):
+        async def rows(self, statement):
+            await asyncio.sleep(db_latency)
+            return await super().rows(statement)
+
+        async def scalar(self, statement):
+            await asyncio.sleep(db_latency)
+            return await super().scalar(statement)
+
+        async def write(self, statement, follow_up=None):
+            await asyncio.sleep(db_latency)
+            return await super().write(statement, follow_up)
+
+    app = create_asgi_app(
+        {"SQLALCHEMY_DATABASE_URI": database_url},
+        database_class=DelayedDatabase if db_latency else AsyncDatabase)
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning",
+                access_log=False)
+
+
+SERVERS = {"wsgi": serve_wsgi, "asgi": serve_asgi}
+
+
+def start_server(kind, database_url, db_latency):
+    """
+    Run a server in its own process so it does not share the GIL with
+    the load generator. Returns (base url, process).
+    """
+    port = free_port()
+    process = multiprocessing.Process(
+        target=SERVERS[kind], args=(database_url, port, db_latency),
+        daemon=True)
+    process.start()
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            break
+        except OSError:
+            if time.monotonic() > deadline or not process.is_alive():
+                process.terminate()
+                raise RuntimeError(f"{kind} server did not start")
+            time.sleep(0.05)
+    return f"http://127.0.0.1:{port}", process
+
+
+async def drive(base_url, name, make_request, requests, concurrency):
+    """Send `requests` calls with `concurrency` in flight; returns a summary."""
+    stats = EndpointStats(name)
+    remaining = iter(range(requests))
+    # a fresh connection per request for both servers: the werkzeug one
+    # closes them anyway, and httpx's keep-alive pool adds its own tail
+    # latency under this much concurrency
+    limits = httpx.Limits(max_connections=concurrency,
+                          max_keepalive_connections=0)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits,
+                                 timeout=60) as client:
+        async def worker():
+            for _ in remaining:
+                started = time.perf_counter()
+                try:
+                    response = await make_request(client)
+                    ok = response.status_code < 500
+                except httpx.HTTPError:
+                    ok = False
+                stats.record(time.perf_counter() - started, 0, ok=ok)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    summary = stats.summary()
+    del summary["queries"]
+    # wall-clock throughput; the per-request sum overlaps under concurrency
+    summary["rps"] = requests / elapsed
+    return summary
+
+
+def run_benchmark(base_url, rows, categories, requests, concurrency, seed=0):
+    rng = random.Random(seed)
+    pages = max(rows // 10, 1)
+
+    def quiz(client):
+        return client.post("/quizzes", json={
+            "previous_questions": rng.sample(range(1, rows + 1),
+                                             min(5, rows)),
+            "quiz_category": {"id": rng.randint(0, categories)}})
+
+    def questions(client):
+        return client.get(f"/questions?page={rng.randint(1, pages)}")
+
+    async def run():
+        # first calls build the in-process indexes; keep them out of the numbers
+        await drive(base_url, "warmup", quiz, concurrency, concurrency)
+        await drive(base_url, "warmup", questions, concurrency, concurrency)
+        return {
+            "POST /quizzes": await drive(
+                base_url, "POST /quizzes", quiz, requests, concurrency),
+            "GET /questions?page": await drive(
+                base_url, "GET /questions?page", questions, requests,
+                concurrency),
+        }
+
+    return asyncio.run(run())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--categories", type=int, default=6)
+    parser.add_argument("--requests", type=int, default=1000,
+                        help="calls per endpoint and server")
+    parser.add_argument("--concurrency", type=int, default=50,
+                        help="requests in flight at once")
+    parser.add_argument("--db-latency-ms", type=float, default=0,
+                        help="extra delay per SQL statement")
+    parser.add_argument("--servers", nargs="+", choices=SERVERS,
+                        default=list(SERVERS))
+    args = parser.parse_args(argv)
+    db_latency = args.db_latency_ms / 1000
+
+    with tempfile.TemporaryDirectory() as directory:
+        database_url = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+        make_app(database_url, args.rows, args.categories)
+
+        for kind in args.servers:
+            base_url, process = start_server(kind, database_url, db_latency)
+            try:
+                summaries = run_benchmark(
+                    base_url, args.rows, args.categories, args.requests,
+                    args.concurrency)
+            finally:
+                process.terminate()
+                process.join()
+            print_report(
+                f"{kind}: {args.rows}x{args.categories}, "
+                f"{args.concurrency} concurrent, "
+                f"{args.db_latency_ms:g} ms per statement", summaries)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+"""
+Quiz room benchmark: one host pushing a quiz to N players over SSE.
+
+Seeds a synthetic question bank in a temporary SQLite file and serves
+it with the chosen stacks. For each --players count it creates a room,
+opens that many GET /rooms/<id>/events streams, and has the host step
+through the quiz, timing the host's POST /rooms/<id>/next and the time
+until the last player has the step. For comparison it then times the
+same number of players polling POST /quizzes once per question, which
+is what clients without a room do. The "advance" column times
+Room.advance in-process with no sockets: the step is encoded once and
+queued to each player. Run from the backend directory:
+
+    python -m benchmarks.rooms --players 1 10 100 500
+    python -m benchmarks.rooms --servers asgi --questions 20
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+
+from flaskr.rooms import QueueSubscriber, Room
+
+from .api import make_app
+from .common import percentile
+from .concurrency import SERVERS, start_server
+
+
+class Deliveries:
+    """Which players have received which event of a room."""
+
+    def __init__(self, players):
+        self.players = players
+        self.joined = 0
+        self.all_joined = asyncio.Event()
+        self.received = {}
+        self.waiters = {}
+
+    def join(self):
+        self.joined += 1
+        if self.joined == self.players:
+            self.all_joined.set()
+
+    def receive(self, event_id):
+        self.received[event_id] = self.received.get(event_id, 0) + 1
+        if self.received[event_id] == self.players:
+            self.waiter(event_id).set()
+
+    def waiter(self, event_id):
+        return self.waiters.setdefault(event_id, asyncio.Event())
+
+
+async def player(client, room_id, deliveries):
+    """Read a room's event stream to its end, reporting each event."""
+    async with client.stream("GET", f"/rooms/{room_id}/events") as response:
+        event_id = None
+        async for line in response.aiter_lines():
+            if line.startswith("id: "):
+                event_id = int(line[4:])
+            elif line == "event: state":
+                deliveries.join()
+            elif line.startswith("data: ") and event_id is not None:
+                deliveries.receive(event_id)
+                event_id = None
+
+
+async def host_room(client, players, questions, category):
+    """Host one room for `players`; returns (next ms, delivery ms) lists."""
+    response = await client.post("/rooms", json={
+        "quiz_category": {"id": category}, "count": questions})
+    response.raise_for_status()
+    room = response.json()
+    host = {"host_token": room["host_token"]}
+
+    deliveries = Deliveries(players)
+    readers = [asyncio.create_task(player(client, room["room_id"], deliveries))
+               for _ in range(players)]
+    await asyncio.wait_for(deliveries.all_joined.wait(), 60)
+
+    next_ms, delivery_ms = [], []
+    # every question and answer, then the end
+    for event_id in range(1, 2 * room["question_count"] + 2):
+        started = time.perf_counter()
+        response = await client.post(f"/rooms/{room['room_id']}/next",
+                                     json=host)
+        response.raise_for_status()
+        next_ms.append((time.perf_counter() - started) * 1000)
+        await asyncio.wait_for(deliveries.waiter(event_id).wait(), 60)
+        delivery_ms.append((time.perf_counter() - started) * 1000)
+    await asyncio.gather(*readers)
+    return next_ms, delivery_ms
+
+
+async def poll_rounds(client, players, questions, category):
+    """ms for `players` concurrent POST /quizzes, once per question."""
+    round_ms = []
+    for _ in range(questions):
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(client.post("/quizzes", json={
+            "previous_questions": [], "quiz_category": {"id": category}})
+            for _ in range(players)))
+        for response in responses:
+            response.raise_for_status()
+        round_ms.append((time.perf_counter() - started) * 1000)
+    return round_ms
+
+
+def advance_cost(players, questions):
+    """Median µs of Room.advance with `players` subscribed, in-process."""
+    questions = [{"id": i, "question": f"question {i}", "answer": "answer",
+                  "category": 1, "difficulty": 1} for i in range(questions)]
+    room = Room("bench", "host", 1, questions)
+    for _ in range(players):
+        room.subscribe(QueueSubscriber(2 * len(questions) + 2))
+    samples = []
+    for _ in range(2 * len(questions)):
+        started = time.perf_counter()
+        room.advance()
+        samples.append((time.perf_counter() - started) * 1e6)
+    return percentile(samples, 0.50)
+
+
+def run_benchmark(base_url, player_counts, questions, category=1):
+    async def run():
+        limits = httpx.Limits(max_connections=None,
+                              max_keepalive_connections=None)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits,
+                                     timeout=60) as client:
+            # builds the quiz index; keep it out of the numbers
+            await host_room(client, 1, 1, category)
+            results = {}
+            for players in player_counts:
+                next_ms, delivery_ms = await host_room(
+                    client, players, questions, category)
+                poll_ms = await poll_rounds(
+                    client, players, questions, category)
+                results[players] = {
+                    "next_p50_ms": percentile(next_ms, 0.50),
+                    "next_p95_ms": percentile(next_ms, 0.95),
+                    "delivery_p50_ms": percentile(delivery_ms, 0.50),
+                    "delivery_p95_ms": percentile(delivery_ms, 0.95),
+                    "poll_p50_ms": percentile(poll_ms, 0.50),
+                    "advance_us": advance_cost(players, questions),
+                }
+            return results
+
+    return asyncio.run(run())
+
+
+def print_rooms_report(title, results):
+    print(title)
+    print(f"{'players':>8}{'next p50':>10}{'next p95':>10}{'last p50':>10}"
+          f"{'last p95':>10}{'poll p50':>10}{'advance µs':>12}")
+    for players, r in results.items():
+        print(f"{players:>8}{r['next_p50_ms']:>10.2f}{r['next_p95_ms']:>10.2f}"
+              f"{r['delivery_p50_ms']:>10.2f}{r['delivery_p95_ms']:>10.2f}"
+              f"{r['poll_p50_ms']:>10.2f}{r['advance_us']:>12.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--categories", type=int, default=6)
+    parser.add_argument("--players", type=int, nargs="+",
+                        default=[1, 10, 100])
+    parser.add_argument("--questions", type=int, default=10,
+                        help="questions per room")
+    parser.add_argument("--servers", nargs="+", choices=SERVERS,
+                        default=list(SERVERS))
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        database_url = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+        make_app(database_url, args.rows, args.categories)
+
+        for kind in args.servers:
+            base_url, process = start_server(kind, database_url, 0)
+            try:
+                results = run_benchmark(base_url, args.players,
+                                        args.questions)
+            finally:
+                process.terminate()
+                process.join()
+            print_rooms_report(
+                f"{kind}: {args.questions} questions per room; ms for the "
+                "host's next, until the last player has it, and for one "
+                "polling round", results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""
+Startup benchmark: worker cold start, with and without warmup.
+
+Seeds a synthetic question bank in a temporary SQLite file, then boots
+the app --runs times in fresh interpreters (as a new worker would) and
+reports the median time of each phase: importing flaskr, create_app,
+the optional warmup (WARMUP_ON_START), the first GET /questions, POST
+/quizzes and search, and last the schema check (`upgrade-db`) that
+create_app used to run on every boot. Run from the backend directory:
+
+    python -m benchmarks.startup --rows 20000
+    python -m benchmarks.startup --rows 100000 --runs 3
+"""
+import argparse
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+# no flaskr/models imports up here: the spawned children import this
+# module too, and the import of flaskr is one of the phases they time
+
+
+def boot(database_url, warm, results):
+    """Boot one app in this (fresh) process and time each phase."""
+    phases = {}
+
+    started = time.perf_counter()
+    from flaskr import create_app
+    from migrations import upgrade
+    phases["import flaskr"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    app = create_app({"SQLALCHEMY_DATABASE_URI": database_url})
+    phases["create_app"] = time.perf_counter() - started
+    if warm:
+        # what WARMUP_ON_START runs at the end of create_app
+        from flaskr.warmup import warmup
+        started = time.perf_counter()
+        warmup(app)
+        phases["warmup"] = time.perf_counter() - started
+
+    client = app.test_client()
+    requests = {
+        "first GET /questions":
+            lambda: client.get("/questions?page=1"),
+        "first POST /quizzes":
+            lambda: client.post("/quizzes", json={
+                "previous_questions": [], "quiz_category": {"id": 0}}),
+        "first POST /questions/search":
+            lambda: client.post("/questions/search",
+                                json={"searchTerm": "river"}),
+    }
+    for name, call in requests.items():
+        started = time.perf_counter()
+        response = call()
+        phases[name] = time.perf_counter() - started
+        if response.status_code >= 500:
+            raise RuntimeError(f"{name}: {response.status_code}")
+
+    with app.app_context():
+        started = time.perf_counter()
+        upgrade()
+        phases["upgrade-db (no longer per boot)"] = (
+            time.perf_counter() - started)
+    results.put(phases)
+
+
+def run_boots(database_url, warm, runs):
+    """Median seconds per phase over `runs` boots in spawned processes."""
+    context = multiprocessing.get_context("spawn")
+    samples = {}
+    for _ in range(runs):
+        results = context.Queue()
+        process = context.Process(target=boot,
+                                  args=(database_url, warm, results))
+        process.start()
+        phases = results.get(timeout=300)
+        process.join()
+        for name, seconds in phases.items():
+            samples.setdefault(name, []).append(seconds)
+    return {name: statistics.median(values)
+            for name, values in samples.items()}
+
+
+def print_startup_report(title, cold, warm):
+    print(title)
+    print(f"{'phase':<36}{'cold ms':>10}{'warm ms':>10}")
+    for name in dict.fromkeys([*warm, *cold]):
+        columns = "".join(
+            f"{result[name] * 1000:>10.1f}" if name in result else f"{'-':>10}"
+            for result in (cold, warm))
+        print(f"{name:<36}{columns}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--categories", type=int, default=6)
+    parser.add_argument("--runs", type=int, default=5,
+                        help="boots per mode; medians are reported")
+    args = parser.parse_args(argv)
+
+    from flaskr import create_app
+    from migrations import upgrade
+    from models import db
+
+    from .common import seed_synthetic
+
+    with tempfile.TemporaryDirectory() as directory:
+        database_url = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+        app = create_app({"SQLALCHEMY_DATABASE_URI": database_url})
+        with app.app_context():
+            upgrade()
+            seed_synthetic(args.rows, args.categories)
+            db.engine.dispose()
+
+        cold = run_boots(database_url, False, args.runs)
+        warm = run_boots(database_url, True, args.runs)
+    print_startup_report(
+        f"startup: {args.rows}x{args.categories}, median of {args.runs} boots",
+        cold, warm)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,24 +1,307 @@
-from flask import Flask, request, abort, jsonify
+from flask import (Flask, Response, request, abort, jsonify,
+                   stream_with_context)
+import click
 from flask_cors import CORS
-import random
 from flask_sqlalchemy import pagination
 
-from models import setup_db, Question, Category, db
-
-QUESTIONS_PER_PAGE = 10
+from migrations import HEAD as MIGRATIONS_HEAD, upgrade as upgrade_db
+from models import (setup_db, add_question_listener, add_category_listener,
+                    Question, db)
+from .bulk import export_rows, insert_chunk, read_records
+from .categories import CategoryCache
+from .compression import Compression
+from .conditional import ListingETags, versioned
+from .contracts import (ANY_DIFFICULTY, MAX_BATCH_DELETE, QUESTION_COLUMNS,
+                        RequestError, batch_delete_ids, body_search_term,
+                        categories_body, categories_etag, created_body,
+                        deleted_body, duplicate_rejection, error_body,
+                        in_order, listing_body, missing_ids, page_key,
+                        page_window, question_fields, question_records,
+                        quiz_body, quiz_request, quiz_result_fields,
+                        ranked_page, room_body, room_created_body,
+                        round_body, round_request, search_body,
+                        search_page_key, search_term)
+from .counts import CountCache
+from .duplicates import DuplicateIndex, batch_index, find_duplicates
+from .encoding import FastJSONProvider
+from .fixtures import DEFAULT_FIXTURES, seed_db
+from .metrics import RequestMetrics, count_rows
+from .render_cache import RenderCache
+from .replicas import ReplicaRouting
+from .results import Leaderboard, ResultWriter, result_row
+from .rooms import QueueSubscriber, Rooms
+from .search import SearchIndex
+from .selection import QuestionIndex
+from .sessions import QuizSessions
+from .stores import make_store
+from .warmup import warmup
+
+# seconds a cached total_questions may lag behind other workers' writes
+COUNT_CACHE_TTL = 30
+SEARCH_INDEX_TTL = 300
+# rows per executemany/transaction in POST /questions/bulk
+BULK_CHUNK_SIZE = 1000
+# what POST /questions and /questions/bulk do with a question whose text
+# nearly repeats an existing one: "off", "flag" (report it) or "reject"
+DUPLICATE_POLICY = "off"
+DUPLICATE_POLICIES = ("off", "flag", "reject")
+# estimated Jaccard similarity of the texts' character shingles
+DUPLICATE_THRESHOLD = 0.8
+DUPLICATE_INDEX_TTL = 300
+# seconds before the quiz id index is reloaded to pick up other workers' writes
+QUIZ_INDEX_TTL = 300
+QUIZ_SESSION_STORE = "memory"
+QUIZ_SESSION_TTL = 3600
+QUIZ_SESSION_MAX = 10000
+CATEGORY_CACHE_TTL = 60
+# seconds clients and proxies may reuse a /categories response
+CATEGORIES_MAX_AGE = 60
+METRICS_ENABLED = True
+COMPRESSION_ENABLED = True
+# smaller responses are sent as they are
+COMPRESS_MIN_SIZE = 500
+COMPRESS_GZIP_LEVEL = 6
+COMPRESS_BROTLI_QUALITY = 4
+# seconds a listing ETag may outlive other workers' writes
+LISTING_ETAG_WINDOW = 30
+RENDER_CACHE_ENABLED = True
+RENDER_CACHE_STORE = "memory"
+# seconds a rendered listing page is served from the cache
+RENDER_CACHE_TTL = 5
+RENDER_CACHE_MAX = 1000
+# seconds a client reads from the primary after its own write; should
+# exceed the replication lag
+REPLICA_STICKY_SECONDS = 10
+# POST endpoints that only read the database, served by replicas
+REPLICA_READ_ENDPOINTS = ('search_questions', 'get_random_question_for_quiz',
+                          'get_quiz_round', 'next_quiz_session_question',
+                          'create_quiz_room')
+# log requests slower than this many ms with their SQL; None disables
+SLOW_REQUEST_MS = None
+# load the caches and indexes in create_app (e.g. before gunicorn forks)
+WARMUP_ON_START = False
+# quiz results are buffered and inserted this many rows at a time, or
+# every RESULTS_FLUSH_INTERVAL seconds (None: only when the buffer fills)
+RESULTS_FLUSH_SIZE = 500
+RESULTS_FLUSH_INTERVAL = 1.0
+# unwritten results kept while the database is unavailable
+RESULTS_MAX_PENDING = 100000
+# results kept per category board, and returned when ?limit= is not given
+LEADERBOARD_SIZE = 100
+LEADERBOARD_LIMIT = 10
+# seconds before the boards are reloaded to pick up other workers' results
+LEADERBOARD_TTL = 30
+# live quiz rooms of this process; idle rooms are dropped after ROOM_TTL
+ROOM_MAX = 1000
+ROOM_TTL = 3600
+# seconds between keepalive comments on an idle room event stream
+ROOM_KEEPALIVE = 15
+# events queued per player before a slow one is disconnected
+ROOM_SUBSCRIBER_QUEUE = 64
 
 
 def paginate_questions(request, selection):
-    page = request.args.get("page", 1, type=int)
-    paginated = selection.paginate(page=page, per_page=QUESTIONS_PER_PAGE, error_out=False)
-    current_questions = [question.format() for question in paginated.items]
+    """One page of a selection ordered by Question.id, see page_window."""
+    after, offset, limit = page_window(request.args)
+    selection = selection.with_entities(*QUESTION_COLUMNS)
+    if after is not None:
+        selection = selection.filter(Question.id > after)
+    current_questions = question_records(
+        selection.offset(offset).limit(limit).all())
+    count_rows(len(current_questions))
 
     return current_questions
 
+
+def search_cache_key(request):
+    """Render cache tag and arguments of a search, None to not cache it."""
+    if request.method == "GET":
+        search = request.args.get("searchTerm")
+    else:
+        body = request.get_json(silent=True)
+        search = body.get("searchTerm") if isinstance(body, dict) else None
+    return search_page_key(search, request.args)
+
+
+def questions_by_ids(ids):
+    """Load the questions with ids in one query, keeping their order."""
+    if not ids:
+        return []
+
+    questions = in_order(ids, db.session.query(*QUESTION_COLUMNS).filter(
+        Question.id.in_(ids)))
+    count_rows(len(questions))
+    return questions
+
+
+def sample_questions(question_index, category, count, exclude=(),
+                     difficulties=(ANY_DIFFICULTY,)):
+    """
+    Up to count distinct random questions of category, none of them in
+    exclude, loaded in one query. Ids deleted by another worker since
+    the index was built are dropped from it.
+    """
+    question_ids = question_index.sample_ids(
+        category, count, exclude, difficulties=difficulties)
+    questions = questions_by_ids(question_ids)
+    for question_id in missing_ids(question_ids, questions):
+        question_index.discard(question_id)
+    return questions
+
+
 def create_app(test_config=None):
     # create and configure the app
     app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    app.config.from_mapping(
+        BULK_CHUNK_SIZE=BULK_CHUNK_SIZE,
+        CATEGORY_CACHE_TTL=CATEGORY_CACHE_TTL,
+        CATEGORIES_MAX_AGE=CATEGORIES_MAX_AGE,
+        COMPRESSION_ENABLED=COMPRESSION_ENABLED,
+        COMPRESS_BROTLI_QUALITY=COMPRESS_BROTLI_QUALITY,
+        COMPRESS_GZIP_LEVEL=COMPRESS_GZIP_LEVEL,
+        COMPRESS_MIN_SIZE=COMPRESS_MIN_SIZE,
+        COUNT_CACHE_TTL=COUNT_CACHE_TTL,
+        DUPLICATE_INDEX_TTL=DUPLICATE_INDEX_TTL,
+        DUPLICATE_POLICY=DUPLICATE_POLICY,
+        DUPLICATE_THRESHOLD=DUPLICATE_THRESHOLD,
+        LISTING_ETAG_WINDOW=LISTING_ETAG_WINDOW,
+        METRICS_ENABLED=METRICS_ENABLED,
+        QUIZ_INDEX_TTL=QUIZ_INDEX_TTL,
+        QUIZ_SESSION_MAX=QUIZ_SESSION_MAX,
+        QUIZ_SESSION_STORE=QUIZ_SESSION_STORE,
+        QUIZ_SESSION_TTL=QUIZ_SESSION_TTL,
+        RENDER_CACHE_ENABLED=RENDER_CACHE_ENABLED,
+        RENDER_CACHE_MAX=RENDER_CACHE_MAX,
+        RENDER_CACHE_STORE=RENDER_CACHE_STORE,
+        RENDER_CACHE_TTL=RENDER_CACHE_TTL,
+        REPLICA_STICKY_SECONDS=REPLICA_STICKY_SECONDS,
+        SEARCH_INDEX_TTL=SEARCH_INDEX_TTL,
+        LEADERBOARD_LIMIT=LEADERBOARD_LIMIT,
+        LEADERBOARD_SIZE=LEADERBOARD_SIZE,
+        LEADERBOARD_TTL=LEADERBOARD_TTL,
+        RESULTS_FLUSH_INTERVAL=RESULTS_FLUSH_INTERVAL,
+        RESULTS_FLUSH_SIZE=RESULTS_FLUSH_SIZE,
+        RESULTS_MAX_PENDING=RESULTS_MAX_PENDING,
+        ROOM_KEEPALIVE=ROOM_KEEPALIVE,
+        ROOM_MAX=ROOM_MAX,
+        ROOM_SUBSCRIBER_QUEUE=ROOM_SUBSCRIBER_QUEUE,
+        ROOM_TTL=ROOM_TTL,
+        SLOW_REQUEST_MS=SLOW_REQUEST_MS,
+        WARMUP_ON_START=WARMUP_ON_START,
+    )
+    if test_config is not None:
+        app.config.update(test_config)
     setup_db(app)
+
+    question_index = QuestionIndex(ttl=app.config['QUIZ_INDEX_TTL'])
+    app.extensions['question_index'] = question_index
+    add_question_listener(app, question_index.on_question_change)
+
+    quiz_sessions = QuizSessions(
+        make_store(app.config['QUIZ_SESSION_STORE'],
+                   max_entries=app.config['QUIZ_SESSION_MAX'],
+                   ttl=app.config['QUIZ_SESSION_TTL']),
+        question_index)
+    app.extensions['quiz_sessions'] = quiz_sessions
+
+    result_writer = ResultWriter(
+        app, flush_size=app.config['RESULTS_FLUSH_SIZE'],
+        flush_interval=app.config['RESULTS_FLUSH_INTERVAL'],
+        max_pending=app.config['RESULTS_MAX_PENDING'])
+    app.extensions['result_writer'] = result_writer
+    leaderboard = Leaderboard(size=app.config['LEADERBOARD_SIZE'],
+                              ttl=app.config['LEADERBOARD_TTL'],
+                              pending=result_writer.snapshot)
+    app.extensions['leaderboard'] = leaderboard
+
+    rooms = Rooms(max_rooms=app.config['ROOM_MAX'],
+                  ttl=app.config['ROOM_TTL'])
+    app.extensions['quiz_rooms'] = rooms
+
+    category_cache = CategoryCache(ttl=app.config['CATEGORY_CACHE_TTL'])
+    app.extensions['category_cache'] = category_cache
+    add_category_listener(app, category_cache.on_category_change)
+
+    count_cache = CountCache(ttl=app.config['COUNT_CACHE_TTL'])
+    app.extensions['count_cache'] = count_cache
+    add_question_listener(app, count_cache.on_question_change)
+    add_category_listener(app, count_cache.on_category_change)
+
+    search_index = SearchIndex(ttl=app.config['SEARCH_INDEX_TTL'])
+    app.extensions['search_index'] = search_index
+    add_question_listener(app, search_index.on_question_change)
+
+    if app.config['DUPLICATE_POLICY'] not in DUPLICATE_POLICIES:
+        raise ValueError(
+            f"Unknown DUPLICATE_POLICY: {app.config['DUPLICATE_POLICY']}")
+    duplicate_index = DuplicateIndex(
+        threshold=app.config['DUPLICATE_THRESHOLD'],
+        ttl=app.config['DUPLICATE_INDEX_TTL'])
+    app.extensions['duplicate_index'] = duplicate_index
+    add_question_listener(app, duplicate_index.on_question_change)
+
+    render_cache = RenderCache(
+        make_store(app.config['RENDER_CACHE_STORE'],
+                   max_entries=app.config['RENDER_CACHE_MAX'],
+                   ttl=app.config['RENDER_CACHE_TTL']))
+    app.extensions['render_cache'] = render_cache
+    if app.config['RENDER_CACHE_ENABLED']:
+        add_question_listener(app, render_cache.on_question_change)
+        add_category_listener(app, render_cache.on_category_change)
+        cached = render_cache.cached
+    else:
+        def cached(tag_and_args):
+            return lambda view: view
+
+    app.extensions['listing_etags'] = ListingETags(
+        window=app.config['LISTING_ETAG_WINDOW'])
+
+    if app.config['METRICS_ENABLED']:
+        RequestMetrics(app)
+    if app.config['COMPRESSION_ENABLED']:
+        Compression(app)
+    if app.config['DB_REPLICA_URLS']:
+        ReplicaRouting(app, REPLICA_READ_ENDPOINTS)
+
+    @app.cli.command("seed-db")
+    @click.option("--fixtures", default=DEFAULT_FIXTURES,
+                  help="pg_dump file with COPY blocks, e.g. trivia.psql")
+    def seed_db_command(fixtures):
+        """Create the tables and load the fixture questions."""
+        upgrade_db()
+        seed_db(fixtures)
+        click.echo(f"Seeded database from {fixtures}")
+
+    @app.cli.command("dedup-questions")
+    @click.option("--threshold", type=float, default=None,
+                  help="similarity from 0 to 1 (default DUPLICATE_THRESHOLD)")
+    @click.option("--delete", is_flag=True,
+                  help="delete the duplicates instead of only listing them")
+    def dedup_questions_command(threshold, delete):
+        """List (or delete) near-duplicate questions, keeping the oldest."""
+        if threshold is None:
+            threshold = app.config['DUPLICATE_THRESHOLD']
+        duplicates = []
+        for question_id, original_id, score in find_duplicates(threshold):
+            click.echo(f"{question_id} repeats {original_id} ({score:.2f})")
+            duplicates.append(question_id)
+
+        if delete:
+            for start in range(0, len(duplicates), MAX_BATCH_DELETE):
+                Question.delete_ids(duplicates[start:start + MAX_BATCH_DELETE])
+            click.echo(f"Deleted {len(duplicates)} duplicate questions")
+        else:
+            click.echo(f"Found {len(duplicates)} duplicate questions")
+
+    @app.cli.command("upgrade-db")
+    def upgrade_db_command():
+        """Apply pending schema migrations."""
+        applied = upgrade_db()
+        if applied:
+            click.echo(f"Applied migrations {applied}")
+        click.echo(f"Database is at schema version {MIGRATIONS_HEAD}")
+
     """
     @TODO: Set up CORS. Allow '*' for origins.
     Delete the sample route after completing the TODOs
@@ -40,9 +323,6 @@ def create_app(test_config=None):
         )
         return response
 
-    with app.app_context():
-        db.create_all()
-
     """
     @TODO:
     Create an endpoint to handle GET requests
@@ -51,19 +331,24 @@ def create_app(test_config=None):
     @app.route("/categories", methods=["GET"])
     def retrieve_categories():
         try:
-            category = Category.query.order_by(Category.type).all()
+            category_map = category_cache.get()
 
-            if len(category) == 0:
+            if len(category_map.categories) == 0:
                 abort(404)
 
-            categories = {}
-            for cat in category:
-                categories[cat.id] = cat.type
-
-            return jsonify({
-                    "success": True,
-                    "categories": categories
-            })
+            if request.args.get("with_counts", 0, type=int):
+                counts = count_cache.get()
+                response = jsonify(categories_body(category_map, counts))
+                # counts change with every question, so always revalidate
+                response.set_etag(categories_etag(category_map, counts))
+                response.cache_control.no_cache = True
+                return response.make_conditional(request)
+
+            response = jsonify(categories_body(category_map))
+            response.set_etag(categories_etag(category_map))
+            response.cache_control.public = True
+            response.cache_control.max_age = app.config['CATEGORIES_MAX_AGE']
+            return response.make_conditional(request)
         except Exception as e:
             print(f"Error retrieving categories: {e}")
             abort(500)
@@ -82,6 +367,8 @@ def create_app(test_config=None):
     Clicking on the page numbers should update the questions.
     """
     @app.route("/questions", methods=["GET"])
+    @versioned('questions', 'categories')
+    @cached(lambda request: ("questions", page_key(request.args)))
     def retrieve_questions():
         try:
             selection = Question.query.order_by(Question.id)
@@ -89,18 +376,9 @@ def create_app(test_config=None):
             if len(current_questions) == 0:
                 abort(404)
 
-            category = Category.query.order_by(Category.type).all()
-            categories = {}
-            for cat in category:
-                categories[cat.id] = cat.type
-
-            return jsonify({
-                    "success": True,
-                    "questions": current_questions,
-                    "total_questions": selection.count(),
-                    "categories": categories,
-                    "current_category": None
-            })
+            return jsonify(listing_body(
+                request.args, current_questions, count_cache.total(), None,
+                categories=category_cache.get().categories))
         except Exception as e:
             print(f"Error retrieving questions: {e}")
             abort(404)
@@ -116,22 +394,29 @@ def create_app(test_config=None):
     @app.route("/questions/<question_id>", methods=["DELETE"])
     def delete_question(question_id):
         try:
-            question = Question.query.filter(
-                Question.id == question_id).one_or_none()
+            deleted = Question.delete_ids([int(question_id)])
 
-            if question is None:
+            if not deleted:
                 abort(404)
 
-            question.delete()
-            selection = Question.query.order_by(Question.id)
-            current_questions = paginate_questions(request, selection)
+            return jsonify(deleted_body(question_id))
+        except Exception as e:
+            print(f"Error deleting questions: {e}")
+            abort(422)
 
-            return jsonify({
-                    "success": True,
-                    "deleted": question_id,
-            })
+    """
+    Batch delete: {"ids": [...]} removes up to MAX_BATCH_DELETE questions
+    with a single statement and returns the ids that existed.
+    """
+    @app.route("/questions", methods=["DELETE"])
+    def delete_questions():
+        ids = batch_delete_ids(request.get_json(silent=True))
+
+        try:
+            return jsonify(deleted_body(Question.delete_ids(ids)))
         except Exception as e:
             print(f"Error deleting questions: {e}")
+            db.session.rollback()
             abort(422)
 
     """
@@ -149,37 +434,111 @@ def create_app(test_config=None):
     def create_question():
         body = request.get_json()
 
-        # to check if the body has all the fields
-        if not ('question' in body and 'answer' in body and
-                'difficulty' in body and 'category' in body):
-            abort(422)
-
-        new_question = body.get('question')
-        new_answer = body.get('answer')
-        new_difficulty = body.get('difficulty')
-        new_category = body.get('category')
-
         # to check if all fields are provided by user
-        if ((new_question is None or new_question == "") or
-            (new_answer is None or new_answer == "") or
-            (new_difficulty is None or new_difficulty == "") or
-            (new_category is None or new_category == "")):
+        fields = question_fields(body)
+        if fields is None:
             abort(422)
 
+        policy = app.config['DUPLICATE_POLICY']
+        duplicate_of = None
+        if policy != 'off':
+            try:
+                match = duplicate_index.find(str(fields['question']))
+            except Exception as e:
+                print(f"Error checking for duplicate questions: {e}")
+                abort(500)
+            duplicate_of = match[0] if match else None
+            rejection = duplicate_rejection(policy, body, duplicate_of)
+            if rejection is not None:
+                return jsonify(rejection), 409
+
         try:
-            create_quest = Question(
-                question=new_question, answer=new_answer,
-                difficulty=new_difficulty, category=new_category)
+            create_quest = Question(**fields)
             create_quest.insert()
 
-            return jsonify({
-                    "success": True,
-                    "created": create_quest.id,
-            }), 201
+            return jsonify(
+                created_body(create_quest.id, policy, duplicate_of)), 201
         except Exception as e:
             print(f"Error creating questions: {e}")
             abort(422)
 
+    """
+    Bulk import: a JSON Lines (application/x-ndjson) or CSV (text/csv)
+    body with one question per line, validated like POST /questions and
+    inserted BULK_CHUNK_SIZE rows per transaction. Invalid lines are
+    skipped and reported back by line number. When the import fails
+    midway, the error says how many questions were created and which
+    lines were not, so the client can resend from there.
+    """
+    @app.route("/questions/bulk", methods=["POST"])
+    def bulk_create_questions():
+        created = 0
+        errors = []
+        chunk = []
+        # first and last line read since the last committed chunk
+        first_pending = last_line = None
+        policy = app.config['DUPLICATE_POLICY']
+        duplicates = []
+        # lines of the current chunk, which the index does not have yet
+        batch = batch_index(app.config['DUPLICATE_THRESHOLD'])
+
+        try:
+            for line_number, record in read_records(
+                    request.stream, request.mimetype):
+                if first_pending is None:
+                    first_pending = line_number
+                last_line = line_number
+                fields = question_fields(record)
+                if fields is None:
+                    errors.append(line_number)
+                    continue
+                if policy != 'off':
+                    text = str(fields['question'])
+                    if (duplicate_index.find(text) or
+                            batch.match(text)) is not None:
+                        duplicates.append(line_number)
+                        if policy == 'reject':
+                            continue
+                    batch.add(line_number, text)
+                chunk.append(fields)
+                if len(chunk) >= app.config['BULK_CHUNK_SIZE']:
+                    created += len(insert_chunk(chunk))
+                    chunk = []
+                    first_pending = None
+                    batch = batch_index(app.config['DUPLICATE_THRESHOLD'])
+            if chunk:
+                created += len(insert_chunk(chunk))
+        except Exception as e:
+            print(f"Error importing questions: {e}")
+            db.session.rollback()
+            status = 400 if isinstance(e, ValueError) else 422
+            response = dict(error_body(status), created=created,
+                            invalid_lines=errors)
+            if first_pending is not None:
+                response["failed_lines"] = [first_pending, last_line]
+            return jsonify(response), status
+
+        response = {
+                "success": True,
+                "created": created,
+                "invalid_lines": errors,
+        }
+        if policy != 'off':
+            response["duplicate_lines"] = duplicates
+        return jsonify(response), 201
+
+    @app.route("/questions/export", methods=["GET"])
+    def export_questions():
+        file_format = request.args.get("format", "jsonl")
+        if file_format not in ("jsonl", "csv"):
+            abort(400)
+
+        mimetype = "text/csv" if file_format == "csv" else "application/x-ndjson"
+        return Response(
+            stream_with_context(export_rows(file_format)), mimetype=mimetype,
+            headers={"Content-Disposition":
+                     f"attachment; filename=questions.{file_format}"})
+
     """
     @TODO:
     Create a POST endpoint to get questions based on a search term.
@@ -190,24 +549,24 @@ def create_app(test_config=None):
     only question that include that string within their question.
     Try using the word "title" to start.
     """
-    @app.route("/questions/search", methods=["POST"])
+    @app.route("/questions/search", methods=["GET", "POST"])
+    @versioned('questions')
+    @cached(search_cache_key)
     def search_questions():
-        body = request.get_json()
-
-        search = body.get("searchTerm", None)
+        if request.method == "GET":
+            search = search_term(request.args.get("searchTerm"))
+        else:
+            search = body_search_term(request.get_json())
 
+        # falsy terms are never searched, and fail below as they always did
         try:
             if search:
-                selection = Question.query.order_by(Question.id).filter(
-                    Question.question.ilike("%{}%".format(search)))
-                current_questions = paginate_questions(request, selection)
-
-                return jsonify({
-                        "success": True,
-                        "questions": current_questions,
-                        "total_questions": selection.count(),
-                        "current_category": None
-                })
+                ranked_ids = search_index.search(search)
+                current_questions = questions_by_ids(
+                    ranked_page(request.args, ranked_ids))
+
+                return jsonify(search_body(
+                    request.args, current_questions, len(ranked_ids)))
             abort(404)
         except Exception as e:
             print(f"Error searching questions: {e}")
@@ -222,6 +581,9 @@ def create_app(test_config=None):
     category to be shown.
     """
     @app.route('/categories/<int:category_id>/questions', methods=['GET'])
+    @versioned('questions')
+    @cached(lambda request: (
+        f"category:{request.view_args['category_id']}", page_key(request.args)))
     def retrieve_questions_by_category(category_id):
         selection = Question.query.order_by(
             Question.id).filter(Question.category == category_id)
@@ -231,12 +593,9 @@ def create_app(test_config=None):
             if len(current_questions) == 0:
                 abort(404)
 
-            return jsonify({
-                    "success": True,
-                    "questions": current_questions,
-                    "total_questions": selection.count(),
-                    "current_category": category_id
-            })
+            return jsonify(listing_body(
+                request.args, current_questions,
+                count_cache.total(category_id), category_id))
         except Exception as e:
             print(f"Error retrieving questions by category: {e}")
             abort(500)
@@ -254,41 +613,226 @@ def create_app(test_config=None):
     """
     @app.route('/quizzes', methods=['POST'])
     def get_random_question_for_quiz():
+        category_id, previous_ids, difficulty, difficulties = quiz_request(
+            request.get_json())
+
+        try:
+            quiz_question = question_index.pick(
+                category_id, previous_ids, difficulties)
+            if quiz_question is not None:
+                new_question = quiz_question.format()
+            else:
+                new_question = None
 
+            return jsonify(quiz_body(new_question, difficulty))
+        except Exception as e:
+            print(f"Error playing quiz: {e}")
+            abort(500)
+
+    """
+    A whole quiz round in one call: up to "count" distinct random
+    questions for the category, none of them in previous_questions.
+    Takes the same difficulty options as /quizzes.
+    """
+    @app.route('/quizzes/round', methods=['POST'])
+    def get_quiz_round():
+        (category_id, count, previous_ids, difficulty,
+         difficulties) = round_request(request.get_json())
+
+        try:
+            questions = sample_questions(
+                question_index, category_id, count, previous_ids,
+                difficulties)
+
+            return jsonify(round_body(questions, difficulty))
+        except Exception as e:
+            print(f"Error playing quiz round: {e}")
+            abort(500)
+
+    """
+    Server-side quiz sessions: the client creates a session for a
+    category once, then asks for the next question by session id
+    instead of sending every previous question back.
+    """
+    @app.route('/quizzes/sessions', methods=['POST'])
+    def create_quiz_session():
         body = request.get_json()
-        if not ('quiz_category' in body and 'previous_questions' in body):
+        if not (body and 'quiz_category' in body):
             abort(422)
 
         quiz_category = body.get('quiz_category')
-        previous_questions = body.get('previous_questions')
+        if quiz_category is None:
+            abort(400)
+
+        try:
+            session_id = quiz_sessions.create(quiz_category.get('id', 0))
+
+            return jsonify({
+                'success': True,
+                'session_id': session_id,
+                'quiz_category': quiz_category
+            }), 201
+        except Exception as e:
+            print(f"Error creating quiz session: {e}")
+            abort(422)
+
+    @app.route('/quizzes/sessions/<session_id>/next', methods=['POST'])
+    def next_quiz_session_question(session_id):
+        try:
+            quiz_question = quiz_sessions.next_question(session_id)
+        except KeyError:
+            abort(404)
+        except Exception as e:
+            print(f"Error playing quiz session: {e}")
+            abort(500)
+
+        return jsonify({
+            'success': True,
+            'question': quiz_question.format() if quiz_question else None
+        })
+
+    @app.route('/quizzes/sessions/<session_id>', methods=['DELETE'])
+    def end_quiz_session(session_id):
+        quiz_sessions.end(session_id)
+
+        return jsonify(deleted_body(session_id))
 
-        if ((quiz_category is None) or (previous_questions is None)):
+    """
+    Quiz results and the leaderboard. Results are accepted into an
+    in-memory buffer (202) and written in batches by the ResultWriter;
+    the response carries the rank on the category's board, null when
+    the score is not in the top LEADERBOARD_SIZE.
+    """
+    @app.route('/quizzes/results', methods=['POST'])
+    def submit_quiz_result():
+        body = request.get_json()
+        if not (body and 'player' in body and 'score' in body and
+                'questions' in body):
+            abort(422)
+
+        try:
+            player, category, score, questions = quiz_result_fields(body)
+        except (TypeError, ValueError):
+            abort(400)
+        if category and category not in category_cache.get().categories:
             abort(400)
 
         try:
-            category_id = quiz_category['id']
+            row = result_row(player, category, score, questions)
+            rank = leaderboard.add(row)
+            result_writer.add(row)
 
-            if category_id == 0:
-                quiz_questions = Question.query.filter(
-                    Question.id.notin_((previous_questions))).all()
-            else:
-                quiz_questions = Question.query.filter(
-                    Question.category == category_id).filter(
-                    Question.id.notin_((previous_questions))).all()
+            return jsonify({
+                'success': True,
+                'rank': rank
+            }), 202
+        except Exception as e:
+            print(f"Error saving quiz result: {e}")
+            abort(500)
 
-            if len(quiz_questions) > 0:
-                new_question = random.choice(quiz_questions).format()
-            else:
-                new_question = None
+    @app.route('/leaderboard', methods=['GET'])
+    def get_leaderboard():
+        category = request.args.get('category', 0, type=int)
+        limit = request.args.get(
+            'limit', app.config['LEADERBOARD_LIMIT'], type=int)
+        if not 1 <= limit <= app.config['LEADERBOARD_SIZE']:
+            abort(400)
 
+        try:
             return jsonify({
                 'success': True,
-                'question': new_question
+                'category': category,
+                'results': leaderboard.top(category, limit)
             })
         except Exception as e:
-            print(f"Error playing quiz: {e}")
+            print(f"Error retrieving leaderboard: {e}")
             abort(500)
 
+    """
+    Live quiz rooms. The host creates a room, which picks its questions
+    once like /quizzes/round, and steps through them with /next; each
+    step (a question, its answer, the end) is pushed to every player
+    on GET /rooms/<room_id>/events as Server-Sent Events. Rooms live in
+    the memory of the process that created them.
+    """
+    @app.route('/rooms', methods=['POST'])
+    def create_quiz_room():
+        category_id, count, previous_ids, _, difficulties = round_request(
+            request.get_json())
+
+        try:
+            questions = sample_questions(
+                question_index, category_id, count, previous_ids,
+                difficulties)
+        except Exception as e:
+            print(f"Error creating quiz room: {e}")
+            abort(500)
+        if not questions:
+            abort(404)
+
+        room = rooms.create(category_id, questions)
+        return jsonify(room_created_body(room, questions)), 201
+
+    @app.route('/rooms/<room_id>', methods=['GET'])
+    def get_quiz_room(room_id):
+        try:
+            room = rooms.get(room_id)
+        except KeyError:
+            abort(404)
+
+        return jsonify(room_body(room))
+
+    @app.route('/rooms/<room_id>/events', methods=['GET'])
+    def quiz_room_events(room_id):
+        try:
+            room = rooms.get(room_id)
+        except KeyError:
+            abort(404)
+
+        subscriber = QueueSubscriber(app.config['ROOM_SUBSCRIBER_QUEUE'])
+        backlog = room.subscribe(subscriber)
+
+        def stream():
+            try:
+                yield from backlog
+                yield from subscriber.messages(app.config['ROOM_KEEPALIVE'])
+            finally:
+                room.unsubscribe(subscriber)
+
+        return Response(stream(), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+        })
+
+    @app.route('/rooms/<room_id>/next', methods=['POST'])
+    def advance_quiz_room(room_id):
+        body = request.get_json(silent=True) or {}
+        try:
+            room = rooms.host_room(room_id, body.get('host_token'))
+        except KeyError:
+            abort(404)
+        except PermissionError:
+            abort(403)
+
+        event = room.advance()
+        if event is None:
+            abort(422)
+
+        return jsonify(room_body(room, event=event))
+
+    @app.route('/rooms/<room_id>', methods=['DELETE'])
+    def close_quiz_room(room_id):
+        body = request.get_json(silent=True) or {}
+        try:
+            rooms.host_room(room_id, body.get('host_token'))
+            rooms.remove(room_id)
+        except KeyError:
+            abort(404)
+        except PermissionError:
+            abort(403)
+
+        return jsonify(deleted_body(room_id))
+
     """
     @TODO:
     Create error handlers for all expected errors
@@ -302,6 +846,14 @@ def create_app(test_config=None):
             404,
         )
 
+    @app.errorhandler(403)
+    def forbidden(error):
+        return (
+            jsonify({"success": False, "error": 403,
+                     "message": "forbidden"}),
+            403,
+        )
+
     @app.errorhandler(422)
     def unprocessable(error):
         return (
@@ -318,6 +870,10 @@ def create_app(test_config=None):
             400,
         )
 
+    @app.errorhandler(RequestError)
+    def invalid_request(error):
+        return jsonify(error_body(error.status)), error.status
+
     @app.errorhandler(500)
     def internal_server(error):
         return (
@@ -325,4 +881,7 @@ def create_app(test_config=None):
                      "message": "internal server error"}), 
             500,
         )
+
+    if app.config['WARMUP_ON_START']:
+        warmup(app)
     return app
\ No newline at end of file
@@ -0,0 +1,697 @@
+"""
+Async (ASGI) serving mode for the trivia API.
+
+Serves the endpoints the frontend uses with the same URLs, JSON bodies
+and status codes as the Flask app, but on an event loop with an async
+SQLAlchemy engine (asyncpg for PostgreSQL, aiosqlite for SQLite), so a
+worker keeps many requests in flight while they wait on the database.
+The in-process indexes and caches are the Flask ones, filled from async
+queries. Run the schema migrations first (flask upgrade-db), then:
+
+    uvicorn --factory flaskr.asgi:create_asgi_app --workers 4
+
+Quiz rooms stream their events to players from the event loop, so one
+worker holds many open streams.
+
+The handlers parse requests and build responses with the functions of
+flaskr.contracts, like the Flask routes, and differ from them only in
+how they read the request, query the database and send the response.
+The endpoints in FLASK_ONLY_ROUTES are not served here, and the shared
+routes lack these Flask features:
+
+- ETag/304 on /questions, /categories/<id>/questions and search results
+  (only /categories has them here);
+- the render cache of listing and search pages;
+- read replica routing: every query goes to the primary;
+- brotli compression (gzip only), slow request logging and metrics.
+"""
+import asyncio
+import json
+from contextlib import asynccontextmanager
+
+from sqlalchemy import delete, insert, make_url, select
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool, StaticPool
+from starlette.applications import Starlette
+from starlette.exceptions import HTTPException
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+
+from models import (POOL_DEFAULTS, POOL_OPTIONS, Category, Question,
+                    default_database_path, is_memory_sqlite,
+                    question_count_deltas)
+from . import (CATEGORIES_MAX_AGE, CATEGORY_CACHE_TTL, COMPRESSION_ENABLED,
+               COMPRESS_GZIP_LEVEL, COMPRESS_MIN_SIZE, COUNT_CACHE_TTL,
+               DUPLICATE_INDEX_TTL, DUPLICATE_POLICY, DUPLICATE_THRESHOLD,
+               QUIZ_INDEX_TTL, ROOM_KEEPALIVE, ROOM_MAX,
+               ROOM_SUBSCRIBER_QUEUE, ROOM_TTL, SEARCH_INDEX_TTL,
+               WARMUP_ON_START)
+from .categories import CategoryCache
+from .contracts import (ERROR_MESSAGES, QUESTION_COLUMNS, QUESTION_KEYS,
+                        RequestError, batch_delete_ids, body_search_term,
+                        categories_body, categories_etag, created_body,
+                        deleted_body, duplicate_rejection, error_body,
+                        in_order, int_arg, listing_body, missing_ids,
+                        page_window, question_fields, question_records,
+                        quiz_body, quiz_request, ranked_page, room_body,
+                        room_created_body, round_body, round_request,
+                        search_body, search_term)
+from .counts import CountCache, total_questions
+from .duplicates import DuplicateIndex
+from .encoding import make_encoder
+from .rooms import AsyncQueueSubscriber, Rooms
+from .search import SearchIndex
+from .selection import QuestionIndex
+
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+# same headers the Flask app adds in after_request
+CORS_HEADERS = {
+    "Access-Control-Allow-Headers": "Content-Type,Authorization,true",
+    "Access-Control-Allow-Methods": "GET,PATCH,POST,DELETE,OPTIONS",
+}
+
+encode = make_encoder()
+
+
+def async_url(uri):
+    """Database URL rewritten for the asyncpg / aiosqlite driver."""
+    url = make_url(uri)
+    drivername = ASYNC_DRIVERS.get(url.get_backend_name())
+    if drivername is None:
+        raise ValueError(f"No async driver for {url.get_backend_name()}")
+    return url.set(drivername=drivername)
+
+
+def async_engine_options(config, uri):
+    """create_async_engine() arguments for the DB_* config keys."""
+    if is_memory_sqlite(uri):
+        return {'poolclass': StaticPool}
+    if make_url(uri).get_backend_name() == 'sqlite':
+        return {}
+
+    if config.get('DB_PGBOUNCER'):
+        # asyncpg prepares statements per connection; PgBouncer in
+        # transaction mode cannot keep them
+        return {'poolclass': NullPool,
+                'connect_args': {'statement_cache_size': 0}}
+
+    options = {argument: config[key] for key, argument in POOL_OPTIONS.items()
+               if config.get(key) is not None}
+    if config.get('DB_STATEMENT_TIMEOUT_MS'):
+        options['connect_args'] = {'server_settings': {
+            'statement_timeout': str(config['DB_STATEMENT_TIMEOUT_MS'])}}
+    return options
+
+
+def json_response(body, status_code=200, headers=None):
+    return Response(encode(body), status_code=status_code,
+                    media_type="application/json",
+                    headers={**CORS_HEADERS, **(headers or {})})
+
+
+async def json_body(request):
+    try:
+        return json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(400)
+
+
+async def host_token(request):
+    """The host_token of a room request body, None when there is none."""
+    try:
+        body = json.loads(await request.body() or b'{}')
+    except ValueError:
+        return None
+    return body.get('host_token') if isinstance(body, dict) else None
+
+
+def etag_matches(request, etag):
+    tags = {tag.strip().removeprefix('W/').strip('"')
+            for tag in request.headers.get("if-none-match", "").split(",")}
+    return etag in tags or "*" in tags
+
+
+class AsyncDatabase:
+    """Async engine and the few statement helpers the routes use."""
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    async def rows(self, statement):
+        async with self.engine.connect() as connection:
+            result = await connection.execute(statement)
+            return result.all()
+
+    async def scalar(self, statement):
+        async with self.engine.connect() as connection:
+            return await connection.scalar(statement)
+
+    async def write(self, statement, follow_up=None):
+        """
+        Run statement in its own transaction, together with the statements
+        follow_up(rows) returns for its RETURNING rows; returns the rows.
+        """
+        async with self.engine.begin() as connection:
+            rows = (await connection.execute(statement)).all()
+            for statement in (follow_up(rows) if follow_up else ()):
+                await connection.execute(statement)
+            return rows
+
+
+def count_updates(sign):
+    """write() follow_up adjusting question_count for the returned questions."""
+    def follow_up(rows):
+        return Category.question_count_updates(question_count_deltas(
+            [dict(zip(QUESTION_KEYS, row)) for row in rows], sign))
+    return follow_up
+
+
+class TriviaState:
+    """
+    Per-app components: the database, the Flask in-process indexes and
+    caches, and one asyncio lock per component so concurrent requests
+    finding it stale load it once.
+    """
+
+    def __init__(self, database, config):
+        self.database = database
+        self.config = config
+        self.question_index = QuestionIndex(ttl=config['QUIZ_INDEX_TTL'])
+        self.search_index = SearchIndex(ttl=config['SEARCH_INDEX_TTL'])
+        self.category_cache = CategoryCache(ttl=config['CATEGORY_CACHE_TTL'])
+        self.count_cache = CountCache(ttl=config['COUNT_CACHE_TTL'])
+        self.duplicate_index = DuplicateIndex(
+            threshold=config['DUPLICATE_THRESHOLD'],
+            ttl=config['DUPLICATE_INDEX_TTL'])
+        self.rooms = Rooms(max_rooms=config['ROOM_MAX'],
+                           ttl=config['ROOM_TTL'])
+        self.listeners = [self.question_index.on_question_change,
+                          self.search_index.on_question_change,
+                          self.count_cache.on_question_change,
+                          self.duplicate_index.on_question_change]
+        self.locks = {name: asyncio.Lock()
+                      for name in ('questions', 'search', 'categories',
+                                   'counts', 'duplicates')}
+        # background index rebuilds, referenced until they finish
+        self.refreshes = set()
+
+    def notify_question_change(self, action, record):
+        for listener in self.listeners:
+            listener(action, record)
+
+    async def categories(self):
+        cache = self.category_cache
+        if cache.is_stale():
+            async with self.locks['categories']:
+                if cache.is_stale():
+                    version = cache.version
+                    rows = await self.database.rows(
+                        select(*cache.columns).order_by(Category.type))
+                    return cache.build(rows, version)
+        return cache.current
+
+    async def ensure_index(self, name, index):
+        """
+        Load a TableIndex that was never built, once however many
+        requests wait for it. A built one that went stale keeps serving
+        while it is rebuilt in the background. Builds run in a thread,
+        off the event loop.
+        """
+        if not index.is_stale():
+            return
+        if not index.is_built():
+            await self.load_index(name, index)
+        elif not index.refreshing:
+            index.refreshing = True
+            task = asyncio.create_task(self.refresh_index(name, index))
+            self.refreshes.add(task)
+            task.add_done_callback(self.refreshes.discard)
+
+    async def load_index(self, name, index):
+        async with self.locks[name]:
+            if index.is_stale():
+                index.record_changes()
+                rows = await self.database.rows(select(*index.columns))
+                await asyncio.to_thread(index.build, rows)
+
+    async def refresh_index(self, name, index):
+        try:
+            await self.load_index(name, index)
+        except Exception as e:
+            print(f"Error refreshing {type(index).__name__}: {e}")
+        finally:
+            index.refreshing = False
+
+    async def question_buckets(self):
+        await self.ensure_index('questions', self.question_index)
+        return self.question_index.buckets or {}
+
+    async def search(self, text):
+        await self.ensure_index('search', self.search_index)
+        return self.search_index.rank(text)
+
+    async def find_duplicate(self, text):
+        await self.ensure_index('duplicates', self.duplicate_index)
+        return self.duplicate_index.match(text)
+
+    async def question_counts(self):
+        cache = self.count_cache
+        counts = cache.counts
+        if cache.is_stale():
+            async with self.locks['counts']:
+                counts = cache.counts
+                if cache.is_stale():
+                    version = cache.version
+                    counts = cache.build(
+                        await self.database.rows(select(*cache.columns)),
+                        version)
+        return counts
+
+    async def warmup(self):
+        """Load the caches and indexes before the first request."""
+        await self.categories()
+        await self.question_counts()
+        await self.question_buckets()
+        await self.search('')
+        if self.config['DUPLICATE_POLICY'] != 'off':
+            await self.find_duplicate('')
+
+    async def pick_question(self, category, exclude, difficulties):
+        exclude = set(exclude)
+        while True:
+            question_id = self.question_index.pick_id(
+                category, exclude, buckets=await self.question_buckets(),
+                difficulties=difficulties)
+            if question_id is None:
+                return None
+            rows = await self.database.rows(
+                select(*QUESTION_COLUMNS).where(Question.id == question_id))
+            if rows:
+                return dict(zip(QUESTION_KEYS, rows[0]))
+            self.question_index.discard(question_id)
+
+    async def paginate(self, request, selection):
+        after, offset, limit = page_window(request.query_params)
+        if after is not None:
+            selection = selection.where(Question.id > after)
+        return question_records(await self.database.rows(
+            selection.offset(offset).limit(limit)))
+
+    async def questions_by_ids(self, ids):
+        if not ids:
+            return []
+
+        return in_order(ids, await self.database.rows(
+            select(*QUESTION_COLUMNS).where(Question.id.in_(ids))))
+
+    async def sample_questions(self, category, count, exclude, difficulties):
+        question_ids = self.question_index.sample_ids(
+            category, count, exclude, buckets=await self.question_buckets(),
+            difficulties=difficulties)
+        questions = await self.questions_by_ids(question_ids)
+        for question_id in missing_ids(question_ids, questions):
+            self.question_index.discard(question_id)
+        return questions
+
+
+async def retrieve_categories(request):
+    state = request.app.state.trivia
+    try:
+        category_map = await state.categories()
+        if len(category_map.categories) == 0:
+            raise HTTPException(404)
+    except Exception as e:
+        print(f"Error retrieving categories: {e}")
+        raise HTTPException(500)
+
+    if int_arg(request.query_params, "with_counts"):
+        counts = await state.question_counts()
+        cache_control = "no-cache"
+    else:
+        counts = None
+        cache_control = f"public, max-age={state.config['CATEGORIES_MAX_AGE']}"
+
+    etag = categories_etag(category_map, counts)
+    headers = {"ETag": f'"{etag}"', "Cache-Control": cache_control}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={**CORS_HEADERS, **headers})
+    return json_response(categories_body(category_map, counts),
+                         headers=headers)
+
+
+async def retrieve_questions(request):
+    state = request.app.state.trivia
+    try:
+        current_questions = await state.paginate(
+            request, select(*QUESTION_COLUMNS).order_by(Question.id))
+        if len(current_questions) == 0:
+            raise HTTPException(404)
+
+        return json_response(listing_body(
+            request.query_params, current_questions,
+            total_questions(await state.question_counts()), None,
+            categories=(await state.categories()).categories))
+    except Exception as e:
+        print(f"Error retrieving questions: {e}")
+        raise HTTPException(404)
+
+
+async def delete_question(request):
+    state = request.app.state.trivia
+    question_id = request.path_params["question_id"]
+    try:
+        rows = await state.database.write(
+            delete(Question).where(Question.id == int(question_id))
+            .returning(*QUESTION_COLUMNS), count_updates(-1))
+        if not rows:
+            raise HTTPException(404)
+        state.notify_question_change('delete', dict(zip(QUESTION_KEYS, rows[0])))
+
+        return json_response(deleted_body(question_id))
+    except Exception as e:
+        print(f"Error deleting questions: {e}")
+        raise HTTPException(422)
+
+
+async def delete_questions(request):
+    state = request.app.state.trivia
+    try:
+        body = json.loads(await request.body())
+    except ValueError:
+        body = None
+    ids = batch_delete_ids(body)
+
+    try:
+        rows = await state.database.write(
+            delete(Question).where(Question.id.in_(ids))
+            .returning(*QUESTION_COLUMNS), count_updates(-1))
+        for record in question_records(rows):
+            state.notify_question_change('delete', record)
+
+        return json_response(deleted_body([row[0] for row in rows]))
+    except Exception as e:
+        print(f"Error deleting questions: {e}")
+        raise HTTPException(422)
+
+
+async def create_question(request):
+    state = request.app.state.trivia
+    body = await json_body(request)
+    fields = question_fields(body)
+    if fields is None:
+        raise HTTPException(422)
+
+    policy = state.config['DUPLICATE_POLICY']
+    duplicate_of = None
+    if policy != 'off':
+        try:
+            match = await state.find_duplicate(str(fields['question']))
+        except Exception as e:
+            print(f"Error checking for duplicate questions: {e}")
+            raise HTTPException(500)
+        duplicate_of = match[0] if match else None
+        rejection = duplicate_rejection(policy, body, duplicate_of)
+        if rejection is not None:
+            return json_response(rejection, 409)
+
+    try:
+        # asyncpg does not coerce "2" to an integer column like psycopg2
+        fields['category'] = int(fields['category'])
+        fields['difficulty'] = int(fields['difficulty'])
+        rows = await state.database.write(
+            insert(Question).values(**fields).returning(*QUESTION_COLUMNS),
+            count_updates(1))
+        record = dict(zip(QUESTION_KEYS, rows[0]))
+        state.notify_question_change('insert', record)
+
+        return json_response(
+            created_body(record['id'], policy, duplicate_of), 201)
+    except Exception as e:
+        print(f"Error creating questions: {e}")
+        raise HTTPException(422)
+
+
+async def search_questions(request):
+    state = request.app.state.trivia
+    if request.method == "GET":
+        search = search_term(request.query_params.get("searchTerm"))
+    else:
+        search = body_search_term(await json_body(request))
+
+    # falsy terms are never searched, and fail below as in the Flask app
+    try:
+        if search:
+            ranked_ids = await state.search(search)
+            current_questions = await state.questions_by_ids(
+                ranked_page(request.query_params, ranked_ids))
+
+            return json_response(search_body(
+                request.query_params, current_questions, len(ranked_ids)))
+        raise HTTPException(404)
+    except Exception as e:
+        print(f"Error searching questions: {e}")
+        raise HTTPException(500)
+
+
+async def retrieve_questions_by_category(request):
+    state = request.app.state.trivia
+    category_id = request.path_params["category_id"]
+    current_questions = await state.paginate(
+        request, select(*QUESTION_COLUMNS).where(
+            Question.category == category_id).order_by(Question.id))
+
+    try:
+        if len(current_questions) == 0:
+            raise HTTPException(404)
+
+        return json_response(listing_body(
+            request.query_params, current_questions,
+            total_questions(await state.question_counts(), category_id),
+            category_id))
+    except Exception as e:
+        print(f"Error retrieving questions by category: {e}")
+        raise HTTPException(500)
+
+
+async def get_random_question_for_quiz(request):
+    state = request.app.state.trivia
+    category_id, previous_ids, difficulty, difficulties = quiz_request(
+        await json_body(request))
+
+    try:
+        new_question = await state.pick_question(
+            category_id, previous_ids, difficulties)
+
+        return json_response(quiz_body(new_question, difficulty))
+    except Exception as e:
+        print(f"Error playing quiz: {e}")
+        raise HTTPException(500)
+
+
+async def get_quiz_round(request):
+    state = request.app.state.trivia
+    (category_id, count, previous_ids, difficulty,
+     difficulties) = round_request(await json_body(request))
+
+    try:
+        questions = await state.sample_questions(
+            category_id, count, previous_ids, difficulties)
+
+        return json_response(round_body(questions, difficulty))
+    except Exception as e:
+        print(f"Error playing quiz round: {e}")
+        raise HTTPException(500)
+
+
+async def create_quiz_room(request):
+    state = request.app.state.trivia
+    category_id, count, previous_ids, _, difficulties = round_request(
+        await json_body(request))
+
+    try:
+        questions = await state.sample_questions(
+            category_id, count, previous_ids, difficulties)
+    except Exception as e:
+        print(f"Error creating quiz room: {e}")
+        raise HTTPException(500)
+    if not questions:
+        raise HTTPException(404)
+
+    room = state.rooms.create(category_id, questions)
+    return json_response(room_created_body(room, questions), 201)
+
+
+async def get_quiz_room(request):
+    try:
+        room = request.app.state.trivia.rooms.get(
+            request.path_params['room_id'])
+    except KeyError:
+        raise HTTPException(404)
+
+    return json_response(room_body(room))
+
+
+async def quiz_room_events(request):
+    state = request.app.state.trivia
+    try:
+        room = state.rooms.get(request.path_params['room_id'])
+    except KeyError:
+        raise HTTPException(404)
+
+    subscriber = AsyncQueueSubscriber(state.config['ROOM_SUBSCRIBER_QUEUE'])
+    backlog = room.subscribe(subscriber)
+
+    async def stream():
+        try:
+            for message in backlog:
+                yield message
+            async for message in subscriber.messages(
+                    state.config['ROOM_KEEPALIVE']):
+                yield message
+        finally:
+            room.unsubscribe(subscriber)
+
+    return StreamingResponse(stream(), media_type='text/event-stream',
+                             headers={**CORS_HEADERS,
+                                      'Cache-Control': 'no-cache',
+                                      'X-Accel-Buffering': 'no'})
+
+
+async def advance_quiz_room(request):
+    rooms = request.app.state.trivia.rooms
+    try:
+        room = rooms.host_room(request.path_params['room_id'],
+                               await host_token(request))
+    except KeyError:
+        raise HTTPException(404)
+    except PermissionError:
+        raise HTTPException(403)
+
+    event = room.advance()
+    if event is None:
+        raise HTTPException(422)
+
+    return json_response(room_body(room, event=event))
+
+
+async def close_quiz_room(request):
+    rooms = request.app.state.trivia.rooms
+    room_id = request.path_params['room_id']
+    try:
+        rooms.host_room(room_id, await host_token(request))
+        rooms.remove(room_id)
+    except KeyError:
+        raise HTTPException(404)
+    except PermissionError:
+        raise HTTPException(403)
+
+    return json_response(deleted_body(room_id))
+
+
+async def http_error(request, exc):
+    status = exc.status_code
+    return json_response(
+        error_body(status, ERROR_MESSAGES.get(status, exc.detail)), status)
+
+
+async def invalid_request(request, exc):
+    return json_response(error_body(exc.status), exc.status)
+
+
+async def internal_error(request, exc):
+    print(f"Unhandled error: {exc}")
+    return json_response(error_body(500), 500)
+
+
+ROUTES = [
+    Route("/categories", retrieve_categories, methods=["GET"]),
+    Route("/questions", retrieve_questions, methods=["GET"]),
+    Route("/questions", create_question, methods=["POST"]),
+    Route("/questions", delete_questions, methods=["DELETE"]),
+    Route("/questions/search", search_questions, methods=["GET", "POST"]),
+    Route("/questions/{question_id}", delete_question, methods=["DELETE"]),
+    Route("/categories/{category_id:int}/questions",
+          retrieve_questions_by_category, methods=["GET"]),
+    Route("/quizzes", get_random_question_for_quiz, methods=["POST"]),
+    Route("/quizzes/round", get_quiz_round, methods=["POST"]),
+    Route("/rooms", create_quiz_room, methods=["POST"]),
+    Route("/rooms/{room_id}", get_quiz_room, methods=["GET"]),
+    Route("/rooms/{room_id}", close_quiz_room, methods=["DELETE"]),
+    Route("/rooms/{room_id}/events", quiz_room_events, methods=["GET"]),
+    Route("/rooms/{room_id}/next", advance_quiz_room, methods=["POST"]),
+]
+
+# (path, method) of the Flask routes that have no handler above
+FLASK_ONLY_ROUTES = {
+    ("/questions/bulk", "POST"),
+    ("/questions/export", "GET"),
+    ("/quizzes/sessions", "POST"),
+    ("/quizzes/sessions/{session_id}/next", "POST"),
+    ("/quizzes/sessions/{session_id}", "DELETE"),
+    ("/quizzes/results", "POST"),
+    ("/leaderboard", "GET"),
+    ("/metrics", "GET"),
+}
+
+
+def create_asgi_app(config=None, database_class=AsyncDatabase):
+    """
+    Build the ASGI app. config takes the same keys as the Flask app
+    config (SQLALCHEMY_DATABASE_URI, the cache TTLs and DB_* pool keys).
+    """
+    settings = {
+        'CATEGORIES_MAX_AGE': CATEGORIES_MAX_AGE,
+        'CATEGORY_CACHE_TTL': CATEGORY_CACHE_TTL,
+        'COMPRESSION_ENABLED': COMPRESSION_ENABLED,
+        'COMPRESS_GZIP_LEVEL': COMPRESS_GZIP_LEVEL,
+        'COMPRESS_MIN_SIZE': COMPRESS_MIN_SIZE,
+        'COUNT_CACHE_TTL': COUNT_CACHE_TTL,
+        'DUPLICATE_INDEX_TTL': DUPLICATE_INDEX_TTL,
+        'DUPLICATE_POLICY': DUPLICATE_POLICY,
+        'DUPLICATE_THRESHOLD': DUPLICATE_THRESHOLD,
+        'QUIZ_INDEX_TTL': QUIZ_INDEX_TTL,
+        'ROOM_KEEPALIVE': ROOM_KEEPALIVE,
+        'ROOM_MAX': ROOM_MAX,
+        'ROOM_SUBSCRIBER_QUEUE': ROOM_SUBSCRIBER_QUEUE,
+        'ROOM_TTL': ROOM_TTL,
+        'SEARCH_INDEX_TTL': SEARCH_INDEX_TTL,
+        'WARMUP_ON_START': WARMUP_ON_START,
+        **POOL_DEFAULTS,
+    }
+    settings.update(config or {})
+    if 'SQLALCHEMY_DATABASE_URI' not in settings:
+        settings['SQLALCHEMY_DATABASE_URI'] = default_database_path()
+    uri = settings['SQLALCHEMY_DATABASE_URI']
+    engine = create_async_engine(
+        async_url(uri), **async_engine_options(settings, uri))
+    state = TriviaState(database_class(engine), settings)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        if settings['WARMUP_ON_START']:
+            await state.warmup()
+        yield
+        await engine.dispose()
+
+    middleware = [Middleware(CORSMiddleware, allow_origins=['*'],
+                             allow_methods=['*'], allow_headers=['*'])]
+    if settings['COMPRESSION_ENABLED']:
+        middleware.append(Middleware(
+            GZipMiddleware, minimum_size=settings['COMPRESS_MIN_SIZE'],
+            compresslevel=settings['COMPRESS_GZIP_LEVEL']))
+
+    app = Starlette(
+        routes=ROUTES,
+        middleware=middleware,
+        exception_handlers={HTTPException: http_error,
+                            RequestError: invalid_request,
+                            Exception: internal_error},
+        lifespan=lifespan)
+    app.state.trivia = state
+    return app
@@ -0,0 +1,86 @@
+import csv
+import io
+import json
+
+from sqlalchemy import insert
+
+from models import (Category, Question, db, notify_question_change,
+                    question_count_deltas)
+
+JSON_LINES_TYPES = {
+    'application/x-ndjson',
+    'application/jsonl',
+    'application/x-jsonlines',
+    'application/json-lines',
+}
+CSV_TYPES = {'text/csv', 'application/csv'}
+EXPORT_FIELDS = ('id', 'question', 'answer', 'difficulty', 'category')
+# the keys match Question.format()
+RETURNED_COLUMNS = (Question.id, Question.question, Question.answer,
+                    Question.category, Question.difficulty)
+RETURNED_KEYS = ('id', 'question', 'answer', 'category', 'difficulty')
+
+
+def read_records(stream, mimetype):
+    """
+    Yield (line_number, record) pairs from a JSON Lines or CSV request
+    body without reading it into memory. record is None for lines that
+    cannot be parsed. Raises ValueError for unsupported mimetypes.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    if mimetype in JSON_LINES_TYPES:
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except ValueError:
+                yield line_number, None
+    elif mimetype in CSV_TYPES:
+        reader = csv.DictReader(text)
+        for record in reader:
+            yield reader.line_num, record
+    else:
+        raise ValueError(f"Unsupported import type: {mimetype}")
+
+
+def insert_chunk(rows):
+    """
+    Insert a list of question field dicts with one executemany and
+    commit them as one transaction. Returns the new ids in row order.
+    Listeners get the rows as the database returned them, typed like
+    Question.format(), not the request's strings.
+    """
+    result = db.session.execute(
+        insert(Question).returning(*RETURNED_COLUMNS,
+                                   sort_by_parameter_order=True),
+        rows)
+    records = [dict(zip(RETURNED_KEYS, row)) for row in result]
+    Category.adjust_question_counts(question_count_deltas(records, 1))
+    db.session.commit()
+    for record in records:
+        notify_question_change('insert', record)
+    return [record['id'] for record in records]
+
+
+def export_rows(file_format, chunk_size=1000):
+    """Yield the questions table as JSON Lines or CSV text, row by row."""
+    rows = db.session.query(
+        Question.id, Question.question, Question.answer,
+        Question.difficulty, Question.category).order_by(
+        Question.id).yield_per(chunk_size)
+
+    if file_format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_FIELDS)
+        for row in rows:
+            writer.writerow(row)
+            if buffer.tell() > 64 * 1024:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    else:
+        for row in rows:
+            yield json.dumps(dict(zip(EXPORT_FIELDS, row))) + '\n'
@@ -0,0 +1,68 @@
+import hashlib
+import json
+import threading
+import time
+
+from models import Category, db
+
+
+class CategoryMap:
+    """Snapshot of the {id: type} category map and its strong ETag."""
+
+    def __init__(self, categories):
+        self.categories = categories
+        payload = json.dumps(sorted(categories.items())).encode('utf-8')
+        self.etag = hashlib.sha1(payload).hexdigest()
+
+
+class CategoryCache:
+    """
+    Process-level cache of the category map. Dropped by the category
+    listeners when a category changes and reloaded after ttl seconds so
+    changes made by other workers show up.
+    """
+
+    columns = (Category.id, Category.type)
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.version = 0
+        self.current = None
+        self.loaded_at = None
+
+    def is_stale(self):
+        if self.current is None:
+            return True
+        return (self.ttl is not None and self.loaded_at is not None and
+                time.monotonic() - self.loaded_at > self.ttl)
+
+    def build(self, rows, version):
+        """
+        Make a CategoryMap from (id, type) rows read while the cache was
+        at version; it is kept only if nothing changed meanwhile.
+        """
+        current = CategoryMap({category_id: category_type
+                               for category_id, category_type in rows})
+        with self.lock:
+            if self.version == version:
+                self.current = current
+                self.loaded_at = time.monotonic()
+        return current
+
+    def get(self):
+        current = self.current
+        if self.is_stale():
+            version = self.version
+            current = self.build(
+                db.session.query(*self.columns).order_by(Category.type),
+                version)
+        return current
+
+    def invalidate(self):
+        with self.lock:
+            self.version += 1
+            self.current = None
+
+    def on_category_change(self, action, record):
+        self.invalidate()
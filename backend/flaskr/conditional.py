@@ -0,0 +1,55 @@
+import functools
+import secrets
+import time
+
+from flask import current_app, make_response, request
+
+from models import table_version
+
+
+class ListingETags:
+    """
+    Weak ETags for listing responses, built from the table version
+    counters in models.py instead of the response body, so a matching
+    If-None-Match is answered with 304 before any query runs. Writes
+    by other workers do not bump this worker's counters, so the tag
+    also changes every window seconds; a client sees their changes at
+    most that late, like the cached totals.
+    """
+
+    def __init__(self, window=None):
+        self.window = window
+        # counters restart with the process; never reuse an old tag
+        self.epoch = secrets.token_hex(4)
+
+    def etag(self, tables):
+        versions = '.'.join(str(table_version(table)) for table in tables)
+        window = int(time.time() // self.window) if self.window else 0
+        return f"{self.epoch}.{versions}.{window}"
+
+
+def versioned(*tables):
+    """
+    Make a GET view conditional on the version counters of tables:
+    304 when If-None-Match still matches, otherwise the view's
+    response with the ETag attached.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(*args, **kwargs)
+
+            etag = current_app.extensions['listing_etags'].etag(tables)
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+                response.set_etag(etag, weak=True)
+                return response
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag, weak=True)
+                response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
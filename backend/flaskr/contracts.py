@@ -0,0 +1,379 @@
+"""
+Request parsing and response bodies shared by the Flask app and the
+ASGI app. Nothing here does I/O: a front end reads the query string and
+the JSON body, passes them in, runs the queries and sends back the
+bodies built here, so both serve the same URLs, bodies and statuses.
+
+args is the query string as a mapping (Flask request.args, Starlette
+request.query_params) and body the decoded JSON body. Invalid requests
+raise RequestError, which both front ends answer with error_body().
+"""
+from models import Question
+
+from .counts import counts_etag, total_questions
+from .search import tokenize
+from .selection import (ANY_DIFFICULTY, MAX_DIFFICULTY, MIN_DIFFICULTY,
+                        nearest_difficulties, next_difficulty)
+
+QUESTIONS_PER_PAGE = 10
+MAX_QUESTIONS_PER_PAGE = 100
+QUESTION_FIELDS = ('question', 'answer', 'difficulty', 'category')
+MAX_BATCH_DELETE = 1000
+# listings select these columns as tuples instead of Question objects;
+# the keys match Question.format()
+QUESTION_COLUMNS = (Question.id, Question.question, Question.answer,
+                    Question.category, Question.difficulty)
+QUESTION_KEYS = ('id', 'question', 'answer', 'category', 'difficulty')
+# questions per POST /quizzes/round when the body gives no count
+QUIZ_ROUND_SIZE = 5
+MAX_QUIZ_ROUND_SIZE = 50
+PLAYER_NAME_MAX = 50
+MAX_RESULT_QUESTIONS = 1000
+ERROR_MESSAGES = {
+    400: "bad request",
+    403: "forbidden",
+    404: "resource not found",
+    405: "method not allowed",
+    409: "duplicate question",
+    422: "unprocessable",
+    500: "internal server error",
+}
+
+
+class RequestError(Exception):
+    """A request answered with status and error_body(status)."""
+
+    def __init__(self, status):
+        super().__init__(status)
+        self.status = status
+
+
+def error_body(status, message=None):
+    return {"success": False, "error": status,
+            "message": message or ERROR_MESSAGES.get(status)}
+
+
+def int_arg(args, name, default=None):
+    """args.get(name, default, type=int) for any mapping of strings."""
+    try:
+        return int(args[name])
+    except (KeyError, TypeError, ValueError):
+        return default
+
+
+def page_limit(args):
+    limit = int_arg(args, "limit", QUESTIONS_PER_PAGE)
+    return min(max(limit, 1), MAX_QUESTIONS_PER_PAGE)
+
+
+def page_window(args):
+    """
+    (after, offset, limit) of a listing page ordered by Question.id.
+    With ?after=<id> the page is fetched by seeking past that id
+    (cursor mode), otherwise after is None and offset comes from the
+    ?page= number. Neither mode counts the selection.
+    """
+    after = int_arg(args, "after")
+    if after is not None:
+        return after, 0, page_limit(args)
+    page = max(int_arg(args, "page", 1), 1)
+    return None, (page - 1) * QUESTIONS_PER_PAGE, QUESTIONS_PER_PAGE
+
+
+def ranked_page(args, ranked_ids):
+    """
+    The ids of one page of ids in ranked order, e.g. search results. In
+    cursor mode ?after= is the last id of the previous page, 0 for the
+    first.
+    """
+    after = int_arg(args, "after")
+    if after is not None:
+        if after in ranked_ids:
+            start = ranked_ids.index(after) + 1
+        elif after <= 0:
+            start = 0
+        else:
+            return []
+        return ranked_ids[start:start + page_limit(args)]
+    page = max(int_arg(args, "page", 1), 1)
+    start = (page - 1) * QUESTIONS_PER_PAGE
+    return ranked_ids[start:start + QUESTIONS_PER_PAGE]
+
+
+def page_key(args):
+    """The pagination arguments of a listing request, normalized."""
+    after = int_arg(args, "after")
+    if after is not None:
+        return f"after={after}&limit={page_limit(args)}"
+    return f"page={max(int_arg(args, 'page', 1), 1)}"
+
+
+def question_records(rows):
+    """Question.format() dicts of rows of QUESTION_COLUMNS."""
+    return [dict(zip(QUESTION_KEYS, row)) for row in rows]
+
+
+def in_order(ids, rows):
+    """The questions of rows of QUESTION_COLUMNS, in the order of ids."""
+    by_id = {row[0]: dict(zip(QUESTION_KEYS, row)) for row in rows}
+    return [by_id[question_id] for question_id in ids if question_id in by_id]
+
+
+def missing_ids(ids, questions):
+    """The ids that were asked for but not loaded: deleted since."""
+    if len(questions) == len(ids):
+        return set()
+    return set(ids) - {question['id'] for question in questions}
+
+
+def add_cursor(args, body, current_questions):
+    """Add next_cursor to a listing response served in cursor mode."""
+    if int_arg(args, "after") is None:
+        return body
+    if len(current_questions) < page_limit(args):
+        body["next_cursor"] = None
+    else:
+        body["next_cursor"] = current_questions[-1]["id"]
+    return body
+
+
+def listing_body(args, current_questions, total, current_category,
+                 categories=None):
+    body = {
+            "success": True,
+            "questions": current_questions,
+            "total_questions": total,
+    }
+    if categories is not None:
+        body["categories"] = categories
+    body["current_category"] = current_category
+    return add_cursor(args, body, current_questions)
+
+
+def categories_body(category_map, counts=None):
+    body = {
+            "success": True,
+            "categories": category_map.categories
+    }
+    if counts is not None:
+        body["question_counts"] = {
+            category_id: counts.get(category_id, 0)
+            for category_id in category_map.categories}
+        body["total_questions"] = total_questions(counts)
+    return body
+
+
+def categories_etag(category_map, counts=None):
+    """ETag of categories_body(); counts change with every question."""
+    if counts is None:
+        return category_map.etag
+    return f"{category_map.etag}.{counts_etag(counts)}"
+
+
+def question_fields(body):
+    """
+    Return the fields of a new question from a request body, or None
+    when any of them is missing or empty.
+    """
+    if not isinstance(body, dict):
+        return None
+    fields = {field: body.get(field) for field in QUESTION_FIELDS}
+    if any(value is None or value == "" for value in fields.values()):
+        return None
+    return fields
+
+
+def duplicate_rejection(policy, body, duplicate_of):
+    """The 409 body refusing a duplicate question, None to create it."""
+    if (duplicate_of is None or policy != 'reject' or
+            body.get('allow_duplicate')):
+        return None
+    return dict(error_body(409), duplicate_of=duplicate_of)
+
+
+def created_body(question_id, policy, duplicate_of):
+    body = {
+            "success": True,
+            "created": question_id,
+    }
+    if policy != 'off':
+        body["duplicate_of"] = duplicate_of
+    return body
+
+
+def deleted_body(deleted):
+    return {
+            "success": True,
+            "deleted": deleted,
+    }
+
+
+def batch_delete_ids(body):
+    """The ids of a batch DELETE /questions body, at most MAX_BATCH_DELETE."""
+    ids = body.get("ids") if isinstance(body, dict) else None
+    if not isinstance(ids, list) or not ids or len(ids) > MAX_BATCH_DELETE:
+        raise RequestError(422)
+    try:
+        return [int(q_id) for q_id in ids]
+    except (TypeError, ValueError):
+        raise RequestError(422)
+
+
+def search_term(value):
+    """
+    The searchTerm of a search request, from the query string or the
+    body. Falsy terms are passed through: they are never searched.
+    """
+    if value and not isinstance(value, str):
+        raise RequestError(400)
+    return value
+
+
+def body_search_term(body):
+    return search_term(
+        body.get("searchTerm") if isinstance(body, dict) else None)
+
+
+def search_page_key(term, args):
+    """Render cache tag and arguments of a search, None to not cache it."""
+    terms = " ".join(tokenize(term)) if isinstance(term, str) else ""
+    if not terms:
+        return None
+    return f"search:{terms}", page_key(args)
+
+
+def search_body(args, current_questions, total):
+    return listing_body(args, current_questions, total, None)
+
+
+def quiz_difficulties(body):
+    """
+    Read the difficulty options of a /quizzes body. Returns the level
+    to report back (None when not asked for) and the difficulties to
+    try in order. "difficulty" alone pins the level; with "adaptive"
+    it is the player's current level, stepped up or down from
+    "recent_answers" (booleans, oldest first), and the nearest level
+    with questions left is used. Raises ValueError on invalid values.
+    """
+    difficulty = body.get('difficulty')
+    if difficulty is not None:
+        difficulty = int(difficulty)
+        if not MIN_DIFFICULTY <= difficulty <= MAX_DIFFICULTY:
+            raise ValueError(f"difficulty out of range: {difficulty}")
+
+    if not body.get('adaptive'):
+        if difficulty is None:
+            return None, (ANY_DIFFICULTY,)
+        return difficulty, (difficulty,)
+
+    recent_answers = body.get('recent_answers') or []
+    if not isinstance(recent_answers, list):
+        raise ValueError("recent_answers must be a list")
+    difficulty = next_difficulty(
+        difficulty, [bool(answer) for answer in recent_answers])
+    return difficulty, nearest_difficulties(difficulty)
+
+
+def quiz_request(body):
+    """
+    (category id, previous ids, difficulty, difficulties) of a POST
+    /quizzes body.
+    """
+    if not (isinstance(body, dict) and
+            'quiz_category' in body and 'previous_questions' in body):
+        raise RequestError(422)
+
+    quiz_category = body.get('quiz_category')
+    previous_questions = body.get('previous_questions')
+    if ((quiz_category is None) or (previous_questions is None)):
+        raise RequestError(400)
+
+    try:
+        difficulty, difficulties = quiz_difficulties(body)
+        category_id = quiz_category['id']
+        previous_ids = [int(q_id) for q_id in previous_questions]
+    except (KeyError, TypeError, ValueError):
+        raise RequestError(400)
+    return category_id, previous_ids, difficulty, difficulties
+
+
+def round_request(body):
+    """
+    (category id, count, previous ids, difficulty, difficulties) of a
+    POST /quizzes/round or /rooms body.
+    """
+    if not (isinstance(body, dict) and 'quiz_category' in body):
+        raise RequestError(422)
+
+    quiz_category = body.get('quiz_category')
+    if not isinstance(quiz_category, dict):
+        raise RequestError(400)
+
+    try:
+        count = int(body.get('count', QUIZ_ROUND_SIZE))
+        previous_ids = [int(q_id)
+                        for q_id in body.get('previous_questions') or []]
+        difficulty, difficulties = quiz_difficulties(body)
+    except (TypeError, ValueError):
+        raise RequestError(400)
+    if not 1 <= count <= MAX_QUIZ_ROUND_SIZE:
+        raise RequestError(400)
+    return (quiz_category.get('id', 0), count, previous_ids, difficulty,
+            difficulties)
+
+
+def quiz_body(question, difficulty):
+    body = {
+        'success': True,
+        'question': question
+    }
+    if difficulty is not None:
+        body['difficulty'] = difficulty
+    return body
+
+
+def round_body(questions, difficulty):
+    body = {
+        'success': True,
+        'questions': questions
+    }
+    if difficulty is not None:
+        body['difficulty'] = difficulty
+    return body
+
+
+def room_created_body(room, questions):
+    return {
+        'success': True,
+        'room_id': room.room_id,
+        'host_token': room.host_token,
+        'question_count': len(questions)
+    }
+
+
+def room_body(room, **fields):
+    return dict(room.state(), success=True, **fields)
+
+
+def quiz_result_fields(body):
+    """
+    Read player, category id (0 for all), score and questions from a
+    /quizzes/results body. Raises ValueError when a value is invalid.
+    """
+    player = body.get('player')
+    if not isinstance(player, str) or not player.strip():
+        raise ValueError("player must be a non-empty string")
+    player = player.strip()
+    if len(player) > PLAYER_NAME_MAX:
+        raise ValueError("player name is too long")
+
+    quiz_category = body.get('quiz_category')
+    if isinstance(quiz_category, dict):
+        quiz_category = quiz_category.get('id', 0)
+    category = int(quiz_category or 0)
+
+    score = int(body.get('score'))
+    questions = int(body.get('questions'))
+    if not 0 <= score <= questions <= MAX_RESULT_QUESTIONS:
+        raise ValueError("score must be between 0 and questions")
+    return player, category, score, questions
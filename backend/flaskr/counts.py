@@ -0,0 +1,87 @@
+import hashlib
+import threading
+import time
+
+from models import Category, db
+
+
+def total_questions(counts, category=None):
+    """Questions in category, or in all categories when it is None."""
+    if category is None:
+        return sum(counts.values())
+    return counts.get(int(category), 0)
+
+
+def counts_etag(counts):
+    payload = ','.join(f'{k}:{v}' for k, v in sorted(counts.items()))
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class CountCache:
+    """
+    Per-category question counts read from categories.question_count,
+    which inserts and deletes keep in their own transaction, so listings
+    never run COUNT(*). Adjusted by the question listeners and reloaded
+    after ttl seconds, so totals are at worst ttl old when other workers
+    write.
+    """
+
+    columns = (Category.id, Category.question_count)
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.version = 0
+        self.counts = None
+        self.loaded_at = None
+
+    def is_stale(self):
+        if self.counts is None:
+            return True
+        return (self.ttl is not None and
+                time.monotonic() - self.loaded_at > self.ttl)
+
+    def build(self, rows, version):
+        """
+        Make the {category id: count} map from (id, question_count) rows
+        read while the cache was at version; it is kept only if no
+        question or category changed meanwhile.
+        """
+        counts = {category_id: count for category_id, count in rows}
+        with self.lock:
+            if self.version == version:
+                self.counts = counts
+                self.loaded_at = time.monotonic()
+        return counts
+
+    def get(self):
+        """The {category id: question count} map, loading it when stale."""
+        counts = self.counts
+        if self.is_stale():
+            version = self.version
+            counts = self.build(db.session.query(*self.columns), version)
+        return counts
+
+    def total(self, category=None):
+        return total_questions(self.get(), category)
+
+    def invalidate(self):
+        with self.lock:
+            self.version += 1
+            self.counts = None
+
+    def on_question_change(self, action, record):
+        delta = {'insert': 1, 'delete': -1}.get(action)
+        if delta is None:
+            return
+        category = int(record['category'])
+        with self.lock:
+            self.version += 1
+            if self.counts is not None:
+                # copy on write: readers hold the previous map without a lock
+                counts = dict(self.counts)
+                counts[category] = counts.get(category, 0) + delta
+                self.counts = counts
+
+    def on_category_change(self, action, record):
+        self.invalidate()
@@ -0,0 +1,208 @@
+import operator
+import zlib
+from array import array
+
+from models import Question, db
+
+from .indexes import TableIndex
+from .search import tokenize
+
+# characters per shingle of the normalized question text
+SHINGLE_SIZE = 4
+# minimum hashes per signature, one per bin; a power of two
+SIGNATURE_BINS = 32
+# signature bins per LSH band (8 bands): texts sharing any band are
+# compared, so ~0.8 similar texts are found with ~98% probability
+BAND_ROWS = 4
+
+BIN_SHIFT = 64 - (SIGNATURE_BINS.bit_length() - 1)
+VALUE_MASK = (1 << BIN_SHIFT) - 1
+EMPTY = 1 << 64
+HASH_MASK = (1 << 64) - 1
+# spreads a 32-bit crc over 64 bits (Fibonacci hashing)
+HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+
+
+def normalize(text):
+    """Lowercased words of text, punctuation and spacing removed."""
+    return ' '.join(tokenize(text))
+
+
+def shingle_hashes(text):
+    """Hashes of the SHINGLE_SIZE-character substrings of normalized text."""
+    text = normalize(text)
+    if not text:
+        return set()
+    if len(text) <= SHINGLE_SIZE:
+        return {zlib.crc32(text.encode('utf-8'))}
+    return {zlib.crc32(text[i:i + SHINGLE_SIZE].encode('utf-8'))
+            for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def signature(text):
+    """
+    MinHash signature of text by one-permutation hashing: each shingle
+    is hashed once, the top bits pick its bin and each bin keeps its
+    minimum, so signing costs one hash per shingle instead of one per
+    shingle and bin. Empty bins borrow the next filled bin's minimum,
+    offset by the distance. None for text without words.
+    """
+    bins = [EMPTY] * SIGNATURE_BINS
+    for shingle in shingle_hashes(text):
+        value = (shingle * HASH_MULTIPLIER) & HASH_MASK
+        position = value >> BIN_SHIFT
+        value &= VALUE_MASK
+        if value < bins[position]:
+            bins[position] = value
+    if min(bins) == EMPTY:
+        return None
+
+    densified = array('Q')
+    for position, value in enumerate(bins):
+        distance = 0
+        while value == EMPTY:
+            distance += 1
+            value = bins[(position + distance) % SIGNATURE_BINS]
+        densified.append(value + (distance << BIN_SHIFT))
+    return densified
+
+
+def similarity(signature_a, signature_b):
+    """Estimated Jaccard similarity: the share of equal bins."""
+    return sum(map(operator.eq, signature_a, signature_b)) / SIGNATURE_BINS
+
+
+def band_keys(text_signature):
+    for start in range(0, SIGNATURE_BINS, BAND_ROWS):
+        yield hash(tuple(text_signature[start:start + BAND_ROWS]))
+
+
+class DuplicateIndex(TableIndex):
+    """
+    Locality-sensitive hashing index of question text signatures. A
+    lookup compares the text only with the questions sharing one of its
+    bands, instead of every row, and reports the most similar one at or
+    above threshold. See TableIndex for how it is kept current.
+    """
+
+    columns = (Question.id, Question.question)
+
+    def __init__(self, threshold, ttl=None):
+        super().__init__(ttl)
+        self.threshold = threshold
+        self.bands = None
+        self.signatures = None
+
+    @staticmethod
+    def _add(bands, signatures, key, text_signature):
+        signatures[key] = text_signature
+        for band, band_key in zip(bands, band_keys(text_signature)):
+            band.setdefault(band_key, []).append(key)
+
+    def is_built(self):
+        return self.bands is not None
+
+    def _make(self, rows):
+        """Bands and signatures of (key, text) rows."""
+        bands = [{} for _ in range(SIGNATURE_BINS // BAND_ROWS)]
+        signatures = {}
+        for key, text in rows:
+            text_signature = signature(text)
+            if text_signature is not None:
+                self._add(bands, signatures, key, text_signature)
+        return bands, signatures
+
+    def _install(self, index):
+        self.bands, self.signatures = index
+
+    def _clear(self):
+        self.bands = None
+
+    def _apply(self, action, record):
+        if action == 'insert':
+            self._set(record['id'], signature(record['question']))
+        elif action == 'delete' and self.bands is not None:
+            self._remove(record['id'])
+
+    def add(self, key, text):
+        self.add_signature(key, signature(text))
+
+    def add_signature(self, key, text_signature):
+        with self.lock:
+            self._set(key, text_signature)
+
+    def _set(self, key, text_signature):
+        if self.bands is None:
+            return
+        self._remove(key)
+        if text_signature is not None:
+            self._add(self.bands, self.signatures, key, text_signature)
+
+    def _remove(self, key):
+        text_signature = self.signatures.pop(key, None)
+        if text_signature is None:
+            return
+        for band, band_key in zip(self.bands, band_keys(text_signature)):
+            keys = band.get(band_key)
+            if keys is None or key not in keys:
+                continue
+            keys.remove(key)
+            if not keys:
+                del band[band_key]
+
+    def find(self, text):
+        """match() after (re)building the index if it is stale."""
+        self._ensure_loaded()
+        return self.match(text)
+
+    def match(self, text):
+        """
+        (key, similarity) of the indexed text most similar to text, when
+        that is at least threshold, else None. Uses the index as it is.
+        """
+        return self.match_signature(signature(text))
+
+    def match_signature(self, text_signature):
+        if text_signature is None:
+            return None
+
+        with self.lock:
+            if self.bands is None:
+                return None
+            candidates = set()
+            for band, band_key in zip(self.bands, band_keys(text_signature)):
+                candidates.update(band.get(band_key, ()))
+            scored = [(similarity(text_signature, self.signatures[key]), key)
+                      for key in candidates]
+
+        scored = [(score, key) for score, key in scored
+                  if score >= self.threshold]
+        if not scored:
+            return None
+        score, key = min(scored, key=lambda pair: (-pair[0], pair[1]))
+        return key, score
+
+
+def batch_index(threshold):
+    """An empty DuplicateIndex for the rows of one import."""
+    index = DuplicateIndex(threshold)
+    index.build(())
+    return index
+
+
+def find_duplicates(threshold, chunk_size=1000):
+    """
+    One streaming pass over the questions in id order. Yields (id,
+    earlier id, similarity) for each question that nearly repeats an
+    earlier one; only the questions kept are indexed.
+    """
+    index = batch_index(threshold)
+    rows = db.session.query(*DuplicateIndex.columns).order_by(
+        Question.id).yield_per(chunk_size)
+    for question_id, question in rows:
+        text_signature = signature(question)
+        match = index.match_signature(text_signature)
+        if match is None:
+            index.add_signature(question_id, text_signature)
+        else:
+            yield (question_id, *match)
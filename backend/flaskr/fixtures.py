@@ -0,0 +1,78 @@
+import os
+
+from sqlalchemy import func, insert, select, text
+
+from models import Category, Question, db
+
+DEFAULT_FIXTURES = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'trivia.psql')
+
+COPY_ESCAPES = {'t': '\t', 'n': '\n', 'r': '\r', '\\': '\\'}
+MODELS = {'categories': Category, 'questions': Question}
+
+
+def _unescape(value):
+    """Decode one field of PostgreSQL COPY text format."""
+    if value == '\\N':
+        return None
+    if '\\' not in value:
+        return value
+    chars = []
+    escaped = False
+    for char in value:
+        if escaped:
+            chars.append(COPY_ESCAPES.get(char, char))
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        else:
+            chars.append(char)
+    return ''.join(chars)
+
+
+def read_psql_dump(path):
+    """
+    Yield (table, rows) for every COPY ... FROM stdin block of a pg_dump
+    file such as trivia.psql; rows are dicts keyed by column name.
+    """
+    with open(path, encoding='utf-8') as dump:
+        lines = iter(dump)
+        for line in lines:
+            if not (line.startswith('COPY ') and
+                    line.rstrip().endswith('FROM stdin;')):
+                continue
+            header = line[len('COPY '):line.index(' FROM stdin')]
+            table, columns = header.split(' ', 1)
+            table = table.split('.')[-1]
+            columns = [c.strip() for c in columns.strip('()').split(',')]
+            rows = []
+            for row in lines:
+                row = row.rstrip('\n')
+                if row == '\\.':
+                    break
+                values = [_unescape(v) for v in row.split('\t')]
+                rows.append(dict(zip(columns, values)))
+            yield table, rows
+
+
+def seed_db(path=DEFAULT_FIXTURES):
+    """
+    Load the categories and questions of a pg_dump fixture into the
+    bound database, keeping their ids. Works on SQLite and PostgreSQL.
+    """
+    for table, rows in read_psql_dump(path):
+        model = MODELS.get(table)
+        if model is None or not rows:
+            continue
+        db.session.execute(insert(model), rows)
+
+        if db.engine.dialect.name == 'postgresql':
+            # explicit ids do not advance the serial sequence
+            db.session.execute(
+                text("SELECT setval(pg_get_serial_sequence(:table, 'id'), "
+                     ":max_id)"),
+                {'table': table,
+                 'max_id': db.session.scalar(select(func.max(model.id)))})
+    Category.recount_questions()
+    db.session.commit()
@@ -0,0 +1,108 @@
+import threading
+import time
+
+from flask import current_app
+
+from models import db
+
+
+class TableIndex:
+    """
+    Base of the in-process indexes built from the questions table:
+    QuestionIndex, SearchIndex and DuplicateIndex. Kept current through
+    the question listeners and rebuilt after ttl seconds for rows
+    written by other workers:
+
+    - one load at a time: requests finding no index wait for the load
+      under way instead of each reading the table;
+    - once built, a stale index keeps serving while a background thread
+      rebuilds it, so no request waits on a rebuild;
+    - changes seen between reading the rows and swapping in the new
+      index are replayed onto it, so a question inserted during a
+      rebuild is not lost.
+
+    Subclasses define columns, is_built() and, called with self.lock
+    held, _make(rows) returning the new index, _install(index),
+    _apply(action, record) and _clear().
+    """
+
+    columns = ()
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.load_lock = threading.Lock()
+        self.built_at = None
+        # changes seen since a load started reading, replayed by build()
+        self.changes = None
+        self.refreshing = False
+
+    def is_stale(self):
+        if not self.is_built():
+            return True
+        return (self.ttl is not None and
+                time.monotonic() - self.built_at > self.ttl)
+
+    def record_changes(self):
+        """Keep the changes from now on for the next build() to replay."""
+        with self.lock:
+            self.changes = []
+
+    def build(self, rows):
+        """
+        Replace the index with one built from rows of columns, replaying
+        the changes recorded since record_changes(). Returns the index.
+        """
+        index = self._make(rows)
+        with self.lock:
+            self._install(index)
+            for action, record in self.changes or ():
+                self._apply(action, record)
+            self.changes = None
+            self.built_at = time.monotonic()
+        return index
+
+    def load(self):
+        """Read the table and build() from it, in the app context."""
+        self.record_changes()
+        return self.build(db.session.query(*self.columns).yield_per(1000))
+
+    def _ensure_loaded(self):
+        if not self.is_stale():
+            return
+        if self.is_built():
+            self._refresh_in_background()
+            return
+        with self.load_lock:
+            if self.is_stale():
+                self.load()
+
+    def _refresh_in_background(self):
+        with self.lock:
+            if self.refreshing:
+                return
+            self.refreshing = True
+        app = current_app._get_current_object()
+        threading.Thread(target=self._refresh, args=(app,),
+                         name=f'{type(self).__name__}-refresh',
+                         daemon=True).start()
+
+    def _refresh(self, app):
+        try:
+            with app.app_context(), self.load_lock:
+                if self.is_stale():
+                    self.load()
+        except Exception as e:
+            print(f"Error refreshing {type(self).__name__}: {e}")
+        finally:
+            self.refreshing = False
+
+    def invalidate(self):
+        with self.lock:
+            self._clear()
+
+    def on_question_change(self, action, record):
+        with self.lock:
+            if self.changes is not None:
+                self.changes.append((action, record))
+            self._apply(action, record)
@@ -0,0 +1,274 @@
+import threading
+import time
+
+from flask import Response, current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from models import db
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+PROMETHEUS_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\')
+                         .replace('"', '\\"'))
+        for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def inc(self, label_values=(), amount=1):
+        with self.lock:
+            self.series[label_values] = (
+                self.series.get(label_values, 0) + amount)
+
+    def samples(self):
+        with self.lock:
+            series = sorted(self.series.items())
+        for label_values, value in series:
+            yield self.name, _format_labels(self.labels, label_values), value
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, label_values=(), value=0):
+        with self.lock:
+            self.series[label_values] = value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, buckets, labels=()):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.labels = labels
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def observe(self, label_values, value):
+        with self.lock:
+            counts = self.series.get(label_values)
+            if counts is None:
+                # one slot per bucket, then +Inf, sum
+                counts = self.series[label_values] = (
+                    [0] * (len(self.buckets) + 1) + [0.0])
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            counts[-2] += 1
+            counts[-1] += value
+
+    def samples(self):
+        with self.lock:
+            series = sorted((k, list(v)) for k, v in self.series.items())
+        names = self.labels + ('le',)
+        for label_values, counts in series:
+            for bound, count in zip(self.buckets, counts):
+                yield (self.name + '_bucket',
+                       _format_labels(names, label_values + (bound,)), count)
+            yield (self.name + '_bucket',
+                   _format_labels(names, label_values + ('+Inf',)), counts[-2])
+            yield (self.name + '_sum',
+                   _format_labels(self.labels, label_values), counts[-1])
+            yield (self.name + '_count',
+                   _format_labels(self.labels, label_values), counts[-2])
+
+
+class PoolWaitHistogram:
+    """Checkout wait times recorded by models.InstrumentedQueuePool."""
+
+    kind = 'histogram'
+    name = 'trivia_db_pool_checkout_wait_seconds'
+    help = 'Time spent waiting for a pooled connection.'
+
+    def samples(self):
+        waits = getattr(db.engine.pool, 'checkout_waits', None)
+        if waits is None:
+            return
+        with waits.lock:
+            counts = list(waits.counts)
+            count, total = waits.count, waits.total
+        for bound, bucket_count in zip(waits.buckets, counts):
+            yield self.name + '_bucket', f'{{le="{bound}"}}', bucket_count
+        yield self.name + '_bucket', '{le="+Inf"}', count
+        yield self.name + '_sum', '', total
+        yield self.name + '_count', '', count
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{labels} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+class RequestMetrics:
+    """
+    Per-request instrumentation: duration, SQL statements and DB time
+    (from engine events) and rows loaded, per route. Rendered in the
+    Prometheus text format on /metrics. Requests slower than
+    SLOW_REQUEST_MS are logged with the statements they ran.
+    """
+
+    def __init__(self, app):
+        self.slow_ms = app.config.get('SLOW_REQUEST_MS')
+        self.registry = Registry()
+        labels = ('method', 'endpoint', 'status')
+        self.duration = self.registry.register(Histogram(
+            'trivia_request_duration_seconds', 'Request latency.',
+            DURATION_BUCKETS, labels))
+        self.statements = self.registry.register(Histogram(
+            'trivia_request_sql_statements', 'SQL statements per request.',
+            STATEMENT_BUCKETS, labels))
+        self.db_time = self.registry.register(Counter(
+            'trivia_sql_duration_seconds_total',
+            'Time spent executing SQL.', labels))
+        self.rows = self.registry.register(Counter(
+            'trivia_orm_rows_loaded_total',
+            'Rows loaded from query results: ORM instances and column '
+            'tuples.', labels))
+        self.pool_size = self.registry.register(Gauge(
+            'trivia_db_pool_size', 'Connections kept in the pool.'))
+        self.pool_checked_out = self.registry.register(Gauge(
+            'trivia_db_pool_checked_out', 'Connections currently in use.'))
+        self.pool_saturation = self.registry.register(Gauge(
+            'trivia_db_pool_saturation',
+            'Checked out connections / (pool size + max overflow).'))
+        self.registry.register(PoolWaitHistogram())
+
+        app.extensions['request_metrics'] = self
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        app.add_url_rule('/metrics', 'metrics', self.render,
+                         methods=['GET'])
+        _install_listeners()
+
+    def before_request(self):
+        g.metrics = {
+            'started': time.perf_counter(),
+            'statements': 0,
+            'db_time': 0.0,
+            'rows': 0,
+            'log': [] if self.slow_ms is not None else None,
+        }
+
+    def after_request(self, response):
+        stats = g.pop('metrics', None)
+        if stats is None:
+            return response
+        elapsed = time.perf_counter() - stats['started']
+        rule = request.url_rule.rule if request.url_rule else 'unmatched'
+        labels = (request.method, rule, str(response.status_code))
+
+        self.duration.observe(labels, elapsed)
+        self.statements.observe(labels, stats['statements'])
+        self.db_time.inc(labels, stats['db_time'])
+        self.rows.inc(labels, stats['rows'])
+
+        if self.slow_ms is not None and elapsed * 1000 >= self.slow_ms:
+            current_app.logger.warning(
+                'Slow request %s %s: %.1f ms, %d statements, %.1f ms in DB%s',
+                request.method, request.full_path.rstrip('?'),
+                elapsed * 1000, stats['statements'], stats['db_time'] * 1000,
+                ''.join(f'\n  {ms:.1f} ms  {sql}'
+                        for ms, sql in stats['log']))
+        return response
+
+    def update_pool_gauges(self):
+        pool = db.engine.pool
+        if not hasattr(pool, 'checkedout'):
+            return
+        size = pool.size()
+        checked_out = pool.checkedout()
+        capacity = size + max(getattr(pool, '_max_overflow', 0), 0)
+        self.pool_size.set((), size)
+        self.pool_checked_out.set((), checked_out)
+        self.pool_saturation.set((), checked_out / capacity if capacity else 0)
+
+    def render(self):
+        self.update_pool_gauges()
+        return Response(self.registry.render(), content_type=PROMETHEUS_TYPE)
+
+
+def _current_stats():
+    if not has_app_context():
+        return None
+    return g.get('metrics')
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    started = conn.info.get('metrics_started')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    stats = _current_stats()
+    if stats is None:
+        return
+    stats['statements'] += 1
+    stats['db_time'] += elapsed
+    if stats['log'] is not None:
+        stats['log'].append((elapsed * 1000, ' '.join(statement.split())))
+
+
+def _on_load(target, context):
+    stats = _current_stats()
+    if stats is not None:
+        stats['rows'] += 1
+
+
+def count_rows(count):
+    """
+    Add rows a query returned as column tuples to the request's rows
+    loaded; ORM instances are counted by the load event.
+    """
+    stats = _current_stats()
+    if stats is not None:
+        stats['rows'] += count
+
+
+_installed = False
+
+
+def _install_listeners():
+    global _installed
+    if _installed:
+        return
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(db.Model, 'load', _on_load, propagate=True)
+    _installed = True
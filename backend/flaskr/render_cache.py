@@ -0,0 +1,153 @@
+import functools
+import threading
+from collections import OrderedDict
+
+from flask import current_app, g, request
+
+from .search import matches, tokenize
+
+# seconds a follower waits for the leader of a coalesced miss
+FLIGHT_TIMEOUT = 30
+
+
+class Flight:
+    """One in-progress render that concurrent misses wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.body = None
+
+
+class RenderCache:
+    """
+    Micro-cache of rendered listing responses (the JSON text of 200
+    responses) in a stores.py backend, keyed by route and normalized
+    arguments. Concurrent misses for one key wait for a single render.
+    Entries are tagged with what they show: 'questions' for every
+    question, 'category:<id>' for one category, 'search:<terms>' for a
+    search, so the question listeners drop exactly the pages a change
+    can alter. Only this worker's writes are seen; entries written by
+    other workers to a shared store expire after the store's ttl.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.lock = threading.Lock()
+        self.flights = {}
+        # key -> tags, in LRU order, bounded like the store
+        self.entry_tags = OrderedDict()
+        self.keys_by_tag = {}
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _remember(self, key, tags):
+        self.entry_tags[key] = tags
+        self.entry_tags.move_to_end(key)
+        for tag in tags:
+            self.keys_by_tag.setdefault(tag, set()).add(key)
+        while len(self.entry_tags) > self.store.max_entries:
+            self._forget(next(iter(self.entry_tags)))
+
+    def _forget(self, key):
+        for tag in self.entry_tags.pop(key, ()):
+            keys = self.keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.keys_by_tag[tag]
+
+    def get_or_render(self, key, tags, render):
+        """
+        Return the cached JSON text for key, or call render() -> Response
+        once for all concurrent callers. Returns (text, None) on a hit
+        and (None, response) when the response is not cacheable.
+        """
+        body = self.store.get(key)
+        if body is not None:
+            self.hits += 1
+            return body, None
+
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight()
+                generation = self.generation
+        if not leader:
+            self.coalesced += 1
+            if flight.done.wait(FLIGHT_TIMEOUT) and flight.body is not None:
+                return flight.body, None
+            return None, render()
+
+        self.misses += 1
+        try:
+            response = render()
+            if response.status_code == 200 and not response.is_streamed:
+                flight.body = response.get_data(as_text=True)
+                with self.lock:
+                    # a write while rendering may have made it stale
+                    if self.generation == generation:
+                        self.store.set(key, flight.body)
+                        self._remember(key, tags)
+            return None, response
+        finally:
+            with self.lock:
+                del self.flights[key]
+            flight.done.set()
+
+    def invalidate_tags(self, tags):
+        with self.lock:
+            self.generation += 1
+            keys = set()
+            for tag in tags:
+                keys.update(self.keys_by_tag.get(tag, ()))
+            for key in keys:
+                self._forget(key)
+                self.store.delete(key)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entry_tags.clear()
+            self.keys_by_tag.clear()
+            self.store.clear()
+
+    def on_question_change(self, action, record):
+        tokens = (tokenize(record['question']) +
+                  tokenize(record['answer']))
+        with self.lock:
+            searches = [tag for tag in self.keys_by_tag
+                        if tag.startswith('search:') and
+                        matches(tag[len('search:'):].split(), tokens)]
+        self.invalidate_tags(
+            ['questions', f"category:{record['category']}"] + searches)
+
+    def on_category_change(self, action, record):
+        # /questions embeds the category map
+        self.invalidate_tags(['questions'])
+
+    def cached(self, tag_and_args):
+        """
+        Decorate a view. tag_and_args(request) returns the entry's tag
+        and its normalized arguments, or None to skip the cache.
+        Requests pinned to the primary database skip it too: their
+        reads may be ahead of what the replicas show everyone else.
+        """
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                found = None if g.get('db_pinned') else tag_and_args(request)
+                if found is None:
+                    return view(*args, **kwargs)
+                tag, normalized_args = found
+                body, response = self.get_or_render(
+                    f"{tag}|{normalized_args}", (tag,),
+                    lambda: current_app.make_response(view(*args, **kwargs)))
+                if response is not None:
+                    return response
+                return current_app.response_class(
+                    body, mimetype=current_app.json.mimetype)
+            return wrapper
+        return decorator
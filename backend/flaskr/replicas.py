@@ -0,0 +1,55 @@
+import random
+import time
+
+from flask import g, request
+
+# set after a client's own write; holds the expiry as a unix timestamp
+STICKY_COOKIE = 'db_primary_until'
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReplicaRouting:
+    """
+    Routes the database reads of read-only requests (GET, plus the POST
+    endpoints in read_only_endpoints) to a random read replica through
+    models.RoutingSession. After a client's own successful write, a
+    short-lived cookie pins their requests to the primary for
+    REPLICA_STICKY_SECONDS so they read their own writes despite
+    replication lag.
+    """
+
+    def __init__(self, app, read_only_endpoints=()):
+        # replica URL -> engine, created on first use
+        self.replicas = app.extensions['db_replicas']
+        self.replica_urls = list(self.replicas)
+        self.sticky_seconds = app.config['REPLICA_STICKY_SECONDS']
+        self.read_only_endpoints = set(read_only_endpoints)
+        app.extensions['replica_routing'] = self
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+
+    def is_read_only(self):
+        return (request.method in READ_METHODS or
+                request.endpoint in self.read_only_endpoints)
+
+    def is_sticky(self):
+        try:
+            return float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def before_request(self):
+        if not (self.replicas and self.is_read_only()):
+            return
+        if self.is_sticky():
+            g.db_pinned = True
+        else:
+            g.db_replica = self.replicas[random.choice(self.replica_urls)]
+
+    def after_request(self, response):
+        if not self.is_read_only() and response.status_code < 400:
+            expires = time.time() + self.sticky_seconds
+            response.set_cookie(
+                STICKY_COOKIE, f"{expires:.0f}", max_age=self.sticky_seconds,
+                httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,268 @@
+import atexit
+import bisect
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from sqlalchemy import func, insert, select
+
+from models import QuizResult, db
+
+from .selection import ALL_CATEGORIES
+
+RESULT_COLUMNS = (QuizResult.submission_id, QuizResult.player,
+                  QuizResult.category, QuizResult.score, QuizResult.questions,
+                  QuizResult.submitted_at)
+RESULT_KEYS = ('submission_id', 'player', 'category', 'score', 'questions',
+               'submitted_at')
+# seconds before the first retry of a failed flush, doubled per failure
+RETRY_DELAY = 1.0
+MAX_RETRY_DELAY = 60.0
+
+
+def result_row(player, category, score, questions):
+    """A quiz_results row for a result submitted now; category 0 is None."""
+    return {
+        'player': player,
+        'category': category or None,
+        'score': score,
+        'questions': questions,
+        'submitted_at': datetime.now(timezone.utc).replace(
+            tzinfo=None, microsecond=0),
+        'submission_id': uuid.uuid4().hex,
+    }
+
+
+def format_result(row):
+    """The leaderboard JSON of a quiz_results row."""
+    record = dict(row, submitted_at=row['submitted_at'].isoformat())
+    del record['submission_id']
+    return record
+
+
+def rank_key(record):
+    """Best first: higher score, then earlier submission, then name."""
+    return (-record['score'], record['submitted_at'], record['player'])
+
+
+class ResultWriter:
+    """
+    Write-behind buffer for quiz results. Submissions are appended in
+    memory and inserted flush_size rows per executemany and transaction
+    by a background thread, woken when the buffer fills and every
+    flush_interval seconds (None: only when full). Requests never wait
+    on the insert. Rows of a failed flush are kept, up to max_pending,
+    and retried after a delay that doubles with each failure.
+    """
+
+    def __init__(self, app, flush_size, flush_interval=None, max_pending=None):
+        self.app = app
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.pending = []
+        # rows taken by a flush that has not committed yet
+        self.in_flight = []
+        self.thread = None
+        self.wake = threading.Event()
+        self.flushed = 0
+        # flushes failed in a row
+        self.failures = 0
+
+    def add(self, row):
+        with self.lock:
+            self.pending.append(row)
+            if (self.max_pending is not None and
+                    len(self.pending) > self.max_pending):
+                del self.pending[0]
+            full = len(self.pending) >= self.flush_size
+        self._ensure_thread()
+        if full:
+            self.wake.set()
+
+    def snapshot(self):
+        """The rows not committed yet, including those being flushed."""
+        with self.lock:
+            return self.in_flight + self.pending
+
+    def flush(self):
+        """Insert the buffered rows; returns how many were written."""
+        with self.flush_lock:
+            with self.lock:
+                rows, self.pending = self.pending, []
+                self.in_flight = rows
+            if not rows:
+                return 0
+            try:
+                db.session.execute(insert(QuizResult), rows)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error writing quiz results: {e}")
+                with self.lock:
+                    self.in_flight = []
+                    self.pending[:0] = rows
+                    if self.max_pending is not None:
+                        del self.pending[:-self.max_pending]
+                self.failures += 1
+                return 0
+            with self.lock:
+                self.in_flight = []
+            self.failures = 0
+            self.flushed += len(rows)
+            return len(rows)
+
+    def flush_in_context(self):
+        with self.app.app_context():
+            return self.flush()
+
+    def retry_delay(self):
+        """Seconds to wait after the last failed flush."""
+        return min(RETRY_DELAY * 2 ** (self.failures - 1), MAX_RETRY_DELAY)
+
+    def _ensure_thread(self):
+        # started by the first submission, so in each worker after a fork
+        if self.thread is not None:
+            return
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(
+                target=self._run, name='quiz-result-writer', daemon=True)
+            self.thread.start()
+        if self.flush_interval is not None:
+            atexit.register(self.flush_in_context)
+
+    def _run(self):
+        while True:
+            if self.failures:
+                # the database is failing; a full buffer does not
+                # shorten the wait
+                time.sleep(self.retry_delay())
+            else:
+                self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            self.flush_in_context()
+
+
+class Leaderboard:
+    """
+    The best `size` results per category, and over all categories under
+    ALL_CATEGORIES, kept in sorted lists so reads slice a list instead of
+    sorting quiz_results. Submissions are ranked in as they arrive; the
+    lists are reloaded from the table (plus the writer's unflushed rows)
+    after ttl seconds to pick up other workers' results.
+    """
+
+    def __init__(self, size, ttl=None, pending=None):
+        self.size = size
+        self.ttl = ttl
+        self.pending = pending
+        self.lock = threading.Lock()
+        self.load_lock = threading.Lock()
+        self.boards = None
+        self.loaded_at = None
+
+    @staticmethod
+    def board_keys(category):
+        if category is None:
+            return (ALL_CATEGORIES,)
+        return (ALL_CATEGORIES, category)
+
+    def _insert(self, boards, record, keys):
+        """Rank record into the boards under keys; returns 1-based ranks."""
+        ranks = {}
+        for key in keys:
+            board = boards.setdefault(key, [])
+            position = bisect.bisect_right(board, rank_key(record),
+                                           key=rank_key)
+            if position < self.size:
+                board.insert(position, record)
+                del board[self.size:]
+                ranks[key] = position + 1
+        return ranks
+
+    def is_stale(self):
+        if self.boards is None:
+            return True
+        return (self.ttl is not None and
+                time.monotonic() - self.loaded_at > self.ttl)
+
+    def queries(self):
+        """Top-size rows per category and over all categories."""
+        order = (QuizResult.score.desc(), QuizResult.submitted_at,
+                 QuizResult.player)
+        ranked = select(*RESULT_COLUMNS, func.row_number().over(
+            partition_by=QuizResult.category, order_by=order).label(
+            'position')).where(QuizResult.category.is_not(None)).subquery()
+        per_category = select(*(ranked.c[key] for key in RESULT_KEYS)).where(
+            ranked.c.position <= self.size)
+        overall = select(*RESULT_COLUMNS).order_by(*order).limit(self.size)
+        return per_category, overall
+
+    def build(self, per_category_rows, overall_rows, pending=()):
+        """
+        Make the boards from the rows of queries() and unflushed rows.
+        A row read from the table and still pending counts once.
+        """
+        boards = {}
+        seen = set()
+
+        def rank_in(row, keys):
+            record = format_result(row)
+            for key in keys:
+                if (key, row['submission_id']) not in seen:
+                    seen.add((key, row['submission_id']))
+                    self._insert(boards, record, (key,))
+
+        for row in per_category_rows:
+            row = dict(zip(RESULT_KEYS, row))
+            rank_in(row, (row['category'],))
+        for row in overall_rows:
+            rank_in(dict(zip(RESULT_KEYS, row)), (ALL_CATEGORIES,))
+        for row in pending:
+            rank_in(row, self.board_keys(row['category']))
+        return boards
+
+    def _ensure_loaded(self):
+        if self.is_stale():
+            # one load at a time; submissions wait for it rather than
+            # ranking into boards that are about to be replaced
+            with self.load_lock:
+                if self.is_stale():
+                    # before the reads: a row committed meanwhile is in
+                    # both, one still being flushed is in the snapshot
+                    pending = self.pending() if self.pending else []
+                    per_category, overall = self.queries()
+                    boards = self.build(
+                        db.session.execute(per_category).all(),
+                        db.session.execute(overall).all(), pending)
+                    with self.lock:
+                        self.boards = boards
+                        self.loaded_at = time.monotonic()
+        return self.boards
+
+    def invalidate(self):
+        with self.lock:
+            self.boards = None
+
+    def add(self, row):
+        """
+        Rank a submitted quiz_results row in, before it is handed to the
+        writer. Returns its 1-based rank on its category's board (the
+        overall one for category None), None when it is not in the top.
+        """
+        keys = self.board_keys(row['category'])
+        self._ensure_loaded()
+        with self.lock:
+            ranks = self._insert(self.boards, format_result(row), keys)
+        return ranks.get(keys[-1])
+
+    def top(self, category=ALL_CATEGORIES, limit=None):
+        """The best results of category, best first."""
+        boards = self._ensure_loaded()
+        with self.lock:
+            return list(boards.get(category or ALL_CATEGORIES, ())[:limit])
@@ -0,0 +1,242 @@
+import asyncio
+import json
+import queue
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+# sent to every subscriber when nothing else was, so idle proxies keep
+# the stream open and dead connections are noticed
+KEEPALIVE = b': keepalive\n\n'
+# what players see of a question before the host reveals the answer
+PUBLIC_KEYS = ('id', 'question', 'category', 'difficulty')
+
+
+def sse_message(event, data, event_id=None):
+    """One Server-Sent Events message, encoded once for all subscribers."""
+    lines = [] if event_id is None else [f'id: {event_id}']
+    lines.append(f'event: {event}')
+    lines.append('data: ' + json.dumps(data, separators=(',', ':')))
+    return ('\n'.join(lines) + '\n\n').encode('utf-8')
+
+
+class QueueSubscriber:
+    """A player's stream in a threaded server: a bounded queue.Queue."""
+
+    def __init__(self, maxsize):
+        self.queue = queue.Queue(maxsize)
+        self.dropped = False
+
+    def deliver(self, message):
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except queue.Full:
+            self.dropped = True
+            return False
+
+    def messages(self, keepalive):
+        """Yield messages until the room closes or drops this subscriber."""
+        while not self.dropped:
+            try:
+                message = self.queue.get(timeout=keepalive)
+            except queue.Empty:
+                yield KEEPALIVE
+                continue
+            if message is None:
+                return
+            yield message
+
+
+class AsyncQueueSubscriber:
+    """
+    A player's stream on the event loop: a bounded asyncio.Queue. Only
+    deliver to it from the loop's thread.
+    """
+
+    def __init__(self, maxsize):
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped = False
+
+    def deliver(self, message):
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            self.dropped = True
+            return False
+
+    async def messages(self, keepalive):
+        while not self.dropped:
+            try:
+                message = await asyncio.wait_for(self.queue.get(), keepalive)
+            except asyncio.TimeoutError:
+                yield KEEPALIVE
+                continue
+            if message is None:
+                return
+            yield message
+
+
+class Room:
+    """
+    A hosted quiz. The questions are picked once when the room is
+    created; the host steps through them and every step is encoded once
+    and put on each subscriber's queue, so the cost of a step does not
+    depend on the number of players beyond one queue put each. A
+    subscriber whose queue is full is dropped and reconnects.
+    """
+
+    def __init__(self, room_id, host_token, category, questions):
+        self.room_id = room_id
+        self.host_token = host_token
+        self.category = category
+        self.questions = questions
+        self.lock = threading.Lock()
+        self.subscribers = set()
+        self.position = -1
+        self.revealed = False
+        self.closed = False
+        self.event_id = 0
+        self.messages = []
+        self.touched_at = time.monotonic()
+
+    @property
+    def finished(self):
+        return self.closed or (
+            self.position >= len(self.questions) - 1 and self.revealed)
+
+    def state(self):
+        return {
+            'room_id': self.room_id,
+            'category': self.category,
+            'question_count': len(self.questions),
+            'position': self.position,
+            'revealed': self.revealed,
+            'finished': self.finished,
+            'players': len(self.subscribers),
+        }
+
+    def subscribe(self, subscriber):
+        """
+        Add subscriber. Returns the messages to send it first: the room
+        state and the current step's events, so (re)joining players
+        catch up without the question history.
+        """
+        with self.lock:
+            self.touched_at = time.monotonic()
+            if self.closed:
+                subscriber.deliver(None)
+            else:
+                self.subscribers.add(subscriber)
+            return [sse_message('state', self.state())] + self.messages
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def _broadcast(self, event, data):
+        self.event_id += 1
+        message = sse_message(event, data, self.event_id)
+        for subscriber in list(self.subscribers):
+            if not subscriber.deliver(message):
+                self.subscribers.discard(subscriber)
+        return message
+
+    def advance(self):
+        """
+        The host's next step: reveal the current question's answer, or
+        broadcast the next question, or end the quiz after the last
+        answer. Returns the event name sent.
+        """
+        with self.lock:
+            self.touched_at = time.monotonic()
+            if self.closed:
+                return None
+            if self.position >= 0 and not self.revealed:
+                question = self.questions[self.position]
+                self.revealed = True
+                self.messages.append(self._broadcast('answer', {
+                    'position': self.position, 'id': question['id'],
+                    'answer': question['answer']}))
+                return 'answer'
+            if self.position + 1 < len(self.questions):
+                self.position += 1
+                self.revealed = False
+                question = self.questions[self.position]
+                # a joining player gets this question, not older ones
+                self.messages = [self._broadcast('question', {
+                    'position': self.position,
+                    'question_count': len(self.questions),
+                    'question': {key: question[key] for key in PUBLIC_KEYS}})]
+                return 'question'
+        self.close()
+        return 'end'
+
+    def close(self):
+        """End the quiz: send `end` and close every subscriber's stream."""
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.messages = [self._broadcast('end', {
+                'question_count': len(self.questions)})]
+            for subscriber in self.subscribers:
+                subscriber.deliver(None)
+            self.subscribers.clear()
+
+
+class Rooms:
+    """
+    The quiz rooms of this process, by id. Rooms idle for ttl seconds
+    are closed and dropped when rooms are created; at most max_rooms
+    are kept, the least recently used closed first.
+    """
+
+    def __init__(self, max_rooms=None, ttl=None):
+        self.max_rooms = max_rooms
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.rooms = OrderedDict()
+
+    def create(self, category, questions):
+        room = Room(secrets.token_urlsafe(8), secrets.token_urlsafe(16),
+                    category, questions)
+        expired = []
+        with self.lock:
+            now = time.monotonic()
+            for room_id, other in list(self.rooms.items()):
+                if self.ttl is not None and now - other.touched_at > self.ttl:
+                    expired.append(self.rooms.pop(room_id))
+            while self.max_rooms is not None and \
+                    len(self.rooms) >= self.max_rooms:
+                expired.append(self.rooms.popitem(last=False)[1])
+            self.rooms[room.room_id] = room
+        for other in expired:
+            other.close()
+        return room
+
+    def get(self, room_id):
+        """The room with room_id. Raises KeyError for unknown rooms."""
+        with self.lock:
+            room = self.rooms[room_id]
+            self.rooms.move_to_end(room_id)
+            return room
+
+    def remove(self, room_id):
+        with self.lock:
+            room = self.rooms.pop(room_id)
+        room.close()
+        return room
+
+    def host_room(self, room_id, host_token):
+        """
+        The room, when host_token is its host's. Raises KeyError for
+        unknown rooms and PermissionError for a wrong token.
+        """
+        room = self.get(room_id)
+        if not (isinstance(host_token, str) and
+                secrets.compare_digest(host_token, room.host_token)):
+            raise PermissionError(room_id)
+        return room
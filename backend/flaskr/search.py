@@ -0,0 +1,149 @@
+import bisect
+import math
+import re
+from collections import defaultdict
+
+from models import Question
+
+from .indexes import TableIndex
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# a hit in the question text counts more than one in the answer
+QUESTION_WEIGHT = 2.0
+ANSWER_WEIGHT = 1.0
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower()) if text else []
+
+
+def matches(terms, tokens):
+    """
+    Whether a document with tokens is a hit for the query terms, by the
+    rules of SearchIndex.search().
+    """
+    if not terms:
+        return False
+    *exact, last = terms
+    tokens = set(tokens)
+    return (all(term in tokens for term in exact) and
+            any(token.startswith(last) for token in tokens))
+
+
+class SearchIndex(TableIndex):
+    """
+    In-process inverted index over question and answer text. Every
+    query term must match a token; the last term also matches as a
+    prefix so partially typed words find results. Hits are ranked by
+    field-weighted tf-idf. See TableIndex for how it is kept current.
+    """
+
+    columns = (Question.id, Question.question, Question.answer)
+
+    def __init__(self, ttl=None):
+        super().__init__(ttl)
+        self.postings = None
+        self.documents = None
+        self.vocabulary = None
+
+    @staticmethod
+    def _add(postings, documents, question_id, question, answer):
+        weights = defaultdict(float)
+        for token in tokenize(question):
+            weights[token] += QUESTION_WEIGHT
+        for token in tokenize(answer):
+            weights[token] += ANSWER_WEIGHT
+        for token, weight in weights.items():
+            postings[token][question_id] = weight
+        documents[question_id] = tuple(weights)
+
+    def is_built(self):
+        return self.postings is not None
+
+    def _make(self, rows):
+        """Postings and documents of (id, question, answer) rows."""
+        postings = defaultdict(dict)
+        documents = {}
+        for question_id, question, answer in rows:
+            self._add(postings, documents, question_id, question, answer)
+        return postings, documents
+
+    def _install(self, index):
+        self.postings, self.documents = index
+        self.vocabulary = None
+
+    def _clear(self):
+        self.postings = None
+
+    def _apply(self, action, record):
+        if self.postings is None:
+            return
+        if action == 'insert':
+            self._remove(record['id'])
+            self._add(self.postings, self.documents, record['id'],
+                      record['question'], record['answer'])
+            self.vocabulary = None
+        elif action == 'delete':
+            self._remove(record['id'])
+
+    def _remove(self, question_id):
+        for token in self.documents.pop(question_id, ()):
+            posting = self.postings.get(token)
+            if posting is None:
+                continue
+            posting.pop(question_id, None)
+            if not posting:
+                del self.postings[token]
+                self.vocabulary = None
+
+    def _prefix_tokens(self, prefix):
+        if self.vocabulary is None:
+            self.vocabulary = sorted(self.postings)
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        for token in self.vocabulary[start:]:
+            if not token.startswith(prefix):
+                break
+            yield token
+
+    def _term_scores(self, tokens):
+        total = len(self.documents) or 1
+        scores = defaultdict(float)
+        for token in tokens:
+            posting = self.postings.get(token, {})
+            if not posting:
+                continue
+            idf = math.log(1 + total / len(posting))
+            for question_id, weight in posting.items():
+                scores[question_id] = max(scores[question_id], weight * idf)
+        return scores
+
+    def search(self, text):
+        """Return matching question ids, best match first."""
+        if tokenize(text):
+            self._ensure_loaded()
+        return self.rank(text)
+
+    def rank(self, text):
+        """search() against the index as it is, without (re)building it."""
+        terms = tokenize(text)
+        if not terms:
+            return []
+
+        with self.lock:
+            if self.postings is None:
+                return []
+            *exact, last = terms
+            term_scores = [self._term_scores([term]) for term in exact]
+            term_scores.append(
+                self._term_scores(list(self._prefix_tokens(last))))
+
+        term_scores.sort(key=len)
+        matches = set(term_scores[0])
+        for scores in term_scores[1:]:
+            matches.intersection_update(scores)
+
+        ranked = sorted(
+            matches,
+            key=lambda q_id: (-sum(s[q_id] for s in term_scores), q_id))
+        return ranked
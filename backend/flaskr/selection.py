@@ -0,0 +1,259 @@
+import random
+
+from models import Question, db
+
+from .indexes import TableIndex
+
+ALL_CATEGORIES = 0
+# difficulty of the buckets holding every difficulty of a category
+ANY_DIFFICULTY = None
+MIN_DIFFICULTY = 1
+MAX_DIFFICULTY = 5
+# adaptive quizzes step up after this many correct answers in a row
+ADAPTIVE_STREAK = 2
+
+# Below this share of eligible ids we stop guessing and skip the
+# excluded positions directly.
+REJECTION_THRESHOLD = 0.5
+REJECTION_ATTEMPTS = 8
+
+
+def category_key(category):
+    """Normalize a category id coming from the DB or a request body."""
+    if category is None or category == "":
+        return ALL_CATEGORIES
+    return int(category)
+
+
+def bucket_keys(category, difficulty):
+    """Every (category, difficulty) bucket a question belongs to."""
+    category = category_key(category)
+    difficulty = int(difficulty)
+    keys = [(ALL_CATEGORIES, ANY_DIFFICULTY), (ALL_CATEGORIES, difficulty)]
+    if category != ALL_CATEGORIES:
+        keys += [(category, ANY_DIFFICULTY), (category, difficulty)]
+    return keys
+
+
+def next_difficulty(difficulty, recent_answers):
+    """
+    Adaptive step: one level down after a wrong answer, one level up
+    after ADAPTIVE_STREAK correct answers in a row, otherwise unchanged.
+    recent_answers are booleans, oldest first.
+    """
+    if difficulty is None:
+        difficulty = (MIN_DIFFICULTY + MAX_DIFFICULTY) // 2
+    if recent_answers and not recent_answers[-1]:
+        difficulty -= 1
+    elif (len(recent_answers) >= ADAPTIVE_STREAK and
+          all(recent_answers[-ADAPTIVE_STREAK:])):
+        difficulty += 1
+    return min(max(difficulty, MIN_DIFFICULTY), MAX_DIFFICULTY)
+
+
+def nearest_difficulties(difficulty):
+    """difficulty first, then the others by distance, easier on ties."""
+    return sorted(range(MIN_DIFFICULTY, MAX_DIFFICULTY + 1),
+                  key=lambda level: (abs(level - difficulty), level))
+
+
+class IdBucket:
+    """Array of ids with O(1) add, remove and random pick."""
+
+    def __init__(self):
+        self.ids = []
+        self.positions = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, question_id):
+        return question_id in self.positions
+
+    def add(self, question_id):
+        if question_id in self.positions:
+            return
+        self.positions[question_id] = len(self.ids)
+        self.ids.append(question_id)
+
+    def remove(self, question_id):
+        index = self.positions.pop(question_id, None)
+        if index is None:
+            return
+        last = self.ids.pop()
+        if index < len(self.ids):
+            self.ids[index] = last
+            self.positions[last] = index
+
+    def pick(self, exclude=()):
+        """
+        Return a random id not in exclude, or None.
+        Few exclusions: rejection sampling. Many: walk the sorted
+        excluded positions to land on the r-th eligible slot.
+        """
+        size = len(self.ids)
+        excluded = sorted(
+            {self.positions[i] for i in exclude if i in self.positions})
+        remaining = size - len(excluded)
+        if remaining <= 0:
+            return None
+
+        if remaining >= size * REJECTION_THRESHOLD:
+            excluded_ids = set(exclude)
+            for _ in range(REJECTION_ATTEMPTS):
+                candidate = self.ids[random.randrange(size)]
+                if candidate not in excluded_ids:
+                    return candidate
+
+        index = random.randrange(remaining)
+        for position in excluded:
+            if position > index:
+                break
+            index += 1
+        return self.ids[index]
+
+
+class QuestionIndex(TableIndex):
+    """
+    Question id index used to pick quiz questions without loading the
+    candidate rows, bucketed by (category, difficulty) with category 0
+    and difficulty None standing for all of them. Built lazily from
+    (id, category, difficulty) tuples; see TableIndex for how it is
+    kept current.
+    """
+
+    columns = (Question.id, Question.category, Question.difficulty)
+
+    def __init__(self, ttl=None):
+        super().__init__(ttl)
+        self.buckets = None
+        # largest id indexed since the last build; deletes leave it
+        self.largest_id = 0
+
+    @staticmethod
+    def _add(buckets, question_id, category, difficulty):
+        for key in bucket_keys(category, difficulty):
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = IdBucket()
+            bucket.add(question_id)
+
+    def is_built(self):
+        return self.buckets is not None
+
+    def build(self, rows):
+        """
+        Replace the index with one built from (id, category, difficulty)
+        rows; returns its buckets.
+        """
+        return super().build(rows)[0]
+
+    def _make(self, rows):
+        buckets = {(ALL_CATEGORIES, ANY_DIFFICULTY): IdBucket()}
+        largest_id = 0
+        for question_id, category, difficulty in rows:
+            self._add(buckets, question_id, category, difficulty)
+            if question_id > largest_id:
+                largest_id = question_id
+        return buckets, largest_id
+
+    def _install(self, index):
+        self.buckets, self.largest_id = index
+
+    def _clear(self):
+        self.buckets = None
+
+    def _ensure_loaded(self):
+        super()._ensure_loaded()
+        return self.buckets or {}
+
+    def _apply(self, action, record):
+        if self.buckets is None:
+            return
+        if action == 'insert':
+            self._add(self.buckets, record['id'], record['category'],
+                      record['difficulty'])
+            self.largest_id = max(self.largest_id, record['id'])
+        elif action == 'delete':
+            for key in bucket_keys(record['category'], record['difficulty']):
+                bucket = self.buckets.get(key)
+                if bucket is not None:
+                    bucket.remove(record['id'])
+        elif action == 'discard':
+            for bucket in self.buckets.values():
+                bucket.remove(record['id'])
+
+    def pick_id(self, category, exclude=(), buckets=None,
+                difficulties=(ANY_DIFFICULTY,)):
+        """
+        Pick from the first of difficulties with an id left. Picks from
+        buckets, as returned by build(), instead of the current index
+        when given; it is then never (re)loaded.
+        """
+        if buckets is None:
+            buckets = self._ensure_loaded()
+        category = category_key(category)
+        with self.lock:
+            for difficulty in difficulties:
+                bucket = buckets.get((category, difficulty))
+                if bucket is None:
+                    continue
+                question_id = bucket.pick(exclude)
+                if question_id is not None:
+                    return question_id
+            return None
+
+    def sample_ids(self, category, count, exclude=(), buckets=None,
+                   difficulties=(ANY_DIFFICULTY,)):
+        """
+        Up to count distinct random ids not in exclude, drawn without
+        replacement, filling from difficulties in order.
+        """
+        if buckets is None:
+            buckets = self._ensure_loaded()
+        category = category_key(category)
+        excluded = set(exclude)
+        chosen = []
+        with self.lock:
+            for difficulty in difficulties:
+                bucket = buckets.get((category, difficulty))
+                while bucket is not None and len(chosen) < count:
+                    question_id = bucket.pick(excluded)
+                    if question_id is None:
+                        break
+                    chosen.append(question_id)
+                    excluded.add(question_id)
+        return chosen
+
+    def contains(self, category, question_id):
+        """Whether question_id is indexed in category (0 for all)."""
+        buckets = self._ensure_loaded()
+        with self.lock:
+            bucket = buckets.get((category_key(category), ANY_DIFFICULTY))
+            return bucket is not None and question_id in bucket
+
+    def max_id(self):
+        """The largest question id indexed, 0 when there are none."""
+        self._ensure_loaded()
+        return self.largest_id
+
+    def pick(self, category, exclude=(), difficulties=(ANY_DIFFICULTY,)):
+        """
+        Return a random Question in category (0 for all) that is not in
+        exclude, or None once every question has been played. With
+        difficulties, the first difficulty with a question left wins.
+        """
+        exclude = set(exclude)
+        while True:
+            question_id = self.pick_id(category, exclude,
+                                       difficulties=difficulties)
+            if question_id is None:
+                return None
+            question = db.session.get(Question, question_id)
+            if question is not None:
+                return question
+            self.discard(question_id)
+
+    def discard(self, question_id):
+        """Drop an id deleted by another worker since the index was built."""
+        self.on_question_change('discard', {'id': question_id})
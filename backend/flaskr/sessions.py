@@ -0,0 +1,89 @@
+import secrets
+
+from models import Question, db
+
+from .selection import category_key
+
+FEISTEL_ROUNDS = 4
+HASH_MASK = (1 << 64) - 1
+
+
+def mix(value):
+    """splitmix64 finalizer: a 64-bit value to a well-spread one."""
+    value = (value + 0x9E3779B97F4A7C15) & HASH_MASK
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & HASH_MASK
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & HASH_MASK
+    return value ^ (value >> 31)
+
+
+def permuted(position, size, seed):
+    """
+    The position-th value of a shuffle of range(size) keyed by seed,
+    computed without building the shuffle: a Feistel network is a
+    permutation of its power-of-two domain, and values past size are
+    fed through again until one lands in range.
+    """
+    half = max(((size - 1).bit_length() + 1) // 2, 1)
+    mask = (1 << half) - 1
+    keys = [mix(seed + round_number) for round_number in range(FEISTEL_ROUNDS)]
+    value = position
+    while True:
+        left, right = value >> half, value & mask
+        for key in keys:
+            left, right = right, left ^ (mix(key ^ right) & mask)
+        value = (left << half) | right
+        if value < size:
+            return value
+
+
+class QuizSessions:
+    """
+    Server-side quiz games. A session keeps its category, a random seed
+    and a cursor: the seed keys a shuffle of the question ids up to the
+    largest one when the session started, and each next question
+    advances the cursor through it, skipping ids outside the category
+    and ids deleted since. The state stays a few numbers however large
+    the bank and however many questions were played. Questions added
+    after a session started are not in its order.
+    """
+
+    def __init__(self, store, question_index):
+        self.store = store
+        self.question_index = question_index
+
+    def create(self, category):
+        session_id = secrets.token_urlsafe(16)
+        self.store.set(session_id, {
+            'category': category_key(category),
+            'seed': secrets.randbits(64),
+            'size': self.question_index.max_id() + 1,
+            'cursor': 0,
+        })
+        return session_id
+
+    def next_question(self, session_id):
+        """
+        Return the next unseen Question for the session, None when the
+        category is exhausted. Raises KeyError for unknown sessions.
+        """
+        state = self.store.get(session_id)
+        if state is None:
+            raise KeyError(session_id)
+
+        question = None
+        cursor = state['cursor']
+        while question is None and cursor < state['size']:
+            question_id = permuted(cursor, state['size'], state['seed'])
+            cursor += 1
+            if not self.question_index.contains(state['category'],
+                                                question_id):
+                continue
+            question = db.session.get(Question, question_id)
+            if question is None:
+                self.question_index.discard(question_id)
+        state['cursor'] = cursor
+        self.store.set(session_id, state)
+        return question
+
+    def end(self, session_id):
+        self.store.delete(session_id)
@@ -0,0 +1,84 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryStore:
+    """
+    In-process key/value store with LRU eviction and a per-entry TTL.
+    Values are kept as live Python objects.
+    """
+
+    def __init__(self, max_entries=10000, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def _encode(self, value):
+        return value
+
+    def _decode(self, value):
+        return value
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+        return self._decode(value)
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        value = self._encode(value)
+        with self.lock:
+            self.entries[key] = (expires_at, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class SharedStore(MemoryStore):
+    """
+    Local stand-in for a shared store such as Redis: values are
+    serialized to JSON bytes on write, so callers only ever see copies
+    and anything stored must survive a process boundary.
+    """
+
+    def _encode(self, value):
+        return json.dumps(value).encode('utf-8')
+
+    def _decode(self, value):
+        return json.loads(value)
+
+
+STORES = {
+    'memory': MemoryStore,
+    'shared': SharedStore,
+}
+
+
+def make_store(kind, max_entries=10000, ttl=None):
+    try:
+        store_class = STORES[kind]
+    except KeyError:
+        raise ValueError(f"Unknown store backend: {kind}")
+    return store_class(max_entries=max_entries, ttl=ttl)
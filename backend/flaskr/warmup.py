@@ -0,0 +1,28 @@
+import gc
+
+from models import db, is_memory_sqlite
+
+
+def warmup(app):
+    """
+    Load the category map, question counts, quiz id index, search index,
+    duplicate index and leaderboard of app ahead of the first request.
+    create_app calls it when WARMUP_ON_START is set; under gunicorn
+    --preload that happens once in the master, and forked workers share
+    the loaded structures copy-on-write instead of each querying and
+    building its own.
+    """
+    with app.app_context():
+        app.extensions['category_cache'].get()
+        app.extensions['count_cache'].get()
+        app.extensions['question_index']._ensure_loaded()
+        app.extensions['search_index']._ensure_loaded()
+        if app.config['DUPLICATE_POLICY'] != 'off':
+            app.extensions['duplicate_index']._ensure_loaded()
+        app.extensions['leaderboard']._ensure_loaded()
+        if not is_memory_sqlite(app.config['SQLALCHEMY_DATABASE_URI']):
+            # forked workers must not share the master's pooled connections
+            db.engine.dispose()
+    # move everything loaded so far out of the collector's reach, so
+    # collections in the workers do not write to (and copy) shared pages
+    gc.freeze()
@@ -0,0 +1,229 @@
+"""Schema migrations
+
+Each migration is a function taking a connection inside a transaction,
+registered in MIGRATIONS under an increasing version number. The applied
+version is stored in the one-row schema_version table. A database
+without tables is created from the models and stamped with the latest
+version; an existing database without schema_version (e.g. restored
+from trivia.psql) starts at version 0.
+"""
+
+from sqlalchemy import Integer, inspect, text
+
+from models import QuizResult, db
+
+
+def _create_index(connection, name, columns):
+    connection.execute(text(
+        f"CREATE INDEX IF NOT EXISTS {name} ON questions ({columns})"))
+
+
+def _reject_missing_categories(connection, condition):
+    ids = connection.execute(text(
+        f"SELECT id FROM questions WHERE {condition} ORDER BY id")
+    ).scalars().all()
+    if ids:
+        raise ValueError(
+            f"questions without a category: {ids}; "
+            "set their category before upgrading")
+
+
+def _category_foreign_key(connection):
+    for fk in inspect(connection).get_foreign_keys('questions'):
+        if (fk['constrained_columns'] == ['category'] and
+                fk['referred_table'] == 'categories'):
+            return fk
+    return None
+
+
+def _category_not_null(connection):
+    """
+    PostgreSQL: questions.category NOT NULL, referencing categories.id
+    without ON UPDATE/ON DELETE actions, as in the model. trivia.psql
+    has ON UPDATE CASCADE ON DELETE SET NULL.
+    """
+    connection.execute(text(
+        "ALTER TABLE questions ALTER COLUMN category SET NOT NULL"))
+    fk = _category_foreign_key(connection)
+    options = fk['options'] if fk is not None else {}
+    if options.get('onupdate') or options.get('ondelete'):
+        connection.execute(text(
+            f'ALTER TABLE questions DROP CONSTRAINT "{fk["name"]}"'))
+        fk = None
+    if fk is None:
+        connection.execute(text(
+            "ALTER TABLE questions ADD CONSTRAINT questions_category_fkey "
+            "FOREIGN KEY (category) REFERENCES categories (id)"))
+
+
+def category_foreign_key(connection):
+    """
+    questions.category: String -> Integer NOT NULL foreign key to
+    categories.id, plus indexes on (category, id) and (difficulty).
+    """
+    inspector = inspect(connection)
+    columns = {c['name']: c for c in inspector.get_columns('questions')}
+    is_integer = isinstance(columns['category']['type'], Integer)
+
+    # a blank category would become NULL (PostgreSQL) or 0 (SQLite)
+    _reject_missing_categories(
+        connection, "category IS NULL" if is_integer else
+        "category IS NULL OR TRIM(category) = ''")
+
+    if connection.dialect.name == 'sqlite':
+        # SQLite cannot alter column types or add constraints in place
+        if not (is_integer and _category_foreign_key(connection)):
+            connection.execute(text("""
+                CREATE TABLE questions_new (
+                    id INTEGER NOT NULL PRIMARY KEY,
+                    question VARCHAR NOT NULL,
+                    answer VARCHAR NOT NULL,
+                    category INTEGER NOT NULL REFERENCES categories (id),
+                    difficulty INTEGER NOT NULL
+                )"""))
+            connection.execute(text("""
+                INSERT INTO questions_new
+                    (id, question, answer, category, difficulty)
+                SELECT id, question, answer, CAST(category AS INTEGER),
+                       difficulty
+                FROM questions"""))
+            connection.execute(text("DROP TABLE questions"))
+            connection.execute(text(
+                "ALTER TABLE questions_new RENAME TO questions"))
+    else:
+        if not is_integer:
+            connection.execute(text(
+                "ALTER TABLE questions ALTER COLUMN category TYPE integer "
+                "USING category::integer"))
+        _category_not_null(connection)
+
+    _create_index(connection, 'ix_questions_category_id', 'category, id')
+    _create_index(connection, 'ix_questions_difficulty', 'difficulty')
+
+
+def category_question_counts(connection):
+    """
+    categories.question_count, the per-category question counter kept by
+    inserts and deletes, backfilled from the questions table.
+    """
+    columns = [c['name'] for c in inspect(connection).get_columns('categories')]
+    if 'question_count' not in columns:
+        connection.execute(text(
+            "ALTER TABLE categories "
+            "ADD COLUMN question_count INTEGER NOT NULL DEFAULT 0"))
+    connection.execute(text("""
+        UPDATE categories SET question_count = (
+            SELECT COUNT(*) FROM questions
+            WHERE questions.category = categories.id)"""))
+
+
+def quiz_results(connection):
+    """quiz_results table for the leaderboard."""
+    QuizResult.__table__.create(connection, checkfirst=True)
+
+
+def category_not_null(connection):
+    """
+    The NOT NULL and plain foreign key of category_foreign_key, for
+    PostgreSQL databases upgraded before it set them. SQLite has both.
+    """
+    if connection.dialect.name == 'sqlite':
+        return
+    _reject_missing_categories(connection, "category IS NULL")
+    _category_not_null(connection)
+
+
+def quiz_result_submission_ids(connection):
+    """
+    quiz_results.submission_id, so the leaderboard tells a row it reads
+    back from an identical result still buffered. Existing rows get
+    'row-<id>'.
+    """
+    columns = [c['name']
+               for c in inspect(connection).get_columns('quiz_results')]
+    if 'submission_id' in columns:
+        return
+
+    if connection.dialect.name == 'sqlite':
+        # SQLite cannot add a NOT NULL column without a default in place
+        connection.execute(text(
+            "DROP INDEX IF EXISTS ix_quiz_results_category_score"))
+        connection.execute(text(
+            "ALTER TABLE quiz_results RENAME TO quiz_results_old"))
+        QuizResult.__table__.create(connection)
+        connection.execute(text("""
+            INSERT INTO quiz_results
+                (id, player, category, score, questions, submitted_at,
+                 submission_id)
+            SELECT id, player, category, score, questions, submitted_at,
+                   'row-' || id
+            FROM quiz_results_old"""))
+        connection.execute(text("DROP TABLE quiz_results_old"))
+    else:
+        connection.execute(text(
+            "ALTER TABLE quiz_results ADD COLUMN submission_id VARCHAR(32)"))
+        connection.execute(text(
+            "UPDATE quiz_results SET submission_id = 'row-' || id"))
+        connection.execute(text(
+            "ALTER TABLE quiz_results "
+            "ALTER COLUMN submission_id SET NOT NULL"))
+        connection.execute(text(
+            "CREATE UNIQUE INDEX ix_quiz_results_submission_id "
+            "ON quiz_results (submission_id)"))
+
+
+MIGRATIONS = [
+    (1, category_foreign_key),
+    (2, category_question_counts),
+    (3, quiz_results),
+    (4, category_not_null),
+    (5, quiz_result_submission_ids),
+]
+HEAD = MIGRATIONS[-1][0]
+
+
+def current_version(connection):
+    """Applied schema version, None for a database never migrated."""
+    if not inspect(connection).has_table('schema_version'):
+        return None
+    return connection.execute(
+        text("SELECT version FROM schema_version")).scalar()
+
+
+def _stamp(connection, version):
+    if current_version(connection) is None:
+        connection.execute(text(
+            "CREATE TABLE schema_version (version INTEGER NOT NULL)"))
+        connection.execute(
+            text("INSERT INTO schema_version (version) VALUES (:version)"),
+            {'version': version})
+    else:
+        connection.execute(
+            text("UPDATE schema_version SET version = :version"),
+            {'version': version})
+
+
+def upgrade(engine=None):
+    """
+    Bring the bound database to the latest schema version. Returns the
+    list of versions applied.
+    """
+    engine = engine or db.engine
+    applied = []
+    with engine.begin() as connection:
+        version = current_version(connection)
+        if version is None:
+            if not inspect(connection).has_table('questions'):
+                db.metadata.create_all(connection)
+                _stamp(connection, HEAD)
+                return applied
+            version = 0
+            _stamp(connection, version)
+
+        for migration_version, migration in MIGRATIONS:
+            if migration_version <= version:
+                continue
+            migration(connection)
+            _stamp(connection, migration_version)
+            applied.append(migration_version)
+    return applied
@@ -1,39 +1,295 @@
-from sqlalchemy import Column, String, Integer
+from collections import Counter
+from functools import partial
+from sqlalchemy import (Column, DateTime, String, Integer, ForeignKey, Index,
+                        create_engine, delete, func, make_url, select, update)
+from sqlalchemy.pool import NullPool, QueuePool, StaticPool
+from flask import current_app, g, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from dotenv import load_dotenv
 import os 
+import threading
+import time
 
-load_dotenv()
-database_host = os.getenv("database_host")
-database_name = os.getenv("database_name")
-database_user = os.getenv("database_user")
-database_password = os.getenv("database_password")
-if database_password:
-    database_path = f'postgresql://{database_user}:{database_password}@{database_host}/{database_name}'
-else:
-    database_path = f'postgresql://{database_user}@{database_host}/{database_name}'
+"""
+default_database_path()
+    database URL from the environment (and .env): DATABASE_URL, else
+    PostgreSQL from the database_* variables. Read when an app is set
+    up, not at import, so importing the models stays cheap.
+"""
+def default_database_path():
+    load_dotenv()
+    database_host = os.getenv("database_host")
+    database_name = os.getenv("database_name")
+    database_user = os.getenv("database_user")
+    database_password = os.getenv("database_password")
+    if os.getenv("DATABASE_URL"):
+        return os.getenv("DATABASE_URL")
+    elif database_password:
+        return f'postgresql://{database_user}:{database_password}@{database_host}/{database_name}'
+    else:
+        return f'postgresql://{database_user}@{database_host}/{database_name}'
+
+
+def default_replica_paths():
+    """Read replica URLs from the comma separated $DATABASE_REPLICA_URLS."""
+    load_dotenv()
+    return [url.strip()
+            for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",")
+            if url.strip()]
+
+
+class RoutingSession(Session):
+    """
+    Session that sends reads to the replica engine chosen for the
+    current request (g.db_replica) and everything else, flushes and
+    INSERT/UPDATE/DELETE statements included, to the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not (
+                clause is not None and getattr(clause, 'is_dml', False)):
+            replica = g.get('db_replica') if has_app_context() else None
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind,
+                                **kwargs)
+
+
+class LazyEngines(dict):
+    """
+    Engines by key, each created on first lookup from the factory stored
+    under its key, so replicas a worker never reads from load no DB
+    driver and build no pool.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.lock = threading.Lock()
+
+    def __getitem__(self, key):
+        engine = super().__getitem__(key)
+        if isinstance(engine, partial):
+            with self.lock:
+                engine = super().__getitem__(key)
+                if isinstance(engine, partial):
+                    engine = engine()
+                    super().__setitem__(key, engine)
+        return engine
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
 
-db = SQLAlchemy()
+    def values(self):
+        return [self[key] for key in self]
+
+    def items(self):
+        return [(key, self[key]) for key in self]
+
+    def created(self):
+        """The engines created so far, e.g. to dispose of."""
+        return [engine for engine in super().values()
+                if not isinstance(engine, partial)]
+
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+# app config key -> create_engine() argument for server databases
+POOL_OPTIONS = {
+    'DB_POOL_SIZE': 'pool_size',
+    'DB_MAX_OVERFLOW': 'max_overflow',
+    'DB_POOL_TIMEOUT': 'pool_timeout',
+    'DB_POOL_RECYCLE': 'pool_recycle',
+    'DB_POOL_PRE_PING': 'pool_pre_ping',
+}
+POOL_DEFAULTS = {
+    'DB_POOL_RECYCLE': 1800,
+    'DB_POOL_PRE_PING': True,
+    'DB_STATEMENT_TIMEOUT_MS': None,
+    'DB_PGBOUNCER': False,
+}
 
 """
-setup_db(app)
-    binds a flask application and a SQLAlchemy service
+setup_db(app, database_path=None)
+    binds a flask application and a SQLAlchemy service. The database URL
+    is taken from database_path, then the app config, then the env vars;
+    SQLALCHEMY_ENGINE_OPTIONS in the app config is passed to the engine,
+    on top of the pool settings built from the DB_* config keys. Each
+    URL in DB_REPLICA_URLS (default: $DATABASE_REPLICA_URLS) gets a read
+    replica engine in app.extensions['db_replicas'], see RoutingSession.
+    Engines connect on first use, and no tables are created here: run
+    `flask upgrade-db` (migrations.upgrade) once per database.
 """
-def setup_db(app, database_path=database_path):
-    app.config['SQLALCHEMY_DATABASE_URI'] = database_path
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+def setup_db(app, database_path=None):
+    if database_path is not None:
+        app.config['SQLALCHEMY_DATABASE_URI'] = database_path
+    if 'SQLALCHEMY_DATABASE_URI' not in app.config:
+        app.config['SQLALCHEMY_DATABASE_URI'] = default_database_path()
+    app.config.setdefault('SQLALCHEMY_TRACK_MODIFICATIONS', False)
+    for key, value in POOL_DEFAULTS.items():
+        app.config.setdefault(key, value)
+
+    if 'DB_REPLICA_URLS' not in app.config:
+        app.config['DB_REPLICA_URLS'] = default_replica_paths()
+
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    engine_options = engine_options_for(app.config, uri)
+    engine_options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options
+
+    # plain engines rather than SQLALCHEMY_BINDS: a bind key would add
+    # a metadata to the shared db object of every app
+    replicas = LazyEngines()
+    for replica_uri in app.config['DB_REPLICA_URLS']:
+        replicas[replica_uri] = partial(
+            create_engine, replica_uri,
+            **engine_options_for(app.config, replica_uri))
+    app.extensions['db_replicas'] = replicas
     db.init_app(app)
 
+
+def engine_options_for(config, uri):
+    """Engine arguments for the database at uri."""
+    engine_options = pool_options(config, uri)
+    if is_memory_sqlite(uri):
+        # one shared connection, or every checkout sees an empty database
+        engine_options.setdefault('poolclass', StaticPool)
+        engine_options.setdefault(
+            'connect_args', {'check_same_thread': False})
+    return engine_options
+
+
+def pool_options(config, uri):
+    """Engine arguments for the DB_* pool and timeout settings."""
+    url = make_url(uri)
+    if url.get_backend_name() == 'sqlite':
+        return {}
+
+    if config.get('DB_PGBOUNCER'):
+        # PgBouncer owns the pooling; hold no idle server connections and
+        # never rely on per-connection state such as prepared statements
+        options = {'poolclass': NullPool}
+        if url.get_driver_name() == 'psycopg':
+            options['connect_args'] = {'prepare_threshold': None}
+        return options
+
+    options = {'poolclass': InstrumentedQueuePool}
+    for key, argument in POOL_OPTIONS.items():
+        if config.get(key) is not None:
+            options[argument] = config[key]
+    if config.get('DB_STATEMENT_TIMEOUT_MS'):
+        options['connect_args'] = {
+            'options': f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT_MS']}"}
+    return options
+
+
+class WaitStats:
+    """Bucketed durations of pool checkouts, in seconds."""
+
+    buckets = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        with self.lock:
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    self.counts[index] += 1
+            self.count += 1
+            self.total += seconds
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkout_waits = WaitStats()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.checkout_waits.observe(time.perf_counter() - started)
+
+
+def is_memory_sqlite(uri):
+    url = make_url(uri)
+    return (url.get_backend_name() == 'sqlite' and
+            url.database in (None, '', ':memory:'))
+
+"""
+add_question_listener(app, listener)
+    registers listener(action, record) to be called after a question is
+    committed ('insert') or removed ('delete'); record is Question.format()
+"""
+def add_question_listener(app, listener):
+    app.extensions.setdefault('question_listeners', []).append(listener)
+
+
+def notify_question_change(action, record):
+    bump_table_version('questions')
+    _notify('question_listeners', action, record)
+
+"""
+add_category_listener(app, listener)
+    same as add_question_listener for rows of the categories table
+"""
+def add_category_listener(app, listener):
+    app.extensions.setdefault('category_listeners', []).append(listener)
+
+
+def notify_category_change(action, record):
+    bump_table_version('categories')
+    _notify('category_listeners', action, record)
+
+
+def _notify(key, action, record):
+    if not has_app_context():
+        return
+    for listener in current_app.extensions.get(key, ()):
+        listener(action, record)
+
+"""
+table_version(table)
+    per-app change counter of a table, bumped on every committed insert,
+    update or delete notified above. Only this worker's writes count.
+"""
+def table_version(table):
+    if not has_app_context():
+        return 0
+    return current_app.extensions.get('table_versions', {}).get(table, 0)
+
+
+def bump_table_version(table):
+    if not has_app_context():
+        return
+    versions = current_app.extensions.setdefault('table_versions', {})
+    with _versions_lock:
+        versions[table] = versions.get(table, 0) + 1
+
+
+_versions_lock = threading.Lock()
+
 """
 Question
 """
 class Question(db.Model):
     __tablename__ = 'questions'
+    __table_args__ = (
+        Index('ix_questions_category_id', 'category', 'id'),
+        Index('ix_questions_difficulty', 'difficulty'),
+    )
 
     id = Column(Integer, primary_key=True)
     question = Column(String, nullable=False)
     answer = Column(String, nullable=False)
-    category = Column(String, nullable=False)
+    category = Column(Integer, ForeignKey('categories.id'), nullable=False)
     difficulty = Column(Integer, nullable=False)
 
     def __init__(self, question, answer, category, difficulty):
@@ -44,14 +300,38 @@ class Question(db.Model):
 
     def insert(self):
         db.session.add(self)
+        Category.adjust_question_counts({int(self.category): 1})
         db.session.commit()
+        notify_question_change('insert', self.format())
 
     def update(self):
         db.session.commit()
 
     def delete(self):
+        record = self.format()
         db.session.delete(self)
+        Category.adjust_question_counts({record['category']: -1})
         db.session.commit()
+        notify_question_change('delete', record)
+
+    @classmethod
+    def delete_ids(cls, ids):
+        """
+        Delete the questions with the given ids in one DELETE ... RETURNING
+        statement and commit. Returns the ids that existed.
+        """
+        columns = (cls.id, cls.question, cls.answer, cls.category,
+                   cls.difficulty)
+        result = db.session.execute(
+            delete(cls).where(cls.id.in_(ids)).returning(*columns),
+            execution_options={'synchronize_session': False})
+        records = [dict(zip(('id', 'question', 'answer', 'category',
+                             'difficulty'), row)) for row in result]
+        Category.adjust_question_counts(question_count_deltas(records, -1))
+        db.session.commit()
+        for record in records:
+            notify_question_change('delete', record)
+        return [record['id'] for record in records]
 
     def format(self):
         return {
@@ -62,6 +342,16 @@ class Question(db.Model):
             'difficulty': self.difficulty
         }
 
+"""
+question_count_deltas(records, sign)
+    {category id: sign * number of records} for Question.format() records
+    or row dicts, as passed to Category.adjust_question_counts
+"""
+def question_count_deltas(records, sign):
+    return {int(category): sign * count for category, count in
+            Counter(record['category'] for record in records).items()}
+
+
 """
 Category
 """
@@ -70,12 +360,100 @@ class Category(db.Model):
 
     id = Column(Integer, primary_key=True)
     type = Column(String, nullable=False)
+    # maintained in the transaction of every question insert and delete
+    question_count = Column(Integer, nullable=False, default=0,
+                            server_default='0')
 
     def __init__(self, type):
         self.type = type
 
+    @classmethod
+    def question_count_updates(cls, deltas):
+        """
+        UPDATE statements adding {category id: delta} to question_count,
+        for the transaction that inserts or deletes those questions.
+        """
+        return [update(cls).where(cls.id == category_id).values(
+                    question_count=cls.question_count + delta)
+                for category_id, delta in sorted(deltas.items()) if delta]
+
+    @classmethod
+    def adjust_question_counts(cls, deltas):
+        """Apply question_count_updates(deltas) in the current transaction."""
+        for statement in cls.question_count_updates(deltas):
+            db.session.execute(
+                statement, execution_options={'synchronize_session': False})
+
+    @classmethod
+    def recount_questions(cls):
+        """
+        Reset every question_count from the questions table, after rows
+        were loaded behind the counters' back (fixtures, raw inserts).
+        """
+        db.session.execute(
+            update(cls).values(question_count=select(func.count(Question.id))
+                               .where(Question.category == cls.id)
+                               .scalar_subquery()),
+            execution_options={'synchronize_session': False})
+
+    def insert(self):
+        db.session.add(self)
+        db.session.commit()
+        notify_category_change('insert', self.format())
+
+    def update(self):
+        db.session.commit()
+        notify_category_change('update', self.format())
+
+    def delete(self):
+        record = self.format()
+        db.session.delete(self)
+        db.session.commit()
+        notify_category_change('delete', record)
+
     def format(self):
         return {
             'id': self.id,
             'type': self.type
         }
+
+"""
+QuizResult
+    one finished quiz: the player's name, the category played (None for
+    all categories), correct answers out of questions. Written in
+    batches by flaskr.results.ResultWriter; submission_id is given when
+    the result is submitted, before the row has an id.
+"""
+class QuizResult(db.Model):
+    __tablename__ = 'quiz_results'
+    __table_args__ = (
+        Index('ix_quiz_results_category_score', 'category', 'score'),
+        Index('ix_quiz_results_submission_id', 'submission_id', unique=True),
+    )
+
+    id = Column(Integer, primary_key=True)
+    player = Column(String(50), nullable=False)
+    category = Column(Integer, ForeignKey('categories.id'), nullable=True)
+    score = Column(Integer, nullable=False)
+    questions = Column(Integer, nullable=False)
+    submitted_at = Column(DateTime, nullable=False)
+    submission_id = Column(String(32), nullable=False)
+
+    def __init__(self, player, category, score, questions, submitted_at,
+                 submission_id):
+        self.player = player
+        self.category = category
+        self.score = score
+        self.questions = questions
+        self.submitted_at = submitted_at
+        self.submission_id = submission_id
+
+    def format(self):
+        return {
+            'id': self.id,
+            'player': self.player,
+            'category': self.category,
+            'score': self.score,
+            'questions': self.questions,
+            'submitted_at': self.submitted_at.isoformat()
+        }
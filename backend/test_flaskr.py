@@ -1,9 +1,17 @@
+import gc
+import gzip
 import os
+import re
+import tempfile
+import threading
+import time
 import unittest
 import json
 
 from flaskr import create_app
-from models import setup_db, Question, Category, db
+from flaskr.fixtures import seed_db
+from migrations import upgrade
+from models import setup_db, is_memory_sqlite, Question, Category, db
 from dotenv import load_dotenv
 import os
 
@@ -19,7 +27,12 @@ class TriviaTestCase(unittest.TestCase):
         self.database_name_test = os.getenv("database_name_test")
         self.database_user = os.getenv("database_user")
         self.database_password = os.getenv("database_password")
-        if self.database_password:
+        if os.getenv("TEST_DATABASE_URL"):
+            self.database_path = os.getenv("TEST_DATABASE_URL")
+        elif not self.database_name_test:
+            # no test database configured: seeded in-memory SQLite
+            self.database_path = "sqlite://"
+        elif self.database_password:
             self.database_path = f'postgresql://{self.database_user}:{self.database_password}@{self.database_host}/{self.database_name_test}'
         else:
             self.database_path = f'postgresql://{self.database_user}@{self.database_host}/{self.database_name_test}'
@@ -28,13 +41,18 @@ class TriviaTestCase(unittest.TestCase):
         self.app = create_app({
             "SQLALCHEMY_DATABASE_URI": self.database_path,
             "SQLALCHEMY_TRACK_MODIFICATIONS": False,
-            "TESTING": True
+            "TESTING": True,
+            # quiz results are flushed only when the buffer fills or a test
+            # flushes them, never on a timer
+            "RESULTS_FLUSH_INTERVAL": None
         })
         self.client = self.app.test_client()
 
         # Bind the app to the current context and create all tables
         with self.app.app_context():
             db.create_all()
+            if is_memory_sqlite(self.database_path):
+                seed_db()
 
     def tearDown(self):
         """Executed after each test"""
@@ -44,6 +62,221 @@ class TriviaTestCase(unittest.TestCase):
     Write at least one test for each test for successful 
     operation and for expected errors.
     """
+    # test cases for app configuration
+    def test_create_app_honors_test_config(self):
+        app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite://",
+                          "QUIZ_SESSION_STORE": "shared"})
+
+        self.assertEqual(app.config["SQLALCHEMY_DATABASE_URI"], "sqlite://")
+        self.assertEqual(
+            type(app.extensions["quiz_sessions"].store).__name__,
+            "SharedStore")
+
+    def test_create_app_does_not_touch_the_database(self):
+        from sqlalchemy import text
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "trivia.db")
+            app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{path}"})
+
+            self.assertFalse(os.path.exists(path))
+
+            with app.app_context():
+                db.session.execute(text("SELECT 1"))
+                db.session.remove()
+                self.assertTrue(os.path.exists(path))
+                db.engine.dispose()
+
+    def test_warmup_loads_caches_and_indexes(self):
+        from flaskr.warmup import warmup
+
+        warmup(self.app)
+        gc.unfreeze()
+
+        self.assertFalse(self.app.extensions["category_cache"].is_stale())
+        self.assertFalse(self.app.extensions["count_cache"].is_stale())
+        self.assertFalse(self.app.extensions["question_index"].is_stale())
+        self.assertFalse(self.app.extensions["search_index"].is_stale())
+
+    def test_pool_options_from_config(self):
+        from sqlalchemy.pool import NullPool
+        from models import InstrumentedQueuePool, pool_options
+
+        options = pool_options({"DB_POOL_SIZE": 20, "DB_MAX_OVERFLOW": 5,
+                                "DB_POOL_PRE_PING": True,
+                                "DB_STATEMENT_TIMEOUT_MS": 5000},
+                               "postgresql://trivia@localhost/trivia")
+
+        self.assertIs(options["poolclass"], InstrumentedQueuePool)
+        self.assertEqual(options["pool_size"], 20)
+        self.assertEqual(options["max_overflow"], 5)
+        self.assertTrue(options["pool_pre_ping"])
+        self.assertEqual(options["connect_args"]["options"],
+                         "-c statement_timeout=5000")
+
+        options = pool_options({"DB_PGBOUNCER": True, "DB_POOL_SIZE": 20},
+                               "postgresql+psycopg://trivia@localhost/trivia")
+
+        self.assertIs(options["poolclass"], NullPool)
+        self.assertNotIn("pool_size", options)
+        self.assertIsNone(options["connect_args"]["prepare_threshold"])
+
+    def test_seed_db_command(self):
+        app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite://"})
+        result = app.test_cli_runner().invoke(args=["seed-db"])
+
+        self.assertEqual(result.exit_code, 0)
+        with app.app_context():
+            self.assertEqual(Category.query.count(), 6)
+            self.assertEqual(Question.query.count(), 19)
+
+    def test_upgrade_migrates_string_categories_in_place(self):
+        from sqlalchemy import create_engine, inspect, text
+        from migrations import HEAD, current_version, upgrade
+
+        engine = create_engine("sqlite://")
+        with engine.begin() as connection:
+            connection.execute(text(
+                "CREATE TABLE categories (id INTEGER PRIMARY KEY, type VARCHAR)"))
+            connection.execute(text(
+                "CREATE TABLE questions (id INTEGER PRIMARY KEY, "
+                "question VARCHAR, answer VARCHAR, category VARCHAR, "
+                "difficulty INTEGER)"))
+            connection.execute(text("INSERT INTO categories VALUES (1, 'Art')"))
+            connection.execute(text(
+                "INSERT INTO questions VALUES (7, 'q?', 'a', '1', 2)"))
+
+        self.assertEqual(upgrade(engine), [1, 2, 3, 4, HEAD])
+
+        with engine.connect() as connection:
+            inspector = inspect(connection)
+            self.assertEqual(current_version(connection), HEAD)
+            self.assertEqual(
+                connection.execute(text(
+                    "SELECT typeof(category) FROM questions")).scalar(),
+                "integer")
+            self.assertEqual(
+                inspector.get_foreign_keys("questions")[0]["referred_table"],
+                "categories")
+            self.assertIn("ix_questions_category_id",
+                          [i["name"] for i in inspector.get_indexes("questions")])
+            self.assertEqual(
+                connection.execute(text(
+                    "SELECT question_count FROM categories")).scalar(), 1)
+
+    def test_upgrade_adds_quiz_result_submission_ids(self):
+        from sqlalchemy import create_engine, inspect, text
+        from migrations import HEAD, upgrade
+
+        engine = create_engine("sqlite://")
+        with engine.begin() as connection:
+            connection.execute(text(
+                "CREATE TABLE categories (id INTEGER PRIMARY KEY, type VARCHAR)"))
+            connection.execute(text(
+                "CREATE TABLE questions (id INTEGER PRIMARY KEY, "
+                "question VARCHAR, answer VARCHAR, category INTEGER NOT NULL "
+                "REFERENCES categories (id), difficulty INTEGER)"))
+            connection.execute(text(
+                "CREATE TABLE quiz_results (id INTEGER PRIMARY KEY, "
+                "player VARCHAR(50) NOT NULL, category INTEGER, "
+                "score INTEGER NOT NULL, questions INTEGER NOT NULL, "
+                "submitted_at DATETIME NOT NULL)"))
+            connection.execute(text(
+                "CREATE INDEX ix_quiz_results_category_score "
+                "ON quiz_results (category, score)"))
+            connection.execute(text(
+                "INSERT INTO quiz_results VALUES "
+                "(4, 'ann', NULL, 3, 5, '2026-01-01 12:00:00')"))
+            connection.execute(text(
+                "CREATE TABLE schema_version (version INTEGER NOT NULL)"))
+            connection.execute(text("INSERT INTO schema_version VALUES (4)"))
+
+        self.assertEqual(upgrade(engine), [HEAD])
+
+        with engine.connect() as connection:
+            columns = {c["name"]: c for c in
+                       inspect(connection).get_columns("quiz_results")}
+            self.assertFalse(columns["submission_id"]["nullable"])
+            self.assertEqual(connection.execute(text(
+                "SELECT id, submission_id FROM quiz_results")).one(),
+                (4, "row-4"))
+            self.assertEqual(
+                {i["name"] for i in
+                 inspect(connection).get_indexes("quiz_results")},
+                {"ix_quiz_results_category_score",
+                 "ix_quiz_results_submission_id"})
+
+    def test_upgrade_rejects_questions_without_a_category(self):
+        from sqlalchemy import create_engine, text
+        from migrations import current_version, upgrade
+
+        engine = create_engine("sqlite://")
+        with engine.begin() as connection:
+            connection.execute(text(
+                "CREATE TABLE categories (id INTEGER PRIMARY KEY, type VARCHAR)"))
+            connection.execute(text(
+                "CREATE TABLE questions (id INTEGER PRIMARY KEY, "
+                "question VARCHAR, answer VARCHAR, category VARCHAR, "
+                "difficulty INTEGER)"))
+            connection.execute(text("INSERT INTO categories VALUES (1, 'Art')"))
+            connection.execute(text(
+                "INSERT INTO questions VALUES (7, 'q?', 'a', '1', 2), "
+                "(8, 'q?', 'a', '', 2), (9, 'q?', 'a', NULL, 2)"))
+
+        with self.assertRaisesRegex(ValueError, r"\[8, 9\]"):
+            upgrade(engine)
+
+        with engine.connect() as connection:
+            self.assertIsNone(current_version(connection))
+            self.assertEqual(connection.execute(text(
+                "SELECT category FROM questions WHERE id = 8")).scalar(), "")
+
+    # test cases for request metrics
+    def test_metrics_endpoint(self):
+        self.client.get("/questions")
+        res = self.client.get("/metrics")
+        body = res.data.decode()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.content_type.startswith("text/plain"))
+        self.assertIn('trivia_request_duration_seconds_count{method="GET",'
+                      'endpoint="/questions",status="200"} 1', body)
+        self.assertIn("trivia_request_sql_statements_bucket", body)
+
+    def test_metrics_count_rows_loaded_as_tuples(self):
+        self.client.get("/questions")
+        self.client.post("/questions/search", json={"searchTerm": "title"})
+        body = self.client.get("/metrics").data.decode()
+
+        self.assertIn('trivia_orm_rows_loaded_total{method="GET",'
+                      'endpoint="/questions",status="200"} 10', body)
+        self.assertIn('trivia_orm_rows_loaded_total{method="POST",'
+                      'endpoint="/questions/search",status="200"} 1', body)
+
+    # test cases for the JSON fast path
+    def test_json_encoder_matches_stdlib_for_floats(self):
+        from flaskr.encoding import make_encoder
+        for body in ({"b": [1e16, 1e-7, 0.5], "a": {"x": float("inf")},
+                      "c": 1},
+                     {"a": "x\x7fy"}):
+            self.assertEqual(make_encoder()(body), json.dumps(
+                body, sort_keys=True, separators=(",", ":")).encode() + b"\n")
+
+    def test_fast_json_matches_default_provider(self):
+        from flask.json.provider import DefaultJSONProvider
+
+        payloads = [
+            {"success": True, "questions": [{"id": 1, "question": "a?"}],
+             "total_questions": 1, "current_category": None},
+            {"categories": {2: "Art", 10: "Music", 1: "Science"}},
+            {"question": "Which Dutch graphic artist\u2013initials M C?"},
+        ]
+        default = DefaultJSONProvider(self.app)
+        with self.app.app_context():
+            for payload in payloads:
+                self.assertEqual(self.app.json.response(payload).data,
+                                 default.response(payload).data)
+
     # test cases for getting valid and invalid categories
 
     def test_get_categories(self):
@@ -54,6 +287,60 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data["success"], True)
         self.assertTrue(len(data["categories"]))
 
+    def test_get_categories_not_modified(self):
+        res = self.client.get("/categories")
+        etag = res.headers["ETag"]
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn("max-age", res.headers["Cache-Control"])
+
+        res = self.client.get("/categories", headers={"If-None-Match": etag})
+
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.data, b"")
+
+    def test_get_categories_with_counts(self):
+        res = self.client.get("/categories?with_counts=1")
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(set(data["question_counts"]), set(data["categories"]))
+        self.assertEqual(sum(data["question_counts"].values()),
+                         data["total_questions"])
+        self.assertIn("no-cache", res.headers["Cache-Control"])
+        with self.app.app_context():
+            self.assertEqual(data["total_questions"], Question.query.count())
+            self.assertEqual(
+                data["question_counts"]["1"],
+                Question.query.filter(Question.category == 1).count())
+
+    def test_question_counts_follow_create_and_delete(self):
+        def counts():
+            data = self.client.get("/categories?with_counts=1").get_json()
+            return data["question_counts"]["3"], data["total_questions"]
+
+        in_category, total = counts()
+        created = self.client.post("/questions", json={
+            "question": "counted question?", "answer": "yes",
+            "difficulty": 1, "category": "3"}).get_json()["created"]
+        self.client.post("/questions/bulk", data=json.dumps(
+            {"question": "bulk counted?", "answer": "yes", "difficulty": 1,
+             "category": 3}), content_type="application/x-ndjson")
+
+        self.assertEqual(counts(), (in_category + 2, total + 2))
+        self.assertEqual(
+            self.client.get("/categories/3/questions").get_json()[
+                "total_questions"], in_category + 2)
+        with self.app.app_context():
+            self.assertEqual(db.session.get(Category, 3).question_count,
+                             in_category + 2)
+
+        self.client.delete(f"/questions/{created}")
+        self.assertEqual(counts(), (in_category + 1, total + 1))
+        self.assertEqual(
+            self.client.get("/questions").get_json()["total_questions"],
+            total + 1)
+
     def test_404_sent_requesting_invalid_categories(self):
         res = self.client.get("/categories/1000")
         data = json.loads(res.data)
@@ -74,6 +361,101 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(len(data["questions"]))
         self.assertTrue(len(data["categories"]))
 
+    def test_get_questions_compressed(self):
+        res = self.client.get('/questions',
+                              headers={'Accept-Encoding': 'gzip'})
+        plain = self.client.get('/questions')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', res.headers['Vary'])
+        self.assertEqual(gzip.decompress(res.data), plain.data)
+        self.assertNotIn('Content-Encoding', plain.headers)
+
+    def test_small_responses_not_compressed(self):
+        res = self.client.get('/categories',
+                              headers={'Accept-Encoding': 'gzip'})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertNotIn('Content-Encoding', res.headers)
+
+    def test_get_questions_not_modified_until_questions_change(self):
+        res = self.client.get('/questions?page=2')
+        etag = res.headers['ETag']
+
+        res = self.client.get('/questions?page=2',
+                              headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.data, b'')
+
+        self.client.post('/questions', json={
+            'question': 'What is the capital of Italy?', 'answer': 'Rome',
+            'difficulty': 1, 'category': 3})
+        res = self.client.get('/questions?page=2',
+                              headers={'If-None-Match': etag})
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res.headers['ETag'], etag)
+
+    def test_get_questions_from_render_cache(self):
+        render_cache = self.app.extensions['render_cache']
+        first = self.client.get('/questions?page=1')
+        second = self.client.get('/questions?page=01')
+
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(render_cache.hits, 1)
+
+        self.client.post('/questions', json={
+            'question': 'What is the capital of Spain?', 'answer': 'Madrid',
+            'difficulty': 1, 'category': 3})
+        res = self.client.get('/questions?page=1')
+        self.assertEqual(json.loads(res.data)['total_questions'],
+                         json.loads(first.data)['total_questions'] + 1)
+
+    def test_render_cache_invalidates_affected_pages_only(self):
+        render_cache = self.app.extensions['render_cache']
+        self.client.get('/categories/2/questions')
+        self.client.post('/questions/search', json={'searchTerm': 'title'})
+        self.client.post('/questions/search', json={'searchTerm': 'Cup'})
+
+        self.client.post('/questions', json={
+            'question': 'Which country won the 2010 World Cup?',
+            'answer': 'Spain', 'difficulty': 2, 'category': 6})
+
+        self.assertIn('category:2|page=1', render_cache.entry_tags)
+        self.assertIn('search:title|page=1', render_cache.entry_tags)
+        self.assertNotIn('search:cup|page=1', render_cache.entry_tags)
+
+    def test_render_cache_coalesces_concurrent_misses(self):
+        from flask import Response
+        from flaskr.render_cache import RenderCache
+        from flaskr.stores import MemoryStore
+
+        render_cache = RenderCache(MemoryStore(ttl=60))
+        release = threading.Event()
+        renders = []
+
+        def render():
+            renders.append(1)
+            release.wait(5)
+            return Response('{"success":true}\n',
+                            mimetype='application/json')
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(
+            render_cache.get_or_render('questions|page=1', ('questions',),
+                                       render))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        while render_cache.coalesced < 4:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(renders), 1)
+        self.assertEqual(len(results), 5)
+
     def test_404_sent_requesting_questions_beyond_valid_page(self):
         res = self.client.get("/questions?page=100000000")
         data = json.loads(res.data)
@@ -82,6 +464,27 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data["success"], False)
         self.assertEqual(data["message"], "resource not found")
 
+    def test_get_questions_with_cursor(self):
+        res = self.client.get("/questions?after=0&limit=5")
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(data["questions"]), 5)
+        self.assertEqual(data["next_cursor"], data["questions"][-1]["id"])
+
+        res = self.client.get(f"/questions?after={data['next_cursor']}&limit=5")
+        next_page = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertGreater(next_page["questions"][0]["id"], data["next_cursor"])
+
+    def test_invalid_cursor_is_served_as_page_one(self):
+        res = self.client.get('/questions?after=abc')
+        self.assertNotIn('next_cursor', res.get_json())
+
+        res = self.client.get('/questions')
+        self.assertNotIn('next_cursor', res.get_json())
+
     # test cases for deleting valid and invalid question id
     def test_delete_question(self):
         with self.app.app_context():
@@ -110,6 +513,33 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data["success"], False)
         self.assertEqual(data["message"], "unprocessable")
 
+    def test_delete_questions_in_batch(self):
+        with self.app.app_context():
+            ids = []
+            for number in range(3):
+                sample_question = Question(
+                    question=f"batch question {number}?", answer="this",
+                    difficulty=1, category=3)
+                sample_question.insert()
+                ids.append(sample_question.id)
+
+        res = self.client.delete("/questions", json={"ids": ids + [-1]})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data["success"], True)
+        self.assertEqual(sorted(data["deleted"]), ids)
+        with self.app.app_context():
+            self.assertEqual(
+                Question.query.filter(Question.id.in_(ids)).count(), 0)
+
+    def test_422_batch_delete_without_ids(self):
+        res = self.client.delete("/questions", json={"ids": []})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 422)
+        self.assertEqual(data["success"], False)
+
     # test cases for creating valid and invalid questions
     def test_create_new_question(self):
         sample_question = {"question": "what is the sample question?",
@@ -134,6 +564,174 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data["success"], False)
         self.assertEqual(data["message"], "unprocessable")
 
+    # test cases for near-duplicate questions
+    def test_create_question_skips_duplicate_check_by_default(self):
+        res = self.client.post("/questions", json={
+            "question": "Whose autobiography is entitled 'I know why the "
+                        "caged bird sings'",
+            "answer": "Maya Angelou", "difficulty": 2, "category": 4})
+
+        self.assertEqual(res.status_code, 201)
+        self.assertNotIn("duplicate_of", res.get_json())
+        self.assertFalse(self.app.extensions["duplicate_index"].is_built())
+
+    def test_create_question_flags_near_duplicate(self):
+        self.app.config["DUPLICATE_POLICY"] = "flag"
+        res = self.client.post("/questions", json={
+            "question": "What movie earned Tom Hanks his 3rd straight "
+                        "Oscar nomination in 1996",
+            "answer": "Apollo 13", "difficulty": 4, "category": 5})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(data["duplicate_of"], 2)
+
+        res = self.client.post("/questions", json={
+            "question": "Which planet is known as the red planet?",
+            "answer": "Mars", "difficulty": 1, "category": 1})
+        self.assertIsNone(res.get_json()["duplicate_of"])
+
+    def test_409_near_duplicate_question_rejected(self):
+        self.app.config["DUPLICATE_POLICY"] = "reject"
+        question = {"question": "whose AUTOBIOGRAPHY is entitled: I know "
+                                "why the caged bird sings",
+                    "answer": "Maya Angelou", "difficulty": 2, "category": 4}
+
+        res = self.client.post("/questions", json=question)
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 409)
+        self.assertEqual(data["success"], False)
+        self.assertEqual(data["duplicate_of"], 5)
+
+        res = self.client.post("/questions",
+                               json=dict(question, allow_duplicate=True))
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(res.get_json()["duplicate_of"], 5)
+
+    def test_bulk_create_skips_near_duplicates(self):
+        self.app.config["DUPLICATE_POLICY"] = "reject"
+        lines = "\n".join(json.dumps(
+            {"question": question, "answer": "a", "difficulty": 1,
+             "category": 3}) for question in (
+            "Which bridge is the longest suspension bridge in Europe?",
+            "Whose autobiography is entitled I Know Why the Caged Bird Sings",
+            "Which bridge is the longest suspension bridge in Europe",
+            "Which river flows through the most capital cities?"))
+        res = self.client.post("/questions/bulk", data=lines,
+                               content_type="application/x-ndjson")
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(data["created"], 2)
+        self.assertEqual(data["duplicate_lines"], [2, 3])
+
+    def test_dedup_questions_command(self):
+        with self.app.app_context():
+            total = Question.query.count()
+            copy = Question(question="What was the title of the 1990 fantasy "
+                                     "directed by Tim Burton about a young "
+                                     "man with multi-bladed appendages",
+                            answer="Edward Scissorhands", difficulty=3,
+                            category=5)
+            copy.insert()
+            copy_id = copy.id
+
+        runner = self.app.test_cli_runner()
+        result = runner.invoke(args=["dedup-questions"])
+        self.assertIn(f"{copy_id} repeats 6", result.output)
+        self.assertIn("Found 1 duplicate questions", result.output)
+
+        result = runner.invoke(args=["dedup-questions", "--delete"])
+        self.assertEqual(result.exit_code, 0)
+        with self.app.app_context():
+            self.assertEqual(Question.query.count(), total)
+            self.assertIsNone(db.session.get(Question, copy_id))
+            self.assertIsNotNone(db.session.get(Question, 6))
+
+    # test cases for bulk import and export
+    def test_bulk_create_questions(self):
+        lines = "\n".join([
+            json.dumps({"question": "bulk question one?", "answer": "one",
+                        "difficulty": 1, "category": 3}),
+            json.dumps({"question": "bulk question two?", "answer": "two",
+                        "difficulty": 2, "category": 3}),
+            json.dumps({"question": "", "answer": "missing"}),
+        ])
+        res = self.client.post("/questions/bulk", data=lines,
+                               content_type="application/x-ndjson")
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(data["success"], True)
+        self.assertEqual(data["created"], 2)
+        self.assertEqual(data["invalid_lines"], [3])
+
+    def test_bulk_create_notifies_listeners_with_typed_rows(self):
+        from models import add_question_listener
+        records = []
+        add_question_listener(self.app, lambda action, record:
+                              records.append(record))
+
+        lines = "question,answer,difficulty,category\nNew art q?,yes,5,2\n"
+        self.client.post("/questions/bulk", data=lines,
+                         content_type="text/csv")
+
+        self.assertEqual(len(records), 1)
+        self.assertEqual((records[0]["category"], records[0]["difficulty"]),
+                         (2, 5))
+
+    def test_bulk_created_question_is_picked_by_difficulty(self):
+        res = self.client.post("/quizzes", json={
+            "previous_questions": [], "quiz_category": {"id": 2},
+            "difficulty": 5})
+        self.assertIsNone(res.get_json()["question"])
+
+        lines = "question,answer,difficulty,category\nNew art q?,yes,5,2\n"
+        res = self.client.post("/questions/bulk", data=lines,
+                               content_type="text/csv")
+        self.assertEqual(res.get_json()["created"], 1)
+
+        res = self.client.post("/quizzes", json={
+            "previous_questions": [], "quiz_category": {"id": 2},
+            "difficulty": 5})
+        self.assertEqual(res.get_json()["question"]["question"], "New art q?")
+
+    def test_bulk_create_failure_reports_committed_chunks(self):
+        self.app.config['BULK_CHUNK_SIZE'] = 2
+        lines = "\n".join(
+            json.dumps({"question": f"chunked question {i}?", "answer": "a",
+                        "difficulty": [1] if i == 4 else 1, "category": 3})
+            for i in range(1, 6))
+        res = self.client.post("/questions/bulk", data=lines,
+                               content_type="application/x-ndjson")
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 422)
+        self.assertEqual(data["success"], False)
+        self.assertEqual(data["created"], 2)
+        self.assertEqual(data["failed_lines"], [3, 4])
+        res = self.client.post("/questions/search",
+                               json={"searchTerm": "chunked question"})
+        self.assertEqual(res.get_json()["total_questions"], 2)
+
+    def test_400_bulk_create_unsupported_type(self):
+        res = self.client.post("/questions/bulk", data="question",
+                               content_type="text/plain")
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data["success"], False)
+        self.assertEqual(data["message"], "bad request")
+
+    def test_export_questions(self):
+        res = self.client.get("/questions/export")
+        rows = [json.loads(line) for line in res.data.decode().splitlines()]
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(len(rows))
+        self.assertEqual(set(rows[0]),
+                         {"id", "question", "answer", "difficulty", "category"})
+
     # test cases for searching valid and invalid keywords in questions
     def test_get_question_search_with_results(self):
         res = self.client.post("/questions/search", json={"searchTerm": "is"})
@@ -144,6 +742,94 @@ class TriviaTestCase(unittest.TestCase):
         self.assertIsNotNone(data['questions'])
         self.assertIsNotNone(data['total_questions'])
 
+    def test_400_search_term_not_a_string(self):
+        res = self.client.post("/questions/search", json={"searchTerm": 123})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data["message"], "bad request")
+
+    def test_get_question_search_not_modified(self):
+        res = self.client.get('/questions/search?searchTerm=title')
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['total_questions'], 1)
+
+        res = self.client.get('/questions/search?searchTerm=title',
+                              headers={'If-None-Match': res.headers['ETag']})
+        self.assertEqual(res.status_code, 304)
+
+    def test_search_matches_words_and_prefix(self):
+        res = self.client.post("/questions/search",
+                               json={"searchTerm": "soccer world"})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(sorted(q["id"] for q in data["questions"]), [10, 11])
+        self.assertEqual(data["total_questions"], 2)
+
+    def test_search_index_loads_once_for_concurrent_requests(self):
+        from unittest import mock
+        index = self.app.extensions['search_index']
+        loads = []
+        make = index._make
+
+        def counting_make(rows):
+            loads.append(threading.current_thread().name)
+            time.sleep(0.05)
+            return make(rows)
+
+        def search():
+            with self.app.app_context():
+                index.search('title')
+
+        with mock.patch.object(index, '_make', counting_make):
+            threads = [threading.Thread(target=search) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(loads), 1)
+
+    def test_stale_search_index_is_rebuilt_in_the_background(self):
+        from unittest import mock
+        index = self.app.extensions['search_index']
+        self.client.post('/questions/search', json={'searchTerm': 'title'})
+        built_at = index.built_at
+        index.ttl = 0
+        release = threading.Event()
+        make = index._make
+
+        def waiting_make(rows):
+            release.wait(5)
+            return make(rows)
+
+        with mock.patch.object(index, '_make', waiting_make):
+            # served by the stale index while the rebuild waits
+            res = self.client.post('/questions/search',
+                                   json={'searchTerm': 'soccer'})
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(index.built_at, built_at)
+            release.set()
+            deadline = time.monotonic() + 5
+            while index.built_at == built_at and time.monotonic() < deadline:
+                time.sleep(0.01)
+        self.assertGreater(index.built_at, built_at)
+
+    def test_search_index_keeps_inserts_made_during_a_rebuild(self):
+        from flaskr.search import SearchIndex
+        index = SearchIndex()
+        with self.app.app_context():
+            index.record_changes()
+            rows = db.session.query(*index.columns).all()
+        # committed after the rows were read, before the new index is in
+        index.on_question_change('insert', {
+            'id': 1000, 'question': 'Which zeppelin burned?',
+            'answer': 'Hindenburg'})
+        index.build(rows)
+
+        self.assertEqual(index.rank('zeppelin'), [1000])
+
     def test_get_book_search_without_results(self):
         res = self.client.post("/questions/search", json={"searchTerm": {}})
         data = json.loads(res.data)
@@ -182,6 +868,386 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(res.status_code, 200)
         self.assertEqual(data['success'], True)
 
+    def test_play_quiz_skips_previous_questions(self):
+        quiz = {'previous_questions': [16, 17, 18],
+                'quiz_category': {'type': 'Art', 'id': 2}}
+
+        res = self.client.post('/quizzes', json=quiz)
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['question']['id'], 19)
+
+    def test_play_quiz_ends_when_category_exhausted(self):
+        quiz = {'previous_questions': [16, 17, 18, 19],
+                'quiz_category': {'type': 'Art', 'id': 2}}
+
+        res = self.client.post('/quizzes', json=quiz)
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertIsNone(data['question'])
+
+    def test_play_quiz_with_difficulty(self):
+        quiz = {'previous_questions': [],
+                'quiz_category': {'type': 'Art', 'id': 2},
+                'difficulty': 3}
+
+        res = self.client.post('/quizzes', json=quiz)
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['question']['id'], 17)
+        self.assertEqual(data['difficulty'], 3)
+
+        quiz['previous_questions'] = [17]
+        res = self.client.post('/quizzes', json=quiz)
+        self.assertIsNone(json.loads(res.data)['question'])
+
+    def test_play_adaptive_quiz(self):
+        quiz = {'previous_questions': [16],
+                'quiz_category': {'type': 'Art', 'id': 2},
+                'adaptive': True, 'difficulty': 3,
+                'recent_answers': [True, True]}
+
+        res = self.client.post('/quizzes', json=quiz)
+        data = json.loads(res.data)
+        self.assertEqual(data['difficulty'], 4)
+        self.assertEqual(data['question']['id'], 18)
+
+        # level 4 is used up: the nearest level with questions left
+        quiz['previous_questions'] = [16, 18]
+        res = self.client.post('/quizzes', json=quiz)
+        data = json.loads(res.data)
+        self.assertEqual(data['difficulty'], 4)
+        self.assertEqual(data['question']['id'], 17)
+
+        quiz['recent_answers'] = [True, False]
+        res = self.client.post('/quizzes', json=quiz)
+        data = json.loads(res.data)
+        self.assertEqual(data['difficulty'], 2)
+        self.assertEqual(data['question']['id'], 19)
+
+    def test_400_play_quiz_invalid_difficulty(self):
+        quiz = {'previous_questions': [],
+                'quiz_category': {'type': 'Art', 'id': 2},
+                'difficulty': 9}
+        res = self.client.post('/quizzes', json=quiz)
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data["message"], "bad request")
+
+    def test_400_play_quiz_category_without_id(self):
+        for quiz in ({'previous_questions': [], 'quiz_category': 'Art'},
+                     {'previous_questions': ['x'], 'quiz_category': {'id': 2}}):
+            res = self.client.post('/quizzes', json=quiz)
+
+            self.assertEqual(res.status_code, 400)
+            self.assertEqual(res.get_json()["message"], "bad request")
+
+    def test_play_quiz_round(self):
+        quiz = {'previous_questions': [16],
+                'quiz_category': {'type': 'Art', 'id': 2},
+                'count': 5}
+
+        res = self.client.post('/quizzes/round', json=quiz)
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(sorted(q['id'] for q in data['questions']),
+                         [17, 18, 19])
+
+    def test_play_quiz_round_from_all_categories(self):
+        res = self.client.post('/quizzes/round',
+                               json={'quiz_category': {'id': 0}})
+        data = json.loads(res.data)
+        ids = [q['id'] for q in data['questions']]
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(ids), 5)
+        self.assertEqual(len(set(ids)), 5)
+
+    def test_400_quiz_round_count_too_large(self):
+        res = self.client.post('/quizzes/round', json={
+            'quiz_category': {'id': 0}, 'count': 1000})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data["success"], False)
+
+    def test_400_quiz_round_category_not_an_object(self):
+        res = self.client.post('/quizzes/round', json={'quiz_category': 'x'})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data["success"], False)
+
+    # test cases for server-side quiz sessions
+    def test_play_quiz_session(self):
+        res = self.client.post('/quizzes/sessions',
+                               json={'quiz_category': {'type': 'Art', 'id': 2}})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(data['success'], True)
+        session_id = data['session_id']
+
+        played = []
+        for _ in range(5):
+            res = self.client.post(f'/quizzes/sessions/{session_id}/next')
+            data = json.loads(res.data)
+            self.assertEqual(res.status_code, 200)
+            if data['question'] is None:
+                break
+            played.append(data['question']['id'])
+
+        self.assertEqual(sorted(played), [16, 17, 18, 19])
+
+    def test_quiz_session_state_does_not_grow(self):
+        sessions = self.app.extensions['quiz_sessions']
+        session_id = self.client.post('/quizzes/sessions', json={
+            'quiz_category': {'id': 0}}).get_json()['session_id']
+        state = sessions.store.get(session_id)
+
+        played = [self.client.post(f'/quizzes/sessions/{session_id}/next')
+                  .get_json()['question']['id'] for _ in range(3)]
+        # a question deleted after the session started is skipped
+        with self.app.app_context():
+            remaining = {q.id for q in Question.query} - set(played)
+        self.client.delete(f'/questions/{remaining.pop()}')
+        while True:
+            question = self.client.post(
+                f'/quizzes/sessions/{session_id}/next').get_json()['question']
+            if question is None:
+                break
+            played.append(question['id'])
+
+        self.assertEqual(set(played), remaining | set(played[:3]))
+        self.assertEqual(len(played), len(set(played)))
+        self.assertEqual(set(sessions.store.get(session_id)), set(state))
+
+    def test_permuted_is_a_permutation(self):
+        from flaskr.sessions import permuted
+        for size in (1, 2, 7, 64, 1000):
+            values = [permuted(i, size, 12345) for i in range(size)]
+            self.assertEqual(sorted(values), list(range(size)))
+        self.assertNotEqual([permuted(i, 1000, 1) for i in range(10)],
+                            [permuted(i, 1000, 2) for i in range(10)])
+
+    def test_404_quiz_session_not_found(self):
+        res = self.client.post('/quizzes/sessions/unknown/next')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data["success"], False)
+        self.assertEqual(data["message"], "resource not found")
+
+    # test cases for quiz results and the leaderboard
+    def submit_result(self, player, score, category_id=1, questions=5):
+        return self.client.post('/quizzes/results', json={
+            'player': player, 'score': score, 'questions': questions,
+            'quiz_category': {'type': 'Science', 'id': category_id}})
+
+    def test_submit_quiz_results_and_read_leaderboard(self):
+        ranks = [self.submit_result(player, score).get_json()['rank']
+                 for player, score in (('ann', 3), ('bob', 5), ('cy', 4))]
+        self.submit_result('dee', 2, category_id=0)
+
+        self.assertEqual(ranks, [1, 1, 2])
+        res = self.client.get('/leaderboard?category=1')
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([r['player'] for r in data['results']],
+                         ['bob', 'cy', 'ann'])
+
+        data = self.client.get('/leaderboard?limit=2').get_json()
+        self.assertEqual([(r['player'], r['score']) for r in data['results']],
+                         [('bob', 5), ('cy', 4)])
+
+    def test_quiz_results_are_written_behind_in_batches(self):
+        from models import QuizResult
+        writer = self.app.extensions['result_writer']
+        writer.flush_size = 3
+
+        for player, score in (('ann', 3), ('bob', 5)):
+            self.assertEqual(self.submit_result(player, score).status_code,
+                             202)
+        with self.app.app_context():
+            self.assertEqual(QuizResult.query.count(), 0)
+
+        # the third fills the buffer and wakes the writer thread
+        self.submit_result('cy', 4)
+        deadline = time.monotonic() + 5
+        while writer.flushed < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        with self.app.app_context():
+            self.assertEqual(QuizResult.query.count(), 3)
+
+        # a reload from the table plus the unflushed row counts each once
+        self.submit_result('dee', 1)
+        self.app.extensions['leaderboard'].invalidate()
+        data = self.client.get('/leaderboard?category=1').get_json()
+        self.assertEqual([r['player'] for r in data['results']],
+                         ['bob', 'cy', 'ann', 'dee'])
+
+    def test_quiz_results_being_flushed_stay_in_snapshot(self):
+        from sqlalchemy import event
+        writer = self.app.extensions['result_writer']
+        self.submit_result('ann', 3)
+        snapshots = []
+
+        def capture(conn, cursor, statement, *args):
+            if statement.startswith('INSERT INTO quiz_results'):
+                snapshots.append(writer.snapshot())
+
+        with self.app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', capture)
+            try:
+                self.assertEqual(writer.flush(), 1)
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', capture)
+
+        # a leaderboard reload during the insert still sees the row
+        self.assertEqual([row['player'] for row in snapshots[0]], ['ann'])
+        self.assertEqual(writer.snapshot(), [])
+
+    def test_identical_quiz_results_both_rank_after_reload(self):
+        from flaskr.results import result_row
+        writer = self.app.extensions['result_writer']
+        leaderboard = self.app.extensions['leaderboard']
+        rows = [result_row('ann', 1, 3, 5) for _ in range(3)]
+        for row in rows:
+            row['submitted_at'] = rows[0]['submitted_at']
+
+        writer.add(rows[0])
+        writer.add(rows[1])
+        with self.app.app_context():
+            self.assertEqual(writer.flush(), 2)
+        writer.add(rows[2])
+
+        leaderboard.invalidate()
+        with self.app.app_context():
+            self.assertEqual(len(leaderboard.top(1)), 3)
+
+    def test_quiz_results_are_flushed_off_the_request_thread(self):
+        from unittest import mock
+        writer = self.app.extensions['result_writer']
+        writer.flush_size = 1
+        flushed_by = []
+        flush = writer.flush
+
+        def record_flush():
+            flushed_by.append(threading.current_thread().name)
+            return flush()
+
+        with mock.patch.object(writer, 'flush', record_flush):
+            self.assertEqual(self.submit_result('ann', 3).status_code, 202)
+            deadline = time.monotonic() + 5
+            while not flushed_by and time.monotonic() < deadline:
+                time.sleep(0.01)
+        self.assertEqual(flushed_by, ['quiz-result-writer'])
+
+    def test_failed_quiz_result_flushes_back_off(self):
+        from unittest import mock
+        from flaskr.results import ResultWriter, result_row
+        writer = ResultWriter(self.app, flush_size=10)
+        writer.add(result_row('ann', 1, 3, 5))
+
+        with self.app.app_context():
+            with mock.patch.object(db.session, 'execute',
+                                   side_effect=RuntimeError('database down')):
+                self.assertEqual(writer.flush(), 0)
+                self.assertEqual(writer.retry_delay(), 1.0)
+                self.assertEqual(writer.flush(), 0)
+                self.assertEqual(writer.retry_delay(), 2.0)
+            self.assertEqual(len(writer.snapshot()), 1)
+            self.assertEqual(writer.flush(), 1)
+        self.assertEqual(writer.failures, 0)
+
+    def test_400_invalid_quiz_result(self):
+        for player, score, category_id in (('ann', 6, 1), ('', 1, 1),
+                                           ('ann', 1, 1000)):
+            res = self.submit_result(player, score, category_id)
+            self.assertEqual(res.status_code, 400)
+            self.assertEqual(res.get_json()['message'], 'bad request')
+
+        res = self.client.post('/quizzes/results', json={'player': 'ann'})
+        self.assertEqual(res.status_code, 422)
+
+        res = self.client.get('/leaderboard?limit=0')
+        self.assertEqual(res.status_code, 400)
+
+    # test cases for live quiz rooms
+    def room_events(self, body):
+        """(event, data) pairs of a Server-Sent Events body."""
+        events = []
+        for block in body.decode('utf-8').split('\n\n'):
+            fields = dict(line.split(': ', 1) for line in block.splitlines()
+                          if not line.startswith(':'))
+            if 'event' in fields:
+                events.append((fields['event'], json.loads(fields['data'])))
+        return events
+
+    def test_play_quiz_room(self):
+        res = self.client.post('/rooms', json={
+            'quiz_category': {'type': 'Art', 'id': 2},
+            'previous_questions': [16], 'count': 5})
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(data['question_count'], 3)
+        room_id, host = data['room_id'], {'host_token': data['host_token']}
+
+        res = self.client.post(f'/rooms/{room_id}/next', json=host)
+        self.assertEqual(res.get_json()['event'], 'question')
+
+        # a player joining now gets the state and the current question,
+        # then every step the host takes until the room closes
+        stream = self.client.get(f'/rooms/{room_id}/events')
+        self.assertEqual(stream.mimetype, 'text/event-stream')
+        for _ in range(6):
+            res = self.client.post(f'/rooms/{room_id}/next', json=host)
+        self.assertEqual(res.get_json()['event'], 'end')
+        self.assertEqual(
+            self.client.post(f'/rooms/{room_id}/next', json=host).status_code,
+            422)
+
+        events = self.room_events(stream.get_data())
+        self.assertEqual([event for event, _ in events],
+                         ['state', 'question', 'answer', 'question', 'answer',
+                          'question', 'answer', 'end'])
+        questions = [data['question'] for event, data in events
+                     if event == 'question']
+        self.assertEqual(sorted(q['id'] for q in questions), [17, 18, 19])
+        self.assertNotIn('answer', questions[0])
+
+        state = self.client.get(f'/rooms/{room_id}').get_json()
+        self.assertEqual(state['finished'], True)
+        self.assertEqual(state['players'], 0)
+        res = self.client.delete(f'/rooms/{room_id}', json=host)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(self.client.get(f'/rooms/{room_id}').status_code, 404)
+
+    def test_403_404_quiz_room(self):
+        res = self.client.post('/rooms', json={'quiz_category': {'id': 1}})
+        room_id = res.get_json()['room_id']
+
+        res = self.client.post(f'/rooms/{room_id}/next',
+                               json={'host_token': 'guess'})
+        self.assertEqual(res.status_code, 403)
+        self.assertEqual(res.get_json()['message'], 'forbidden')
+        self.assertEqual(self.client.delete(f'/rooms/{room_id}').status_code,
+                         403)
+
+        for res in (self.client.get('/rooms/unknown/events'),
+                    self.client.post('/rooms/unknown/next', json={}),
+                    self.client.post('/rooms', json={
+                        'quiz_category': {'id': 2},
+                        'previous_questions': [16, 17, 18, 19]})):
+            self.assertEqual(res.status_code, 404)
+
     def test_422_play_quiz_fields_missing(self):
         quiz = {'quiz_category': {'type': 'click', 'id': 0}}
         res = self.client.post('/quizzes', json=quiz)
@@ -191,6 +1257,272 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data["success"], False)
         self.assertEqual(data["message"], "unprocessable")
 
+class ReplicaRoutingTestCase(unittest.TestCase):
+    """Runs the app on a primary and a replica, two SQLite files"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.primary_path = f"sqlite:///{self.directory.name}/primary.db"
+        self.replica_path = f"sqlite:///{self.directory.name}/replica.db"
+        for database_path in (self.primary_path, self.replica_path):
+            app = create_app({"SQLALCHEMY_DATABASE_URI": database_path})
+            with app.app_context():
+                upgrade()
+                seed_db()
+                db.engine.dispose()
+
+        # a row only the replica has, to tell where reads went
+        self.replica_app = create_app(
+            {"SQLALCHEMY_DATABASE_URI": self.replica_path})
+        with self.replica_app.app_context():
+            Question(question='Only on the replica?', answer='Yes',
+                     category=1, difficulty=1).insert()
+
+        self.app = create_app({"SQLALCHEMY_DATABASE_URI": self.primary_path,
+                               "DB_REPLICA_URLS": [self.replica_path]})
+
+    def tearDown(self):
+        for app in (self.app, self.replica_app):
+            with app.app_context():
+                db.engine.dispose()
+            for engine in app.extensions['db_replicas'].created():
+                engine.dispose()
+        self.directory.cleanup()
+
+    def category_questions(self, client):
+        res = client.get('/categories/1/questions')
+        return [q['question'] for q in json.loads(res.data)['questions']]
+
+    def test_reads_go_to_replica(self):
+        client = self.app.test_client()
+
+        self.assertIn('Only on the replica?', self.category_questions(client))
+
+        res = client.post('/questions/search',
+                          json={'searchTerm': 'only on the replica'})
+        self.assertEqual(json.loads(res.data)['total_questions'], 1)
+
+    def test_client_reads_own_writes_from_primary(self):
+        client = self.app.test_client()
+        res = client.post('/questions', json={
+            'question': 'Written to the primary?', 'answer': 'Yes',
+            'difficulty': 1, 'category': 1})
+        self.assertEqual(res.status_code, 201)
+
+        questions = self.category_questions(client)
+        self.assertIn('Written to the primary?', questions)
+        self.assertNotIn('Only on the replica?', questions)
+
+        other_client = self.app.test_client()
+        questions = self.category_questions(other_client)
+        self.assertIn('Only on the replica?', questions)
+        self.assertNotIn('Written to the primary?', questions)
+
+
+try:
+    from starlette.testclient import TestClient
+    from flaskr.asgi import FLASK_ONLY_ROUTES, ROUTES, create_asgi_app
+except ImportError:  # requirements-asgi.txt not installed
+    create_asgi_app = None
+
+
+@unittest.skipIf(create_asgi_app is None, "ASGI dependencies not installed")
+class AsgiTestCase(unittest.TestCase):
+    """Runs the ASGI app and the Flask app against one SQLite file"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        database_path = f"sqlite:///{self.directory.name}/trivia.db"
+        self.app = create_app({"SQLALCHEMY_DATABASE_URI": database_path})
+        with self.app.app_context():
+            upgrade()
+            seed_db()
+        self.client = self.app.test_client()
+        self.asgi_client = TestClient(
+            create_asgi_app({"SQLALCHEMY_DATABASE_URI": database_path}))
+        self.asgi_client.__enter__()
+
+    def tearDown(self):
+        self.asgi_client.__exit__(None, None, None)
+        with self.app.app_context():
+            db.engine.dispose()
+        self.directory.cleanup()
+
+    def test_asgi_routes_cover_flask_routes(self):
+        def path(rule):
+            # <int:id> in Flask, {id:int} in Starlette
+            rule = re.sub(r'<(?:\w+:)?(\w+)>', r'{\1}', rule)
+            return re.sub(r'\{(\w+):\w+\}', r'{\1}', rule)
+
+        flask_routes = {(path(rule.rule), method)
+                        for rule in self.app.url_map.iter_rules()
+                        if rule.endpoint != 'static'
+                        for method in rule.methods - {'HEAD', 'OPTIONS'}}
+        asgi_routes = {(path(route.path), method)
+                       for route in ROUTES
+                       for method in route.methods - {'HEAD'}}
+        self.assertEqual(flask_routes - asgi_routes, FLASK_ONLY_ROUTES)
+        self.assertEqual(asgi_routes - flask_routes, set())
+
+    def test_asgi_responses_match_flask(self):
+        for path in ('/categories', '/categories?with_counts=1',
+                     '/questions?page=2',
+                     '/questions?after=5&limit=3', '/questions?page=1000',
+                     '/categories/1/questions'):
+            res = self.asgi_client.get(path)
+            expected = self.client.get(path)
+            self.assertEqual(res.status_code, expected.status_code, path)
+            self.assertEqual(res.content, expected.data, path)
+
+        res = self.asgi_client.post('/questions/search',
+                                    json={'searchTerm': 'title'})
+        expected = self.client.post('/questions/search',
+                                    json={'searchTerm': 'title'})
+        self.assertEqual(res.content, expected.data)
+
+    def test_asgi_get_search_matches_flask(self):
+        path = '/questions/search?searchTerm=title&after=0&limit=1'
+        res = self.asgi_client.get(path)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.content, self.client.get(path).data)
+
+    def test_asgi_delete_questions_in_batch(self):
+        ids = [self.asgi_client.post('/questions', json={
+            'question': f'batch question {number}?', 'answer': 'this',
+            'difficulty': 1, 'category': 3}).json()['created']
+            for number in range(2)]
+
+        res = self.asgi_client.request('DELETE', '/questions',
+                                       json={'ids': ids + [-1]})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(sorted(res.json()['deleted']), ids)
+        with self.app.app_context():
+            self.assertEqual(
+                Question.query.filter(Question.id.in_(ids)).count(), 0)
+
+        res = self.asgi_client.request('DELETE', '/questions',
+                                       json={'ids': []})
+        self.assertEqual(res.status_code, 422)
+        self.assertEqual(res.json()['message'], 'unprocessable')
+
+    def test_asgi_400_search_term_not_a_string(self):
+        res = self.asgi_client.post('/questions/search',
+                                    json={'searchTerm': 123})
+
+        self.assertEqual(res.status_code, 400)
+
+    def test_asgi_categories_not_modified(self):
+        res = self.asgi_client.get('/categories')
+        res = self.asgi_client.get(
+            '/categories', headers={'If-None-Match': res.headers['ETag']})
+
+        self.assertEqual(res.status_code, 304)
+
+    def test_asgi_create_play_and_delete_question(self):
+        res = self.asgi_client.post('/questions', json={
+            'question': 'Which planet is known as the red planet?',
+            'answer': 'Mars', 'difficulty': 1, 'category': '1'})
+        data = res.json()
+        self.assertEqual(res.status_code, 201)
+        question_id = data['created']
+
+        previous = [q['id'] for q in self.client.get(
+            '/categories/1/questions').get_json()['questions']]
+        previous.remove(question_id)
+        res = self.asgi_client.post('/quizzes', json={
+            'previous_questions': previous,
+            'quiz_category': {'type': 'Science', 'id': 1}})
+        self.assertEqual(res.json()['question']['id'], question_id)
+
+        with self.app.app_context():
+            in_category = Question.query.filter(
+                Question.category == 1).count()
+            self.assertEqual(db.session.get(Category, 1).question_count,
+                             in_category)
+        res = self.asgi_client.get('/categories/1/questions')
+        self.assertEqual(res.json()['total_questions'], in_category)
+
+        res = self.asgi_client.delete(f'/questions/{question_id}')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()['deleted'], str(question_id))
+        with self.app.app_context():
+            self.assertEqual(db.session.get(Category, 1).question_count,
+                             in_category - 1)
+
+        res = self.asgi_client.delete(f'/questions/{question_id}')
+        self.assertEqual(res.status_code, 422)
+        self.assertEqual(res.json()['message'], 'unprocessable')
+
+    def test_asgi_flags_near_duplicate_question(self):
+        self.asgi_client.app.state.trivia.config['DUPLICATE_POLICY'] = 'flag'
+        res = self.asgi_client.post('/questions', json={
+            'question': "Whose autobiography is entitled 'I know why the "
+                        "caged bird sings'",
+            'answer': 'Maya Angelou', 'difficulty': 2, 'category': 4})
+
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(res.json()['duplicate_of'], 5)
+
+    def test_asgi_quiz_round(self):
+        res = self.asgi_client.post('/quizzes/round', json={
+            'previous_questions': [16],
+            'quiz_category': {'type': 'Art', 'id': 2}})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(sorted(q['id'] for q in res.json()['questions']),
+                         [17, 18, 19])
+
+    def test_asgi_quiz_room(self):
+        res = self.asgi_client.post('/rooms', json={
+            'quiz_category': {'type': 'Art', 'id': 2}, 'count': 1})
+        data = res.json()
+        self.assertEqual(res.status_code, 201)
+        room_id, host = data['room_id'], {'host_token': data['host_token']}
+
+        events = [self.asgi_client.post(f'/rooms/{room_id}/next',
+                                        json=host).json()['event']
+                  for _ in range(3)]
+        self.assertEqual(events, ['question', 'answer', 'end'])
+
+        # the room is closed, so the stream ends after catching up
+        res = self.asgi_client.get(f'/rooms/{room_id}/events')
+        self.assertEqual(res.headers['content-type'].split(';')[0],
+                         'text/event-stream')
+        self.assertIn(b'event: state', res.content)
+        self.assertIn(b'event: end', res.content)
+
+        res = self.asgi_client.post(f'/rooms/{room_id}/next',
+                                    json={'host_token': 'guess'})
+        self.assertEqual(res.status_code, 403)
+        res = self.asgi_client.request('DELETE', f'/rooms/{room_id}',
+                                       json=host)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(self.asgi_client.get(f'/rooms/{room_id}').status_code,
+                         404)
+
+    def test_asgi_422_play_quiz_fields_missing(self):
+        res = self.asgi_client.post(
+            '/quizzes', json={'quiz_category': {'type': 'click', 'id': 0}})
+
+        self.assertEqual(res.status_code, 422)
+        self.assertEqual(res.json()['success'], False)
+
+
+class BenchmarkSmokeTestCase(unittest.TestCase):
+    """Runs the API benchmark on a tiny synthetic bank"""
+
+    def test_api_benchmark_covers_every_endpoint(self):
+        from benchmarks.api import make_app, run_benchmark
+
+        app = make_app("sqlite://", rows=50, categories=3)
+        summaries = run_benchmark(app, rows=50, categories=3, requests=3)
+
+        self.assertEqual(len(summaries), 7)
+        for summary in summaries.values():
+            self.assertEqual(summary["errors"], 0)
+            self.assertEqual(summary["requests"], 3)
+
 # Make the tests conveniently executable
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
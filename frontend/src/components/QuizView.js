@@ -10,12 +10,16 @@ class QuizView extends Component {
     this.state = {
       quizCategory: null,
       previousQuestions: [],
+      roundQuestions: [],
       showAnswer: false,
       categories: {},
       numCorrect: 0,
       currentQuestion: {},
       guess: '',
       forceEnd: false,
+      player: '',
+      resultSaved: false,
+      resultRank: null,
     };
   }
 
@@ -35,39 +39,34 @@ class QuizView extends Component {
   }
 
   selectCategory = ({ type, id = 0 }) => {
-    this.setState({ quizCategory: { type, id } }, this.getNextQuestion);
+    this.setState({ quizCategory: { type, id } }, this.getRound);
   };
 
   handleChange = (event) => {
     this.setState({ [event.target.name]: event.target.value });
   };
 
-  getNextQuestion = () => {
-    const previousQuestions = [...this.state.previousQuestions];
-    if (this.state.currentQuestion.id) {
-      previousQuestions.push(this.state.currentQuestion.id);
-    }
-
+  getRound = () => {
     $.ajax({
-      url: '/quizzes', //TODO: update request URL
+      url: '/quizzes/round',
       type: 'POST',
       dataType: 'json',
       contentType: 'application/json',
       data: JSON.stringify({
-        previous_questions: previousQuestions,
+        previous_questions: this.state.previousQuestions,
         quiz_category: this.state.quizCategory,
+        count: questionsPerPlay,
       }),
       xhrFields: {
         withCredentials: true,
       },
       crossDomain: true,
       success: (result) => {
+        const [currentQuestion] = result.questions;
         this.setState({
-          showAnswer: false,
-          previousQuestions: previousQuestions,
-          currentQuestion: result.question,
-          guess: '',
-          forceEnd: result.question ? false : true,
+          roundQuestions: result.questions,
+          currentQuestion: currentQuestion || {},
+          forceEnd: currentQuestion ? false : true,
         });
         return;
       },
@@ -78,6 +77,22 @@ class QuizView extends Component {
     });
   };
 
+  getNextQuestion = () => {
+    const previousQuestions = [...this.state.previousQuestions];
+    if (this.state.currentQuestion.id) {
+      previousQuestions.push(this.state.currentQuestion.id);
+    }
+    const nextQuestion = this.state.roundQuestions[previousQuestions.length];
+
+    this.setState({
+      showAnswer: false,
+      previousQuestions: previousQuestions,
+      currentQuestion: nextQuestion || {},
+      guess: '',
+      forceEnd: nextQuestion ? false : true,
+    });
+  };
+
   submitGuess = (event) => {
     event.preventDefault();
     let evaluate = this.evaluateAnswer();
@@ -91,11 +106,42 @@ class QuizView extends Component {
     this.setState({
       quizCategory: null,
       previousQuestions: [],
+      roundQuestions: [],
       showAnswer: false,
       numCorrect: 0,
       currentQuestion: {},
       guess: '',
       forceEnd: false,
+      resultSaved: false,
+      resultRank: null,
+    });
+  };
+
+  submitResult = (event) => {
+    event.preventDefault();
+    $.ajax({
+      url: '/quizzes/results',
+      type: 'POST',
+      dataType: 'json',
+      contentType: 'application/json',
+      data: JSON.stringify({
+        player: this.state.player,
+        score: this.state.numCorrect,
+        questions: this.state.previousQuestions.length,
+        quiz_category: this.state.quizCategory,
+      }),
+      xhrFields: {
+        withCredentials: true,
+      },
+      crossDomain: true,
+      success: (result) => {
+        this.setState({ resultSaved: true, resultRank: result.rank });
+        return;
+      },
+      error: (error) => {
+        alert('Unable to save your score. Please try your request again');
+        return;
+      },
     });
   };
 
@@ -132,6 +178,23 @@ class QuizView extends Component {
         <div className='final-header'>
           Your Final Score is {this.state.numCorrect}
         </div>
+        {this.state.resultSaved ? (
+          <div className='quiz-answer'>
+            Score saved
+            {this.state.resultRank ? ` - #${this.state.resultRank} on the leaderboard` : ''}
+          </div>
+        ) : (
+          <form onSubmit={this.submitResult}>
+            <input
+              type='text'
+              name='player'
+              placeholder='Your name'
+              value={this.state.player}
+              onChange={this.handleChange}
+            />
+            <input className='submit-guess button' type='submit' value='Save Score' />
+          </form>
+        )}
         <div className='play-again button' onClick={this.restartGame}>
           Play Again?
         </div>